@@ -1,244 +1,291 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import pandas as pd
 import plotly.express as px
 import dash
-import json
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from flask import jsonify, request
+
+import metricas
+from cache_figuras import CacheFiguras
+from cliente import FIGURAS_CLIENTE, FIGURAS_SERVIDOR, MODO_CLIENTE, cubo_cliente
+from consultas import COLUMNAS_SQL, MAX_LIMITE, MotorConsultas, backend_disponible
+from cubo import COL_MUERTES, FILTROS_VACIOS, IndiceCubo, normalizar_filtros
+from dimensiones import DIM_CAUSA, DIM_MUNICIPIO, Dimensiones
+from exportacion import (
+    FORMATOS, MAX_FILAS_EXPORTACION, bloques, formato_disponible, paginar, respuesta_exportacion
+)
+from geometria import (
+    CLAVE_MUNICIPIO, DIR_CACHE_MUNICIPIOS, TOLERANCIA_MUNICIPIOS, cargar_geojson_simplificado,
+    cargar_municipios_departamento, hay_geometria_municipal, serializar
+)
+from precalentamiento import Precalentamiento
+from preprocesamiento import (
+    CATEGORIAS_GRUPO_EDAD, ORDEN_GRUPOS_EDAD_FINAL, anios_disponibles, cargar_anio, procesos_lectura,
+    version_datos, version_particion
+)
+from respuestas import configurar_respuestas, huella, respuesta_cacheable
+from tasas import MotorTasas
+
+# Eventos de etapas y callbacks como líneas JSON en stderr (ver metricas.py)
+metricas.configurar_logs()
+
+# La geometría se carga (o se simplifica, la primera vez) en otro proceso
+# mientras se leen los datos; ver geometria.py
+pool_geometria = ProcessPoolExecutor(max_workers=1) if procesos_lectura(2) > 1 else None
+futuro_geojson = pool_geometria.submit(cargar_geojson_simplificado) if pool_geometria else None
 
 # --- Cargar y Preparar Datos ---
-PATH_MUERTES = 'data/datos_mortalidad.xlsx'
-PATH_CODIGOS = 'data/codigos_causas.xlsx'
-PATH_DIVIPOLA = 'data/divipola.xlsx'
-# 1. Cargar DataFrames
-try:
-    df_muertes = pd.read_excel(PATH_MUERTES)
-    df_codigos = pd.read_excel(PATH_CODIGOS)
-    df_divipola = pd.read_excel(PATH_DIVIPOLA)
-except FileNotFoundError as e:
-    print(f"Error al cargar archivos: {e}")
-    exit()
+# La limpieza y las fusiones viven en preprocesamiento.py; aquí solo se lee la
+# partición columnar de cada año (o se reconstruye si algún .xlsx cambió).
+ANIOS = anios_disponibles()
+if not ANIOS:
+    raise SystemExit("No hay archivos de mortalidad en 'data/' ni particiones en la caché.")
+ANIO_DEFECTO = ANIOS[-1] # El año más reciente se muestra al abrir el dashboard
 
-print("Datos cargados exitosamente.")
+# Años cargados a la vez en cada worker; los demás se leen de disco al pedirlos
+MAX_ANIOS_EN_MEMORIA = int(os.environ.get('MAX_ANIOS_EN_MEMORIA', 3))
 
-try:
-    with open('data/Colombia.geo.json', 'r') as f:
-        geojson_data = json.load(f)
-except FileNotFoundError:
-    print("¡Advertencia! No se encontró 'Colombia.geo.json'. El mapa no funcionará sin este archivo.")
-    geojson_data = None
+# 5. Filtrar municipios con población mínima y seleccionar el Top 10 con la TBM más baja
+POBLACION_MINIMA = 10000 # Filtro para excluir municipios rurales muy pequeños y evitar tasas extremas
 
-print("Archivo Geoson listo.")
 
+def top_menor_mortalidad(df_tbm):
+    """Top 10 de municipios con la tasa más baja entre los que superan POBLACION_MINIMA."""
+    df_tbm_final = df_tbm[df_tbm['POBLACION'] >= POBLACION_MINIMA]
+    # Seleccionar el Top 10 con la Tasa MÁS BAJA (ascendente=True)
+    return df_tbm_final.sort_values(by='TASA_MORTALIDAD', ascending=True).head(10)
+
+
+def _cargar_datos_anio(anio):
+    datos = cargar_anio(anio, tablas=['cubo', 'df_tbm_completo', DIM_MUNICIPIO, DIM_CAUSA])
+    # Cubo ordenado por municipio: cada combinación de filtros es un corte + máscaras pequeñas;
+    # los nombres se resuelven con las dimensiones solo sobre lo ya agregado
+    with metricas.etiquetas(anio=anio), metricas.etapa('indice_cubo', datos['cubo']) as registro:
+        dimensiones = Dimensiones({nombre: datos.pop(nombre) for nombre in (DIM_MUNICIPIO, DIM_CAUSA)})
+        datos['indice'] = IndiceCubo(datos['cubo'], dimensiones)
+        registro['filas_salida'] = len(datos['indice'].cubo)
+    # Tasas brutas por geografía y causa (la proyección municipal no trae sexo ni edad)
+    datos['tasas'] = MotorTasas(datos['indice'], datos['df_poblacion'])
+    datos['df_tbm_top_10_menor'] = top_menor_mortalidad(datos['df_tbm_completo'])
+    return datos
 
-# # ** Importante: Fusión y limpieza de datos aquí **
-df_muertes['FECHA_DEFUNCION'] = pd.to_datetime(df_muertes['FECHA_DEFUNCION'], errors='coerce')
-df_muertes.dropna(subset=['FECHA_DEFUNCION'], inplace=True) # Elimina filas sin fecha
 
-# 🔑 Estandarizar el código DANE completo (5 dígitos)
-# Ejemplo de nombres de columnas en el archivo de mortalidad
-COL_DPTO_MUERTES = 'COD_DEPARTAMENTO' # Código del departamento
-COL_MPIO_MUERTES = 'COD_MUNICIPIO' # Código del municipio
-COL_CAUSA_MUERTES = 'COD_MUERTE' # Código CIE-10
+def _cargar_registros_anio(anio):
+    # La exportación de registros no calcula tasas: no necesita la población
+    datos = cargar_anio(anio, tablas=['df_final', DIM_MUNICIPIO, DIM_CAUSA], poblacion=False)
+    datos['dimensiones'] = Dimensiones({nombre: datos.pop(nombre) for nombre in (DIM_MUNICIPIO, DIM_CAUSA)})
+    return datos
 
-# Crear el código DANE completo de 5 dígitos (e.g., 05 + 001 = 05001)
-df_muertes['COD_DANE_DPTO'] = df_muertes[COL_DPTO_MUERTES].astype(str).str.zfill(2)
-df_muertes['COD_DANE_MPIO'] = df_muertes[COL_MPIO_MUERTES].astype(str).str.zfill(3)
-df_muertes['COD_DANE_COMPLETO'] = df_muertes['COD_DANE_DPTO'] + df_muertes['COD_DANE_MPIO']
 
-# Asegurar que el código CIE-10 sea String
-df_muertes[COL_CAUSA_MUERTES] = df_muertes[COL_CAUSA_MUERTES].astype(str).str.strip()
+# anio -> datos, con la versión de la partición que se leyó (datos['version'])
+_anios_en_memoria = OrderedDict()
+_registros_en_memoria = OrderedDict()
+_lock_anios = threading.Lock()
 
-print("df_muertes listo.")
 
-# Ejemplo de nombres de columnas en el archivo DIVIPOLA
-COL_DPTO_DIVIPOLA = 'COD_DEPARTAMENTO'
-COL_MPIO_DIVIPOLA = 'COD_MUNICIPIO'
-COL_NOMBRE_DPTO = 'DEPARTAMENTO'
-COL_NOMBRE_MPIO = 'MUNICIPIO'
+def _datos_vigentes(memoria, anio, cargar):
+    """Datos de ``anio`` en ``memoria`` si su versión sigue publicada; si no, los de ``cargar(anio)``.
 
-# 🔑 Crear el código DANE completo de 5 dígitos
-df_divipola['COD_DANE_DPTO'] = df_divipola[COL_DPTO_DIVIPOLA].astype(str).str.zfill(2)
-df_divipola['COD_DANE_MPIO'] = df_divipola[COL_MPIO_DIVIPOLA].astype(str).str.zfill(3)
-df_divipola['COD_DANE_COMPLETO'] = df_divipola['COD_DANE_DPTO'] + df_divipola['COD_DANE_MPIO']
+    La versión se toma de la carga y no de antes de ella, porque en frío
+    ``cargar_anio`` es quien publica la primera. Quedan a lo sumo
+    MAX_ANIOS_EN_MEMORIA años (los menos usados salen primero).
+    """
+    version = version_particion(anio)
+    with _lock_anios:
+        datos = memoria.get(anio)
+        if datos is not None and datos['version'] == version:
+            memoria.move_to_end(anio)
+            return datos
+    datos = cargar(anio)
+    with _lock_anios:
+        memoria[anio] = datos
+        memoria.move_to_end(anio)
+        while len(memoria) > MAX_ANIOS_EN_MEMORIA:
+            memoria.popitem(last=False)
+    return datos
 
-# Seleccionar solo las columnas necesarias para evitar duplicados en la fusión
-df_divipola = df_divipola[[
-    'COD_DANE_COMPLETO', 
-    COL_NOMBRE_DPTO, 
-    COL_NOMBRE_MPIO
-]].drop_duplicates()
 
-print("df_divipola listo.")
+def datos_anio(anio):
+    """Cubo, índice, dimensiones y tasas de un año; solo se leen las tablas que usan los callbacks.
 
+    Cuando ingesta.py aplica un lote, el siguiente callback abre la versión
+    nueva de la partición sin reiniciar el worker.
+    """
+    return _datos_vigentes(_anios_en_memoria, anio, _cargar_datos_anio)
 
-# Ejemplo de nombres de columnas en el archivo de Códigos
-COL_CODIGO_CAUSA = 'Codigo' # CIE-10
-COL_NOMBRE_CAUSA = 'Nombre Causa'
 
-df_codigos[COL_CODIGO_CAUSA] = df_codigos[COL_CODIGO_CAUSA].astype(str).str.strip()
+def registros_anio(anio):
+    """``df_final`` (mapeado en memoria) y ``dimensiones`` de un año, para exportar los registros."""
+    return _datos_vigentes(_registros_en_memoria, anio, _cargar_registros_anio)
 
-# Renombrar para claridad después de la fusión
-df_codigos = df_codigos.rename(columns={
-    COL_CODIGO_CAUSA: COL_CAUSA_MUERTES,
-    COL_NOMBRE_CAUSA: 'NOMBRE_CAUSA_CIE10'
-})
 
-print("df_codigos listo.")
+def anio_de(filtros):
+    return (filtros or {}).get('anio') or ANIO_DEFECTO
 
 
+def indice_de(filtros):
+    """Índice del cubo del año seleccionado en ``filtros``."""
+    return datos_anio(anio_de(filtros))['indice']
 
-# 1. Fusión Geográfica (muertes + divipola)
-df_final = pd.merge(
-    df_muertes, 
-    df_divipola, 
-    on='COD_DANE_COMPLETO', 
-    how='left'
-)
 
-# 2. Fusión de Causas de Muerte (df_final + codigos)
-df_final = pd.merge(
-    df_final, 
-    df_codigos, 
-    on=COL_CAUSA_MUERTES, 
-    how='left'
-)
+# Motor SQL embebido (ver consultas.py): desactivado por defecto; con MOTOR_SQL
+# los callbacks y /api/consulta resuelven filtros y agregaciones en él
+BACKEND_SQL = backend_disponible()
+_motor = None
+_lock_motor = threading.Lock()
 
-# --- Limpieza Final de Columnas para Dash ---
-# Crear el mes como una columna numérica para el gráfico de líneas
-df_final['MES'] = df_final['FECHA_DEFUNCION'].dt.month
 
-# Renombrar columnas clave para que coincidan con la lógica del Dash:
-df_final = df_final.rename(columns={
-    COL_NOMBRE_DPTO: 'DEPARTAMENTO',
-    COL_NOMBRE_MPIO: 'MUNICIPIO',
-    'NOMBRE_CAUSA_CIE10': 'CAUSA_NOMBRE',
-    COL_CAUSA_MUERTES: 'CAUSA_CODIGO',
-    'SEXO': 'SEXO', # Asegúrate que esta columna existe en tu archivo de muertes
-    'GRUPO_EDAD1': 'GRUPO_EDAD1' # Asegúrate que esta columna existe
-})
+def motor_sql():
+    """Motor de consultas de la versión vigente de los datos (None si está desactivado)."""
+    global _motor
+    if BACKEND_SQL is None:
+        return None
+    with _lock_motor:
+        version = version_datos()
+        if _motor is None or _motor.version != version:
+            # Un lote nuevo de ingesta.py cambia la versión: se recarga la base
+            with metricas.etapa('motor_sql'):
+                _motor = MotorConsultas.desde_particiones(ANIOS, BACKEND_SQL, version)
+        return _motor
 
-# ¡DataFrame final listo para ser usado por Plotly y Dash!
-print("\n✅ Fusión completa. DataFrame final (df_final) creado.")
-print(f"Número de registros en el DataFrame final: {len(df_final)}")
-print(df_final[['DEPARTAMENTO', 'MUNICIPIO', 'CAUSA_NOMBRE', 'MES','COD_DANE_COMPLETO']].head())
 
+def agregar_filtrado(filtros, columnas, ignorar=(), nombre='Total Muertes', rangos=None):
+    """Muertes por ``columnas`` del año de ``filtros``, con el motor SQL o con el índice del cubo."""
+    motor = motor_sql()
+    if motor is not None:
+        filtros = dict(filtros or {}, anio=anio_de(filtros))
+        return motor.agregar(columnas, filtros, ignorar, rangos, nombre, como_pandas=True)
+    indice = indice_de(filtros)
+    cubo_filtrado = indice.filtrar(filtros, ignorar=ignorar)
+    if rangos:
+        cubo_filtrado = indice.filtrar_causas(cubo_filtrado, rangos)
+    return indice.agregar(cubo_filtrado, columnas, nombre=nombre)
+
+
+cubo = datos_anio(ANIO_DEFECTO)['cubo']
+indice = datos_anio(ANIO_DEFECTO)['indice']
+
+print("Datos listos para el dashboard.")
+# El DataFrame 'df_tbm_top_10_menor' está listo para el callback.
+print("DataFrame para Gráfico Circular de Menor Mortalidad listo.")
+print(datos_anio(ANIO_DEFECTO)['df_tbm_top_10_menor'][['MUNICIPIO', 'TASA_MORTALIDAD']])
 
+# Geometría simplificada y cuantizada (ver geometria.py); se genera una vez y queda en caché
+try:
+    geojson_data = futuro_geojson.result() if futuro_geojson else cargar_geojson_simplificado()
+except FileNotFoundError:
+    print("¡Advertencia! No se encontró 'Colombia.geo.json'. El mapa no funcionará sin este archivo.")
+    geojson_data = None
+finally:
+    if pool_geometria:
+        pool_geometria.shutdown()
 
-# --- MAPEO DE GRUPOS DE EDAD DANE A CATEGORÍA ---
-def categorizar_grupo_edad(codigo):
-    """Convierte el código numérico de GRUPO_EDAD1 a la categoría descriptiva."""
-    try:
-        codigo = int(codigo) # Asegurar que es un entero para la comparación
-
-        if codigo in range(0, 5): return 'Mortalidad neonatal (<1 mes)'
-        if codigo in range(5, 7): return 'Mortalidad infantil (1 a 11 meses)'
-        if codigo in range(7, 9): return 'Primera infancia (1 a 4 años)'
-        if codigo in range(9, 11): return 'Niñez (5 a 14 años)'
-        if codigo == 11: return 'Adolescencia (15 a 19 años)'
-        if codigo in range(12, 14): return 'Juventud (20 a 29 años)'
-        if codigo in range(14, 17): return 'Adultez temprana (30 a 44 años)'
-        if codigo in range(17, 20): return 'Adultez intermedia (45 a 59 años)'
-        if codigo in range(20, 25): return 'Vejez (60 a 84 años)'
-        if codigo in range(25, 29): return 'Longevidad / Centenarios (85+)'
-        if codigo == 29: return 'Edad desconocida'
-        return 'Código no válido'
-
-    except (ValueError, TypeError):
-        return 'Dato faltante o incorrecto'
-
-# Crea una nueva columna categórica con los nombres descriptivos
-df_final['GRUPO_EDAD_CAT'] = df_final['GRUPO_EDAD1'].apply(categorizar_grupo_edad)
-
-# Suponiendo que el archivo DANE se llama 'proyecciones_poblacion_municipal.xlsx'
-df_poblacion_raw = pd.read_excel('data/proyecciones_poblacion_municipal.xlsx')
-
-# 1. Filtrar solo los datos de 2019 --->>> No consegui los datos del 2019, entonces estoy usando datos del 2020
-print("Iniciando filtrado y preparación del DataFrame de Población...")
-    
- # --- 1. Filtrado Crucial ---
-# a. Filtrar por el año 2019  --->>> No consegui los datos del 2019, entonces estoy usando datos del 2020
-df_poblacion = df_poblacion_raw[df_poblacion_raw['AÑO'] == 2020].copy()
-df_poblacion = df_poblacion[df_poblacion['AREA'] == 'Total'].copy()
-
-# 2. SOLUCIÓN CRUCIAL: Conversión a String y Relleno de Ceros
-df_poblacion['COD_DANE_COMPLETO'] = (
-    df_poblacion['MPIO']
-    .astype(str)   # 1. Convertir a string (ej. 5001.0 -> '5001.0')
-    .str.replace(r'\.0$', '', regex=True) # 2. Eliminar el ".0" si viene de un float (ej. '5001')
-    .str.strip()   # 3. Eliminar espacios en blanco
-    .str.zfill(5)  # 4. Rellenar con ceros a la izquierda hasta tener 5 dígitos (ej. '5001' -> '05001')
+print("Archivo Geoson listo.")
+
+# Nivel de detalle del mapa: con la geometría municipal disponible, seleccionar un
+# departamento cambia el mapa a sus municipios (cargados por departamento)
+MAPA_MUNICIPAL = hay_geometria_municipal()
+if not MAPA_MUNICIPAL:
+    print("Sin geometría municipal: el mapa se mantiene a nivel de departamento.")
+
+# La geometría no viaja dentro de cada figura del mapa: se sirve una vez en
+# /geometria/<versión>/... con caché inmutable y la figura lleva solo su URL
+# (plotly.js la descarga). La versión cambia si cambia la simplificación.
+GEOMETRIA_DEPARTAMENTOS = serializar(geojson_data).encode('utf-8') if geojson_data is not None else None
+_marca_municipios = os.path.join(DIR_CACHE_MUNICIPIOS, 'LISTO')
+VERSION_GEOMETRIA = huella(
+    GEOMETRIA_DEPARTAMENTOS or b'', TOLERANCIA_MUNICIPIOS,
+    os.path.getmtime(_marca_municipios) if os.path.exists(_marca_municipios) else '',
 )
 
-# 3. Renombrar y seleccionar columnas clave
-df_poblacion = df_poblacion.rename(columns={'TOTAL': 'POBLACION_2019'})
-df_poblacion = df_poblacion[['COD_DANE_COMPLETO', 'POBLACION_2019']].copy()
 
-# Asegurar que la población sea numérica y manejar NaN (si los hay)
-df_poblacion['POBLACION_2019'] = pd.to_numeric(df_poblacion['POBLACION_2019'], errors='coerce')
-df_poblacion.dropna(subset=['POBLACION_2019'], inplace=True)
-    
-print(f"DataFrame de Población listo. Registros de 2019: {len(df_poblacion)}")
-print(df_poblacion.head())
+def url_geometria(nombre):
+    return app.get_relative_path(f"/geometria/{VERSION_GEOMETRIA}/{nombre}.geo.json")
 
 
-# 1. Contar el total de muertes por municipio (usando el código DANE completo)
-df_muertes_muni = df_final.groupby('COD_DANE_COMPLETO').size().reset_index(name='Total Muertes')
+@lru_cache(maxsize=8)
+def geometria_municipal_bytes(dpto):
+    geojson = cargar_municipios_departamento(dpto)
+    return serializar(geojson).encode('utf-8') if geojson is not None else None
 
-# 2. Fusionar el conteo de muertes con la población (df_poblacion)
-df_tbm = pd.merge(
-    df_muertes_muni, 
-    df_poblacion, 
-    on='COD_DANE_COMPLETO', 
-    how='inner' # Asegura que solo se incluyan municipios con datos de población en 2019
-)
+# Opciones de los controles, tomadas de los valores presentes en el cubo del año por defecto
+# (los nombres, de sus tablas de dimensiones)
+OPCIONES_ANIO = [{'label': str(anio), 'value': anio} for anio in reversed(ANIOS)]
+_deptos = indice.agregar(cubo, ['COD_DANE_DPTO', 'DEPARTAMENTO']).sort_values('DEPARTAMENTO')
+OPCIONES_DEPARTAMENTO = [
+    {'label': str(nombre), 'value': str(cod)} for cod, nombre, _ in _deptos.itertuples(index=False)
+]
+_mpios = indice.agregar(cubo, ['COD_DANE_COMPLETO', 'MUNICIPIO']).sort_values('MUNICIPIO')
+OPCIONES_MUNICIPIO = {}
+for cod, nombre, _ in _mpios.itertuples(index=False):
+    OPCIONES_MUNICIPIO.setdefault(str(cod)[:2], []).append({'label': str(nombre), 'value': str(cod)})
+OPCIONES_SEXO = [{'label': str(v), 'value': v} for v in indice.opciones('SEXO')]
+OPCIONES_GRUPO_EDAD = [
+    {'label': g, 'value': g} for g in CATEGORIAS_GRUPO_EDAD if g in indice.opciones('GRUPO_EDAD_CAT')
+]
+_capitulos = indice.agregar(cubo, ['CAPITULO', 'CAPITULO_NOMBRE']).sort_values('CAPITULO')
+OPCIONES_CAPITULO = [
+    {'label': f"{cap}. {nombre}", 'value': cap}
+    for cap, nombre in zip(_capitulos['CAPITULO'].tolist(), _capitulos['CAPITULO_NOMBRE'].tolist())
+]
 
-# 3. Calcular la Tasa Bruta de Mortalidad (TBM)
-# TBM = (Total de Muertes / Población) * 100,000
-df_tbm['TASA_MORTALIDAD'] = (df_tbm['Total Muertes'] / df_tbm['POBLACION_2019']) * 100000
+# Modo cliente (ver cliente.py): el mapa, las muertes por mes, la comparación por
+# sexo y la distribución por edad se calculan en el navegador con el cubo compacto;
+# los callbacks del servidor de FIGURAS_SERVIDOR solo reciben los filtros que pasan
+# su granularidad y el de 'sexo' no se registra.
+def callback_figura(figura):
+    """Decorador del callback del servidor de una figura de ``FIGURAS_CLIENTE``."""
+    if not MODO_CLIENTE:
+        return app.callback(Output(FIGURAS_CLIENTE[figura], 'figure'), Input('filtros', 'data'))
+    if figura not in FIGURAS_SERVIDOR:
+        return lambda funcion: funcion # Nunca necesita el servidor: sin callback
+    return app.callback(
+        Output(FIGURAS_CLIENTE[figura], 'figure', allow_duplicate=True),
+        Input(f'servidor-{figura}', 'data'),
+        prevent_initial_call=True,
+    )
 
-# 4. Fusionar con DIVIPOLA para obtener el NOMBRE del Municipio
-# Necesitas una versión de df_divipola con la columna 'MUNICIPIO' y 'COD_DANE_COMPLETO'
-df_nombres = df_divipola[['COD_DANE_COMPLETO', 'MUNICIPIO']].drop_duplicates()
 
-df_tbm_completo = pd.merge(
-    df_tbm,
-    df_nombres,
-    on='COD_DANE_COMPLETO',
-    how='left'
-)
+# Figuras ya serializadas por callback y estado de filtros (LRU, opcionalmente en disco).
+# La versión incluye la de la geometría porque el mapa lleva su URL.
+# Versión evaluada en cada consulta: un lote ingerido invalida las figuras ya calculadas
+def version_figuras():
+    return f"{version_datos()}.g{VERSION_GEOMETRIA}"
 
-# 5. Filtrar municipios con población mínima y seleccionar el Top 10 con la TBM más baja
-POBLACION_MINIMA = 10000 # Filtro para excluir municipios rurales muy pequeños y evitar tasas extremas
-df_tbm_final = df_tbm_completo[df_tbm_completo['POBLACION_2019'] >= POBLACION_MINIMA]
 
-# Seleccionar el Top 10 con la Tasa MÁS BAJA (ascendente=True)
-df_tbm_top_10_menor = df_tbm_final.sort_values(by='TASA_MORTALIDAD', ascending=True).head(10)
+cache_figuras = CacheFiguras(version=version_figuras)
 
-# El DataFrame 'df_tbm_top_10_menor' está listo para el callback.
-print("DataFrame para Gráfico Circular de Menor Mortalidad listo.")
-print(df_tbm_top_10_menor[['MUNICIPIO', 'TASA_MORTALIDAD']])
-
-# 1. Lista actualizada para forzar el orden cronológico de las categorías
-ORDEN_GRUPOS_EDAD_FINAL = [
-    'Mortalidad neonatal (<1 mes)', 
-    'Mortalidad infantil (1 a 11 meses)', 
-    'Primera infancia (1 a 4 años)', 
-    'Niñez (5 a 14 años)', 
-    'Adolescencia (15 a 19 años)', 
-    'Juventud (20 a 29 años)', 
-    'Adultez temprana (30 a 44 años)', 
-    'Adultez intermedia (45 a 59 años)', 
-    'Vejez (60 a 84 años)', 
-    'Longevidad / Centenarios (85+)',
-    'Edad desconocida'
-]
 # ----------------------------------------------------------------------
 # --- Fin del Preprocesamiento 
 
 
 
 
+# Niveles de la jerarquía CIE-10 para la tabla de causas: etiqueta de la
+# opción y nombres de las columnas (código, nombre)
+NIVELES_CAUSAS = {
+    'capitulo': ("Capítulo", ['Capítulo CIE-10', 'Nombre del Capítulo']),
+    'bloque': ("Grupo", ['Rango CIE-10', 'Grupo de Causas']),
+    'tres': ("3 caracteres", ['Categoría CIE-10', 'Categoría']),
+    'codigo': ("Código", ['Código CIE-10', 'Causa de Muerte']),
+}
+OPCIONES_NIVEL_CAUSAS = [{'label': etiqueta, 'value': nivel} for nivel, (etiqueta, _) in NIVELES_CAUSAS.items()]
+
+# Lista de nombres de meses en español para etiquetar el eje X
+NOMBRES_MESES = [
+    'Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 
+    'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic'
+]
+
 app = dash.Dash(__name__)
 # Set the page title
 app.title = "Análisis de Mortalidad en Colombia"
@@ -252,7 +299,62 @@ app.layout = html.Div([
     html.Hr(),
     html.H2("Estudiante: Victor Hugo Cardona Cardona", style={'textAlign': 'center'}),
     html.Hr(),
-    html.H1("💀 Análisis de Mortalidad en Colombia (2019) 💀", style={'textAlign': 'center'}),
+    html.H1(f"💀 Análisis de Mortalidad en Colombia ({ANIOS[0]}{'' if len(ANIOS) == 1 else f'-{ANIOS[-1]}'}) 💀", style={'textAlign': 'center'}),
+    html.Hr(),
+
+    # Panel de filtros: todos los gráficos leen el estado combinado de 'filtros'.
+    # Hacer clic en el mapa, en las barras o en el gráfico circular también filtra.
+    dcc.Store(id='filtros', data=FILTROS_VACIOS),
+    # Modo cliente: cubo compacto del año, parámetros de las figuras y, por figura,
+    # los filtros que el navegador no puede resolver con el cubo
+    *([
+        dcc.Store(id='cubo-cliente'),
+        dcc.Store(id='config-cliente', data={
+            'anio_defecto': ANIO_DEFECTO,
+            'mapa_municipal': MAPA_MUNICIPAL,
+            'geometria': url_geometria('departamentos'),
+            'meses': NOMBRES_MESES,
+            'grupos_edad': ORDEN_GRUPOS_EDAD_FINAL,
+            'figuras_servidor': list(FIGURAS_SERVIDOR),
+        }),
+        *[dcc.Store(id=f'servidor-{figura}') for figura in FIGURAS_SERVIDOR],
+    ] if MODO_CLIENTE else []),
+    html.Div([
+        html.Div([
+            html.Label("Año"),
+            dcc.Dropdown(id='filtro-anio', options=OPCIONES_ANIO, value=ANIO_DEFECTO, clearable=False),
+        ], style={'width': '24%', 'display': 'inline-block', 'padding': '0 10px'}),
+        html.Div([
+            html.Label("Departamento"),
+            dcc.Dropdown(id='filtro-departamento', options=OPCIONES_DEPARTAMENTO, placeholder="Todos"),
+        ], style={'width': '24%', 'display': 'inline-block', 'padding': '0 10px'}),
+        html.Div([
+            html.Label("Municipio"),
+            dcc.Dropdown(id='filtro-municipio', options=[], placeholder="Todos"),
+        ], style={'width': '24%', 'display': 'inline-block', 'padding': '0 10px'}),
+        html.Div([
+            html.Label("Sexo"),
+            dcc.Dropdown(id='filtro-sexo', options=OPCIONES_SEXO, multi=True, placeholder="Todos"),
+        ], style={'width': '24%', 'display': 'inline-block', 'padding': '0 10px'}),
+        html.Div([
+            html.Label("Grupo de Edad"),
+            dcc.Dropdown(id='filtro-grupo-edad', options=OPCIONES_GRUPO_EDAD, multi=True, placeholder="Todos"),
+        ], style={'width': '24%', 'display': 'inline-block', 'padding': '0 10px'}),
+        html.Div([
+            html.Label("Capítulo CIE-10"),
+            dcc.Dropdown(id='filtro-capitulo', options=OPCIONES_CAPITULO, multi=True, placeholder="Todos"),
+        ], style={'width': '49%', 'display': 'inline-block', 'padding': '0 10px'}),
+        html.Div([
+            html.Label("Meses"),
+            dcc.RangeSlider(
+                id='filtro-meses', min=1, max=12, step=1, value=[1, 12],
+                marks={i + 1: nombre for i, nombre in enumerate(NOMBRES_MESES)}
+            ),
+        ], style={'width': '39%', 'display': 'inline-block', 'padding': '0 10px', 'verticalAlign': 'bottom'}),
+        html.Div([
+            html.Button("Limpiar filtros", id='limpiar-filtros', n_clicks=0),
+        ], style={'width': '10%', 'display': 'inline-block', 'verticalAlign': 'bottom'}),
+    ]),
     html.Hr(),
 
     # Contenedor para el Mapa y el Gráfico de Barras Apiladas (Visualizaciones Regionales)
@@ -287,6 +389,10 @@ app.layout = html.Div([
 
         html.Div([
             html.H3("Top 10 Causas de Muerte"),
+            dcc.RadioItems(
+                id='nivel-causas', options=OPCIONES_NIVEL_CAUSAS, value='codigo', inline=True,
+                inputStyle={'margin': '0 4px 0 12px'}
+            ),
             html.Div(id='tabla-top-causas'),
         ], style={'width': '49%', 'display': 'inline-block', 'padding': '0 20'}),
     ]),
@@ -308,35 +414,58 @@ app.layout = html.Div([
 
 # --- Callbacks para Generar los Gráficos (La lógica) ---
 
-# Asegúrate de usar 'df_final' de tu preprocesamiento
-@app.callback(
-    Output('mapa-departamentos', 'figure'),
-    [Input('mapa-departamentos', 'id')] # Input dummy
+# Todos los gráficos se calculan sobre el cubo filtrado por el estado de 'filtros'
+@callback_figura('mapa')
+@cache_figuras.memoizar(
+    'mapa', ignorar=('municipio',) if MAPA_MUNICIPAL else ('departamento', 'municipio')
 )
-def update_map_chart(_):
+def update_map_chart(filtros):
     if geojson_data is None:
         # Devuelve una figura vacía o de error si el GeoJSON no se cargó
         return px.scatter(title="Error: GeoJSON no disponible para el mapa.")
-    
-    # --- 1. Agregación de Datos ---
-    # Contar el total de muertes por el código DANE de 2 dígitos (COD_DANE_DPTO)
-    # Se usa el código DANE de 2 dígitos para coincidir con la clave del GeoJSON.
-    df_mapa = df_final.groupby('COD_DANE_DPTO').size().reset_index(name='Total Muertes')
-
-    # --- 2. Creación del Mapa Coroplético (Choropleth) ---
-    fig = px.choropleth(
-        df_mapa, 
-        geojson=geojson_data,
-        locations='COD_DANE_DPTO',  # Columna de datos con los códigos DANE de 2 dígitos
-        color='Total Muertes',      # Columna que define el color (intensidad de muertes)
-        featureidkey="properties.DPTO", # Clave en el GeoJSON que contiene el código DANE
-        
-        # Parámetros visuales
-        color_continuous_scale="Reds",  # Escala de color
-        title="Distribución Total de Muertes por Departamento, Colombia 2019",
-        labels={'Total Muertes': 'Total Muertes Registradas'},
-        height=650
-    )
+
+    departamento = (filtros or {}).get('departamento')
+    hay_municipios = MAPA_MUNICIPAL and departamento and geometria_municipal_bytes(departamento) is not None
+
+    if hay_municipios:
+        # --- Vista municipal: solo los polígonos del departamento seleccionado ---
+        # El filtro de municipio se ignora para poder comparar con el resto del departamento
+        df_mapa = agregar_filtrado(filtros, ['COD_DANE_COMPLETO', 'MUNICIPIO'], ignorar=('municipio',))
+        df_mapa['COD_DANE_COMPLETO'] = df_mapa['COD_DANE_COMPLETO'].astype(str)
+        nombre_dpto = next((o['label'] for o in OPCIONES_DEPARTAMENTO if o['value'] == departamento), departamento)
+        fig = px.choropleth(
+            df_mapa,
+            geojson=url_geometria(f"municipios/{departamento}"),
+            locations='COD_DANE_COMPLETO',  # Código DANE de 5 dígitos
+            color='Total Muertes',
+            featureidkey=f"properties.{CLAVE_MUNICIPIO}",
+            hover_name='MUNICIPIO',
+            color_continuous_scale="Reds",
+            title=f"Distribución Total de Muertes por Municipio, {nombre_dpto} {anio_de(filtros)}",
+            labels={'Total Muertes': 'Total Muertes Registradas'},
+            height=650
+        )
+    else:
+        # --- 1. Agregación de Datos ---
+        # Contar el total de muertes por el código DANE de 2 dígitos (COD_DANE_DPTO)
+        # Se usa el código DANE de 2 dígitos para coincidir con la clave del GeoJSON.
+        # El mapa ignora el filtro geográfico para que se pueda seguir eligiendo otro departamento
+        df_mapa = agregar_filtrado(filtros, ['COD_DANE_DPTO'], ignorar=('departamento', 'municipio'))
+
+        # --- 2. Creación del Mapa Coroplético (Choropleth) ---
+        fig = px.choropleth(
+            df_mapa,
+            geojson=url_geometria('departamentos'),
+            locations='COD_DANE_DPTO',  # Columna de datos con los códigos DANE de 2 dígitos
+            color='Total Muertes',      # Columna que define el color (intensidad de muertes)
+            featureidkey="properties.DPTO", # Clave en el GeoJSON que contiene el código DANE
+
+            # Parámetros visuales
+            color_continuous_scale="Reds",  # Escala de color
+            title=f"Distribución Total de Muertes por Departamento, Colombia {anio_de(filtros)}",
+            labels={'Total Muertes': 'Total Muertes Registradas'},
+            height=650
+        )
     
     # --- 3. Ajustes de Layout Geográfico ---
     # Centrar y enfocar el mapa en Colombia
@@ -361,20 +490,12 @@ def update_map_chart(_):
 
 
 
-# Lista de nombres de meses en español para etiquetar el eje X
-NOMBRES_MESES = [
-    'Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 
-    'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic'
-]
-
-@app.callback(
-    Output('lineas-mensual', 'figure'),
-    [Input('lineas-mensual', 'id')] # Input dummy para que se ejecute al cargar
-)
-def update_line_chart(_):
+@callback_figura('mensual')
+@cache_figuras.memoizar('lineas')
+def update_line_chart(filtros):
     # --- 1. Agregación de Datos ---
     # Contar el total de muertes por el número de mes (columna 'MES')
-    df_mensual = df_final.groupby('MES').size().reset_index(name='Total Muertes')
+    df_mensual = agregar_filtrado(filtros, ['MES'])
     
     # Asegurar que todos los meses (1 a 12) estén presentes, llenando con 0 si es necesario
     df_meses_completos = pd.DataFrame({'MES': range(1, 13)})
@@ -389,7 +510,7 @@ def update_line_chart(_):
         df_mensual, 
         x='Nombre Mes', 
         y='Total Muertes', 
-        title='Total de Muertes por Mes en Colombia (2019)',
+        title=f'Total de Muertes por Mes en Colombia ({anio_de(filtros)})',
         labels={'Nombre Mes': 'Mes', 'Total Muertes': 'Total de Muertes'},
         markers=True,  # Mostrar puntos en cada mes
         line_shape='spline', # Suavizar la línea de tendencia
@@ -412,25 +533,26 @@ def update_line_chart(_):
     return fig
 
 
-# Lista de los códigos CIE-10 que representan los homicidios (violencia)
+# Rangos de códigos CIE-10 que representan los homicidios (violencia)
 # NOTA: Debes verificar que estos códigos coincidan con tu archivo de datos.
-CODIGOS_HOMICIDIO = ['X950','X951','X952','X953','X954','X955','X956','X957','X958','X959','Y871'] 
-# Aquí usamos X95 (disparo)
+# Aquí usamos X95 (disparo) y Y871 (secuelas de agresiones); todas las
+# agresiones serían ('X85', 'Y09').
+RANGOS_HOMICIDIO = [('X95', 'X95'), ('Y871', 'Y871')]
 
 @app.callback(
     Output('barras-violencia', 'figure'),
-    [Input('barras-violencia', 'id')] # Input dummy para que se ejecute al cargar
+    [Input('filtros', 'data')]
 )
-def update_violencia_bar_chart(_):
-    # --- 1. Filtrado de Datos ---
-    # Filtrar el DataFrame final para incluir solo las filas que coinciden con los códigos de homicidio
-    df_violencia = df_final[df_final['CAUSA_CODIGO'].isin(CODIGOS_HOMICIDIO)].copy()
-
-    # --- 2. Agregación y Top 5 ---
-    # Contar los casos por municipio
-    df_top_ciudades = df_violencia.groupby('MUNICIPIO').size().reset_index(name='Total Homicidios')
+@cache_figuras.memoizar('violencia')
+def update_violencia_bar_chart(filtros):
+    # --- 1. Filtrado y Agregación ---
+    # Solo las celdas con códigos de homicidio (rangos CIE-10); los casos se cuentan por
+    # municipio (el código DANE va en customdata para filtrar al hacer clic)
+    df_top_ciudades = agregar_filtrado(
+        filtros, ['COD_DANE_COMPLETO', 'MUNICIPIO'], nombre='Total Homicidios', rangos=RANGOS_HOMICIDIO
+    )
     
-    # Ordenar y seleccionar el Top 5
+    # --- 2. Top 5 ---
     df_top_5 = df_top_ciudades.sort_values(by='Total Homicidios', ascending=False).head(5)
 
     # --- 3. Creación del Gráfico (Plotly Express) ---
@@ -438,11 +560,12 @@ def update_violencia_bar_chart(_):
         df_top_5,
         x='MUNICIPIO',
         y='Total Homicidios',
-        title='Top 5 Ciudades con Mayor Número de Homicidios (2019)',
+        title=f'Top 5 Ciudades con Mayor Número de Homicidios ({anio_de(filtros)})',
         labels={'MUNICIPIO': 'Ciudad', 'Total Homicidios': 'Número de Homicidios'},
         color='Total Homicidios', # Usar el conteo para la intensidad de color
         color_continuous_scale=px.colors.sequential.YlOrRd, # Escala de color que indica peligro
         text='Total Homicidios', # Mostrar el valor exacto sobre la barra
+        custom_data=['COD_DANE_COMPLETO'],
         height=500
     )
     
@@ -459,19 +582,19 @@ def update_violencia_bar_chart(_):
 
 @app.callback(
     Output('tabla-top-causas', 'children'),
-    [Input('tabla-top-causas', 'id')] # Input dummy
+    [Input('filtros', 'data'),
+     Input('nivel-causas', 'value')]
 )
-def update_top_causes_table(_):
-    # --- 1. Agregación y Conteo ---
-    # Agrupar por el código y el nombre de la causa de muerte y contar las ocurrencias.
-    df_causas_agg = df_final.groupby(['CAUSA_CODIGO', 'CAUSA_NOMBRE']).size().reset_index(name='Total Casos')
-
-    # --- 2. Selección del Top 10 ---
-    # Ordenar de mayor a menor y tomar solo las 10 primeras filas.
-    df_top_10_causas = df_causas_agg.sort_values(by='Total Casos', ascending=False).head(10)
-    
+@cache_figuras.memoizar('top-causas')
+def update_top_causes_table(filtros, nivel='codigo'):
+    # --- 1. Agregación, Conteo y Top 10 ---
+    # Sumar las muertes por el nivel elegido de la jerarquía CIE-10 (capítulo,
+    # grupo, categoría o código) con el índice de causas y tomar las 10 primeras.
+    indice = indice_de(filtros)
+    df_top_10_causas = indice.top_causas(indice.filtrar(filtros), nivel, n=10)
+
     # Renombrar columnas para la tabla final
-    df_top_10_causas.columns = ['Código CIE-10', 'Causa de Muerte', 'Total Casos']
+    df_top_10_causas.columns = NIVELES_CAUSAS[nivel][1] + ['Total Casos']
 
     # --- 3. Creación de la Tabla (dash_table.DataTable) ---
     tabla_html = dash.dash_table.DataTable(
@@ -510,15 +633,14 @@ def update_top_causes_table(_):
 
 
 #Gráfico de Barras Apiladas (Muertes por Sexo y Departamento)
-@app.callback(
-    Output('barras-apiladas-sexo', 'figure'),
-    [Input('barras-apiladas-sexo', 'id')] # Input dummy para que se ejecute al cargar
-)
-def update_stacked_bar_chart(_):
+@callback_figura('sexo')
+@cache_figuras.memoizar('barras-sexo', ignorar=('departamento', 'municipio'))
+def update_stacked_bar_chart(filtros):
     # --- 1. Agregación de Datos ---
     # Contar el total de muertes por DEPARTAMENTO y por SEXO
     # El resultado tendrá tres columnas: DEPARTAMENTO, SEXO, y Total Muertes.
-    df_agg = df_final.groupby(['DEPARTAMENTO', 'SEXO']).size().reset_index(name='Total Muertes')
+    # Igual que el mapa, ignora el filtro geográfico para comparar departamentos
+    df_agg = agregar_filtrado(filtros, ['COD_DANE_DPTO', 'DEPARTAMENTO', 'SEXO'], ignorar=('departamento', 'municipio'))
 
     # --- 2. Preparación para Plotly Express ---
     # Opcional: Para el orden visual en el gráfico, puedes ordenar por el total general de muertes
@@ -532,9 +654,10 @@ def update_stacked_bar_chart(_):
         x='DEPARTAMENTO',
         y='Total Muertes',
         color='SEXO',          # Columna usada para apilar las barras (Hombres vs. Mujeres)
-        title='Comparación de Muertes por Sexo y Departamento, Colombia 2019',
+        title=f'Comparación de Muertes por Sexo y Departamento, Colombia {anio_de(filtros)}',
         labels={'DEPARTAMENTO': 'Departamento', 'Total Muertes': 'Total de Casos'},
         barmode='stack',       # Configura las barras para que se apilen
+        custom_data=['COD_DANE_DPTO'],
         height=600,
         color_discrete_map={
             'MASCULINO': '#1f77b4', # Color para hombres
@@ -553,11 +676,16 @@ def update_stacked_bar_chart(_):
 
 @app.callback(
     Output('circular-menor-mortalidad', 'figure'),
-    [Input('circular-menor-mortalidad', 'id')] # Input dummy
+    [Input('filtros', 'data')]
 )
-def update_pie_chart_menor_mortalidad(_):
-    # Usar el DataFrame de tasas precalculado
-    df_pie = df_tbm_top_10_menor.copy()
+@cache_figuras.memoizar('circular')
+def update_pie_chart_menor_mortalidad(filtros):
+    # Sin filtros (aparte del año) se usa el DataFrame de tasas precalculado
+    datos = datos_anio(anio_de(filtros))
+    if normalizar_filtros(filtros, ignorar=('anio',)):
+        df_pie = top_menor_mortalidad(datos['tasas'].tasas(filtros))
+    else:
+        df_pie = datos['df_tbm_top_10_menor'].copy()
     
     # Crear la etiqueta para el gráfico circular: Ciudad (Tasa)
     df_pie['Etiqueta'] = df_pie['MUNICIPIO'] + ' (' + df_pie['TASA_MORTALIDAD'].round(1).astype(str) + ')'
@@ -567,10 +695,11 @@ def update_pie_chart_menor_mortalidad(_):
         df_pie,
         values='TASA_MORTALIDAD',
         names='Etiqueta', # Usar la etiqueta combinada para el hover y la leyenda
-        title='Top 10 Municipios con Menor Tasa Bruta de Mortalidad (2019)',
+        title=f'Top 10 Municipios con Menor Tasa Bruta de Mortalidad ({anio_de(filtros)})',
         hole=.4, # Crear un "donut chart" para mejor visualización
         height=600,
         color_discrete_sequence=px.colors.sequential.Teal, # Escala de color que indica seguridad/bienestar
+        custom_data=['COD_DANE_COMPLETO'],
     )
     
     # Ajustes de Layout
@@ -589,17 +718,20 @@ def update_pie_chart_menor_mortalidad(_):
 
 
 
-@app.callback(
-    Output('histograma-edad', 'figure'),
-    [Input('histograma-edad', 'id')]
-)
-def update_age_histogram(_):
-    # --- 1. Creación del Histograma (Plotly Express) ---
-    fig = px.histogram(
-        df_final,
+@callback_figura('edad')
+@cache_figuras.memoizar('histograma')
+def update_age_histogram(filtros):
+    # --- 1. Agregación y Gráfico de Barras (Plotly Express) ---
+    # Las muertes se suman por grupo de edad en el servidor: la figura lleva una
+    # barra por categoría, no un valor por celda o registro para agrupar en el navegador
+    df_edad = agregar_filtrado(filtros, ['GRUPO_EDAD_CAT'], nombre=COL_MUERTES)
+    df_edad['GRUPO_EDAD_CAT'] = df_edad['GRUPO_EDAD_CAT'].astype(str)
+    fig = px.bar(
+        df_edad,
         x='GRUPO_EDAD_CAT', # Usamos la nueva columna categórica
-        title='Distribución de Muertes por Grupo de Edad (2019)',
-        labels={'GRUPO_EDAD_CAT': 'Grupo de Edad', 'count': 'Total de Muertes'},
+        y=COL_MUERTES,
+        title=f'Distribución de Muertes por Grupo de Edad ({anio_de(filtros)})',
+        labels={'GRUPO_EDAD_CAT': 'Grupo de Edad', COL_MUERTES: 'Total de Muertes'},
         color_discrete_sequence=['#4c78a8'], 
         height=550
     )
@@ -621,10 +753,396 @@ def update_age_histogram(_):
     return fig
 
 
+# --- Modo cliente: callbacks en el navegador (assets/cliente.js) ---
+if MODO_CLIENTE:
+    @lru_cache(maxsize=MAX_ANIOS_EN_MEMORIA)
+    def _cubo_cliente(anio, version):
+        return cubo_cliente(datos_anio(anio)['indice'], anio)
+
+    @app.callback(
+        Output('cubo-cliente', 'data'),
+        [Input('filtro-anio', 'value')]
+    )
+    def enviar_cubo_cliente(anio):
+        """Cubo compacto del año: se envía una vez por cambio de año."""
+        anio = anio or ANIO_DEFECTO
+        return _cubo_cliente(anio, version_particion(anio))
+
+    # Reparte los filtros: a cada figura que el cubo no alcanza a resolver le llegan por su store
+    app.clientside_callback(
+        ClientsideFunction(namespace='mortalidad', function_name='enrutar'),
+        [Output(f'servidor-{figura}', 'data') for figura in FIGURAS_SERVIDOR],
+        [Input('filtros', 'data')],
+        [State('config-cliente', 'data')]
+    )
+    for _figura, _grafico in FIGURAS_CLIENTE.items():
+        app.clientside_callback(
+            ClientsideFunction(namespace='mortalidad', function_name=_figura),
+            Output(_grafico, 'figure'),
+            [Input('filtros', 'data'),
+             Input('cubo-cliente', 'data')],
+            [State('config-cliente', 'data')]
+        )
+
+
+# --- Callbacks de Filtros Cruzados ---
+
+def _valor_click(click_data):
+    """Código DANE guardado en customdata del punto sobre el que se hizo clic."""
+    if not click_data:
+        return None
+    valor = click_data['points'][0].get('customdata')
+    if isinstance(valor, list):
+        valor = valor[0]
+    return valor
+
+
+def _disparadores():
+    return {t['prop_id'] for t in dash.callback_context.triggered}
+
+
+@app.callback(
+    Output('filtro-departamento', 'value'),
+    [Input('mapa-departamentos', 'clickData'),
+     Input('barras-apiladas-sexo', 'clickData'),
+     Input('barras-violencia', 'clickData'),
+     Input('circular-menor-mortalidad', 'clickData'),
+     Input('limpiar-filtros', 'n_clicks')],
+    prevent_initial_call=True
+)
+def seleccionar_departamento(click_mapa, click_sexo, click_violencia, click_circular, _):
+    disparadores = _disparadores()
+    if 'limpiar-filtros.n_clicks' in disparadores:
+        return None
+    if 'mapa-departamentos.clickData' in disparadores and click_mapa:
+        # En la vista municipal la ubicación es un código de 5 dígitos
+        return click_mapa['points'][0]['location'][:2]
+    if 'barras-apiladas-sexo.clickData' in disparadores:
+        return _valor_click(click_sexo) or dash.no_update
+    # Clic sobre un municipio: seleccionar también su departamento
+    click = click_violencia if 'barras-violencia.clickData' in disparadores else click_circular
+    municipio = _valor_click(click)
+    return municipio[:2] if municipio else dash.no_update
+
+
+@app.callback(
+    Output('filtro-municipio', 'options'),
+    [Input('filtro-departamento', 'value')]
+)
+def actualizar_opciones_municipio(departamento):
+    return OPCIONES_MUNICIPIO.get(departamento, []) if departamento else []
+
+
+@app.callback(
+    Output('filtro-municipio', 'value'),
+    [Input('mapa-departamentos', 'clickData'),
+     Input('barras-violencia', 'clickData'),
+     Input('circular-menor-mortalidad', 'clickData'),
+     Input('filtro-departamento', 'value'),
+     Input('limpiar-filtros', 'n_clicks')],
+    [State('filtro-municipio', 'value')],
+    prevent_initial_call=True
+)
+def seleccionar_municipio(click_mapa, click_violencia, click_circular, departamento, _, municipio):
+    disparadores = _disparadores()
+    if 'limpiar-filtros.n_clicks' in disparadores:
+        return None
+    if 'mapa-departamentos.clickData' in disparadores and click_mapa:
+        ubicacion = click_mapa['points'][0]['location']
+        if len(ubicacion) == 5:
+            return ubicacion
+    if 'barras-violencia.clickData' in disparadores:
+        return _valor_click(click_violencia) or dash.no_update
+    if 'circular-menor-mortalidad.clickData' in disparadores:
+        return _valor_click(click_circular) or dash.no_update
+    # Cambió el departamento: descartar un municipio que ya no le pertenece
+    if municipio and (not departamento or not municipio.startswith(departamento)):
+        return None
+    return dash.no_update
+
+
+@app.callback(
+    [Output('filtro-sexo', 'value'),
+     Output('filtro-grupo-edad', 'value'),
+     Output('filtro-meses', 'value'),
+     Output('filtro-capitulo', 'value')],
+    [Input('limpiar-filtros', 'n_clicks')],
+    prevent_initial_call=True
+)
+def limpiar_filtros(_):
+    return [], [], [1, 12], []
+
+
+@app.callback(
+    Output('filtros', 'data'),
+    [Input('filtro-anio', 'value'),
+     Input('filtro-departamento', 'value'),
+     Input('filtro-municipio', 'value'),
+     Input('filtro-sexo', 'value'),
+     Input('filtro-grupo-edad', 'value'),
+     Input('filtro-meses', 'value'),
+     Input('filtro-capitulo', 'value')]
+)
+def actualizar_filtros(anio, departamento, municipio, sexo, grupo_edad, meses, capitulo):
+    """Combina los controles en el estado de filtros que leen todos los gráficos."""
+    return {
+        'anio': anio,
+        'departamento': departamento,
+        'municipio': municipio,
+        'sexo': sexo or [],
+        'grupo_edad': grupo_edad or [],
+        'meses': meses or [1, 12],
+        'capitulo': capitulo or [],
+    }
+
+
+# --- Precálculo de las vistas más comunes ---
+# Al arrancar cada worker (ver gunicorn.conf.py) un hilo llena la caché de figuras
+# con la vista por defecto y los filtros más usados: cada sexo, cada grupo de edad
+# y cada departamento (de más a menos muertes), hasta PRECALENTAR_VISTAS estados.
+PRECALENTAR = os.environ.get('PRECALENTAR', '1') != '0'
+PRECALENTAR_VISTAS = int(os.environ.get('PRECALENTAR_VISTAS', 24))
+
+
+def _top_causas_por_codigo(filtros):
+    # Mismos argumentos que envía Dash con el selector de nivel por defecto (misma llave en la caché)
+    return update_top_causes_table(filtros, 'codigo')
+
+
+CALLBACKS_PRECALENTAR = [
+    update_map_chart, update_line_chart, update_violencia_bar_chart, _top_causas_por_codigo,
+    update_stacked_bar_chart, update_pie_chart_menor_mortalidad, update_age_histogram,
+]
+if MODO_CLIENTE:
+    # Estas figuras las calcula el navegador; el servidor solo las recibe con un municipio
+    _calculadas_en_cliente = (update_map_chart, update_line_chart, update_stacked_bar_chart, update_age_histogram)
+    CALLBACKS_PRECALENTAR = [c for c in CALLBACKS_PRECALENTAR if c not in _calculadas_en_cliente]
+
+
+def vistas_precalentar():
+    """Estados de filtros a precalcular, en orden de prioridad (como los arma ``actualizar_filtros``)."""
+    defecto = actualizar_filtros(ANIO_DEFECTO, None, None, [], [], [1, 12], [])
+    vistas = [defecto]
+    vistas += [dict(defecto, sexo=[opcion['value']]) for opcion in OPCIONES_SEXO]
+    vistas += [dict(defecto, grupo_edad=[opcion['value']]) for opcion in OPCIONES_GRUPO_EDAD]
+    por_muertes = _deptos.sort_values('Total Muertes', ascending=False, kind='stable')['COD_DANE_DPTO']
+    vistas += [dict(defecto, departamento=str(cod)) for cod in por_muertes]
+    # No se precalculan más figuras de las que caben en la caché en memoria
+    maximo = min(PRECALENTAR_VISTAS, cache_figuras.max_entradas // len(CALLBACKS_PRECALENTAR))
+    return vistas[:maximo]
+
+
+precalentamiento = Precalentamiento(CALLBACKS_PRECALENTAR, vistas_precalentar() if PRECALENTAR else [])
+
+
+def iniciar_precalentamiento():
+    """Arranca el precálculo en segundo plano; se llama en cada worker, no en el maestro."""
+    if PRECALENTAR:
+        precalentamiento.iniciar()
+
+
 # 1. Necesitas exponer el objeto del servidor de Flask subyacente de Dash.
 # Esto es lo que Gunicorn buscará.
 server = app.server
 
+# Latencia y bytes de cada callback, expuestos en /metrics junto con las etapas
+metricas.instrumentar_servidor(server)
+
+
+@server.route('/cache-figuras')
+def estado_cache_figuras():
+    """Contadores de aciertos y fallos de la caché de figuras, para ajustar su tamaño."""
+    return cache_figuras.estadisticas()
+
+
+# Compresión (gzip/brotli) de las respuestas (ver respuestas.py)
+configurar_respuestas(server)
+
+
+# --- API de datos ---
+# Los parámetros llegan como JSON en el cuerpo o en la query string (filtros como JSON)
+def _param_columnas(parametros, nombre='agrupar'):
+    columnas = parametros.get(nombre) or []
+    if isinstance(columnas, str):
+        columnas = [col.strip() for col in columnas.split(',') if col.strip()]
+    return list(columnas)
+
+
+def _param_filtros(parametros):
+    filtros = parametros.get('filtros') or {}
+    if isinstance(filtros, str):
+        filtros = json.loads(filtros)
+    if not isinstance(filtros, dict):
+        raise ValueError("filtros debe ser un objeto JSON")
+    return filtros
+
+
+def _param_entero(parametros, nombre, defecto=None):
+    valor = parametros.get(nombre)
+    return int(valor) if valor not in (None, '') else defecto
+
+
+@server.route('/api/consulta', methods=['GET', 'POST'])
+def api_consulta():
+    """Agregación ad hoc en el motor SQL.
+
+    Parámetros (JSON en el cuerpo o en la query string): ``agrupar``
+    (columnas, lista o separadas por comas), ``filtros`` (formato del
+    dashboard; sin ``anio`` se consultan todos los años), ``causas`` (rangos
+    CIE-10 ``[["X85", "Y09"], ...]``), ``orden`` ('asc'/'desc') y ``limite``
+    (filas, hasta ``MAX_LIMITE``, que es también el valor por defecto).
+    """
+    motor = motor_sql()
+    if motor is None:
+        return jsonify(error="Motor SQL desactivado (defina MOTOR_SQL=duckdb, sqlite o auto)."), 503
+    parametros = request.get_json(silent=True) or request.args.to_dict()
+    try:
+        agrupar = _param_columnas(parametros)
+        filtros = _param_filtros(parametros)
+        causas = parametros.get('causas') or None
+        if isinstance(causas, str):
+            causas = json.loads(causas)
+        if causas is not None:
+            causas = [(str(desde), str(hasta)) for desde, hasta in causas]
+        limite = _param_entero(parametros, 'limite', MAX_LIMITE)
+
+        inicio = time.perf_counter()
+        df = motor.agregar(agrupar, filtros, rangos=causas, orden=parametros.get('orden'), limite=limite)
+    except (ValueError, TypeError) as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(
+        backend=motor.backend,
+        columnas=list(df.columns),
+        filas=df.astype(object).where(df.notna(), None).values.tolist(),
+        segundos=round(time.perf_counter() - inicio, 4),
+    )
+
+
+def _anios_exportacion(filtros):
+    """Años pedidos en ``filtros`` (un año, una lista o, sin ``anio``, todos)."""
+    anios = filtros.get('anio')
+    if anios is None:
+        return ANIOS
+    anios = [int(anio) for anio in (anios if isinstance(anios, list) else [anios])]
+    desconocidos = [anio for anio in anios if anio not in ANIOS]
+    if desconocidos:
+        raise ValueError(f"Años sin datos: {desconocidos}; disponibles: {ANIOS}")
+    return anios
+
+
+def tablas_exportacion(conjunto, filtros, parametros):
+    """``(anio, DataFrame, filtros por bloque, dimensiones)`` de cada año de ``conjunto``.
+
+    Los registros son la tabla de la partición (mapeada en memoria, se
+    filtran por bloques al enviarlos); las tasas y los agregados se calculan
+    antes, son pequeños.
+    """
+    tablas = []
+    for anio in _anios_exportacion(filtros):
+        filtros_anio = dict(filtros, anio=anio)
+        if conjunto == 'registros':
+            datos = registros_anio(anio)
+            tablas.append((anio, datos['df_final'], filtros_anio, datos['dimensiones']))
+        elif conjunto == 'tasas':
+            tasas = datos_anio(anio)['tasas'].tasas(
+                filtros_anio, geo=parametros.get('geo') or 'municipio', causa=parametros.get('causa') or None,
+                por=_param_columnas(parametros, 'por'), ajustada=parametros.get('ajustada') in ('1', 'true'),
+            )
+            tablas.append((anio, tasas, None, None))
+        elif conjunto == 'agregado':
+            columnas = _param_columnas(parametros)
+            if not columnas:
+                raise ValueError("El conjunto 'agregado' necesita el parámetro 'agrupar' "
+                                 "(columnas separadas por comas, ej. agrupar=DEPARTAMENTO,SEXO).")
+            desconocidas = [col for col in columnas if col not in COLUMNAS_SQL or col == 'ANIO']
+            if desconocidas:
+                raise ValueError(f"Columnas desconocidas: {desconocidas}")
+            tablas.append((anio, agregar_filtrado(filtros_anio, columnas), None, None))
+        elif conjunto == 'causas':
+            nivel = parametros.get('nivel') or 'codigo'
+            if nivel not in NIVELES_CAUSAS:
+                raise ValueError(f"nivel debe ser uno de {list(NIVELES_CAUSAS)}")
+            indice = indice_de(filtros_anio)
+            tablas.append((anio, indice.top_causas(indice.filtrar(filtros_anio), nivel, n=MAX_FILAS_EXPORTACION), None, None))
+        elif conjunto == 'mensual':
+            df_mensual = pd.merge(pd.DataFrame({'MES': range(1, 13)}), agregar_filtrado(filtros_anio, ['MES']),
+                                  on='MES', how='left').fillna(0)
+            tablas.append((anio, df_mensual.astype({'Total Muertes': 'int64'}), None, None))
+        else:
+            raise KeyError(conjunto)
+    return tablas
+
+
+CONJUNTOS_EXPORTACION = ('registros', 'tasas', 'agregado', 'causas', 'mensual')
+
+
+@server.route('/api/exportar/<conjunto>.<formato>')
+def api_exportar(conjunto, formato):
+    """Exporta ``conjunto`` en CSV, JSON Lines o Parquet, enviado por bloques (ver exportacion.py).
+
+    Parámetros en la query string: ``filtros`` (JSON; sin ``anio``, todos los
+    años), ``desde`` y ``limite`` (paginación), ``agrupar`` (columnas de
+    'agregado'), ``nivel`` (de 'causas') y ``geo``, ``causa``, ``por`` y
+    ``ajustada`` (de 'tasas', ver tasas.py).
+    """
+    if conjunto not in CONJUNTOS_EXPORTACION:
+        return jsonify(error=f"Conjunto desconocido: '{conjunto}' ({', '.join(CONJUNTOS_EXPORTACION)})"), 404
+    error = formato_disponible(formato)
+    if error is not None:
+        return jsonify(error=error), 404 if formato not in FORMATOS else 501
+    parametros = request.args.to_dict()
+    try:
+        filtros = _param_filtros(parametros)
+        desde = _param_entero(parametros, 'desde', 0)
+        limite = _param_entero(parametros, 'limite')
+        tablas = tablas_exportacion(conjunto, filtros, parametros)
+    except (ValueError, TypeError) as e:
+        return jsonify(error=str(e)), 400
+    columnas = ['ANIO'] + list(tablas[0][1].columns)
+
+    def bloques_anios():
+        for anio, df, filtros_anio, dimensiones in tablas:
+            for bloque in bloques(df, filtros_anio, dimensiones):
+                yield bloque.assign(ANIO=anio)[columnas]
+
+    return respuesta_exportacion(paginar(bloques_anios(), desde, limite), formato, columnas, conjunto)
+
+
+@server.route('/geometria/<version>/departamentos.geo.json')
+def geometria_departamentos(version):
+    """GeoJSON simplificado de los departamentos (inmutable para cada versión)."""
+    if version != VERSION_GEOMETRIA or GEOMETRIA_DEPARTAMENTOS is None:
+        return "Geometría no disponible", 404
+    return respuesta_cacheable(GEOMETRIA_DEPARTAMENTOS)
+
+
+@server.route('/geometria/<version>/municipios/<dpto>.geo.json')
+def geometria_municipios(version, dpto):
+    """GeoJSON de los municipios de un departamento (inmutable para cada versión)."""
+    datos = geometria_municipal_bytes(dpto) if version == VERSION_GEOMETRIA and MAPA_MUNICIPAL else None
+    if datos is None:
+        return "Geometría no disponible", 404
+    return respuesta_cacheable(datos)
+
+
+@server.route('/listo')
+def disponibilidad():
+    """Disponibilidad para el balanceador: 503 con el avance mientras se precalculan las figuras."""
+    estado = precalentamiento.estado()
+    return jsonify(estado), 200 if not PRECALENTAR or precalentamiento.listo() else 503
+
+
+@server.route('/metrics')
+def metricas_prometheus():
+    """Métricas de etapas, callbacks y caché de figuras en formato de texto de Prometheus."""
+    estadisticas = cache_figuras.estadisticas()
+    extra = {
+        f"mortalidad_cache_figuras_{clave}": valor
+        for clave, valor in estadisticas.items() if isinstance(valor, (int, float))
+    }
+    return metricas.exportar_prometheus(extra), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 if __name__ == '__main__':  
+    iniciar_precalentamiento()
     #app.run_server(debug=True)
     app.run(debug=True)
\ No newline at end of file
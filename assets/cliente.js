@@ -0,0 +1,223 @@
+/*
+ * Modo cliente (MODO_CLIENTE=1, ver cliente.py): figuras calculadas en el
+ * navegador a partir del cubo compacto del año (muertes por departamento,
+ * mes, sexo, grupo de edad y capítulo CIE-10) que el servidor deja en el
+ * store 'cubo-cliente'. Cada función filtra y agrega el cubo y devuelve la
+ * figura; si los filtros necesitan más detalle que el del cubo (un
+ * municipio, el mapa municipal) devuelve no_update y 'enrutar' pasa los
+ * filtros al callback del servidor de esa figura.
+ */
+(function () {
+    function noUpdate() {
+        return window.dash_clientside.no_update;
+    }
+
+    // Única copia de la regla: 'enrutar' la usa para decidir qué filtros pasan al servidor
+    function requiereServidor(figura, filtros, config) {
+        filtros = filtros || {};
+        if (figura === 'mapa') {
+            return Boolean(config.mapa_municipal && filtros.departamento);
+        }
+        return Boolean(filtros.municipio);
+    }
+
+    function anioDe(filtros, config) {
+        return (filtros && filtros.anio) || config.anio_defecto;
+    }
+
+    // Cubo ausente o de otro año (el nuevo todavía no llega): no se dibuja nada
+    function cuboVigente(cubo, filtros, config) {
+        return Boolean(cubo) && cubo.anio === anioDe(filtros, config);
+    }
+
+    // Códigos permitidos de una dimensión según la lista de valores del filtro (null = todos)
+    function permitidos(cubo, columna, seleccion) {
+        if (!seleccion || seleccion.length === 0) {
+            return null;
+        }
+        var valores = cubo.valores[columna];
+        var conjunto = {};
+        for (var i = 0; i < valores.length; i++) {
+            if (seleccion.indexOf(valores[i]) >= 0) {
+                conjunto[i] = true;
+            }
+        }
+        return conjunto;
+    }
+
+    // Sumas de muertes por la llave que devuelve llave(fila) sobre las filas que cumplen los filtros
+    function agregar(cubo, filtros, ignorarGeografia, llave) {
+        filtros = filtros || {};
+        var col = cubo.columnas;
+        var departamento = null;
+        if (!ignorarGeografia && filtros.departamento) {
+            departamento = cubo.valores.COD_DANE_DPTO.indexOf(filtros.departamento);
+        }
+        var sexos = permitidos(cubo, 'SEXO', filtros.sexo);
+        var grupos = permitidos(cubo, 'GRUPO_EDAD_CAT', filtros.grupo_edad);
+        var capitulos = permitidos(cubo, 'CAPITULO', filtros.capitulo);
+        var meses = filtros.meses || [1, 12];
+        var totales = {};
+        for (var i = 0; i < cubo.muertes.length; i++) {
+            if (departamento !== null && col.COD_DANE_DPTO[i] !== departamento) continue;
+            if (sexos && !sexos[col.SEXO[i]]) continue;
+            if (grupos && !grupos[col.GRUPO_EDAD_CAT[i]]) continue;
+            if (capitulos && !capitulos[col.CAPITULO[i]]) continue;
+            if (col.MES[i] < meses[0] || col.MES[i] > meses[1]) continue;
+            var k = llave(i);
+            totales[k] = (totales[k] || 0) + cubo.muertes[i];
+        }
+        return totales;
+    }
+
+    function mapa(filtros, cubo, config) {
+        if (requiereServidor('mapa', filtros, config) || !cuboVigente(cubo, filtros, config)) {
+            return noUpdate();
+        }
+        var totales = agregar(cubo, filtros, true, function (i) { return cubo.columnas.COD_DANE_DPTO[i]; });
+        var codigos = Object.keys(totales);
+        return {
+            data: [{
+                type: 'choropleth',
+                geojson: config.geometria,
+                featureidkey: 'properties.DPTO',
+                locations: codigos.map(function (k) { return cubo.valores.COD_DANE_DPTO[k]; }),
+                z: codigos.map(function (k) { return totales[k]; }),
+                coloraxis: 'coloraxis',
+                hovertemplate: 'COD_DANE_DPTO=%{location}<br>Total Muertes Registradas=%{z}<extra></extra>'
+            }],
+            layout: {
+                title: {text: 'Distribución Total de Muertes por Departamento, Colombia ' + anioDe(filtros, config)},
+                height: 650,
+                geo: {fitbounds: 'locations', visible: false},
+                coloraxis: {
+                    colorscale: 'Reds',
+                    colorbar: {
+                        title: {text: 'Muertes'},
+                        thicknessmode: 'pixels', thickness: 20,
+                        lenmode: 'pixels', len: 300,
+                        yanchor: 'top', y: 1,
+                        xanchor: 'left', x: 0.01
+                    }
+                },
+                margin: {r: 0, t: 40, l: 0, b: 0}
+            }
+        };
+    }
+
+    function mensual(filtros, cubo, config) {
+        if (requiereServidor('mensual', filtros, config) || !cuboVigente(cubo, filtros, config)) {
+            return noUpdate();
+        }
+        var totales = agregar(cubo, filtros, false, function (i) { return cubo.columnas.MES[i]; });
+        var y = config.meses.map(function (_, i) { return totales[i + 1] || 0; });
+        return {
+            data: [{
+                type: 'scatter',
+                x: config.meses,
+                y: y,
+                mode: 'lines+markers',
+                line: {shape: 'spline'},
+                marker: {size: 8},
+                hovertemplate: 'Mes=%{x}<br>Total de Muertes=%{y}<extra></extra>'
+            }],
+            layout: {
+                title: {text: 'Total de Muertes por Mes en Colombia (' + anioDe(filtros, config) + ')'},
+                height: 500,
+                xaxis: {title: {text: 'Mes'}, categoryorder: 'array', categoryarray: config.meses},
+                yaxis: {title: {text: 'Total Muertes'}},
+                hovermode: 'x unified'
+            }
+        };
+    }
+
+    function sexo(filtros, cubo, config) {
+        if (!cuboVigente(cubo, filtros, config)) {
+            return noUpdate();
+        }
+        var nSexos = cubo.valores.SEXO.length;
+        var totales = agregar(cubo, filtros, true, function (i) {
+            return cubo.columnas.COD_DANE_DPTO[i] * nSexos + cubo.columnas.SEXO[i];
+        });
+        // Departamentos de más a menos muertes
+        var porDepartamento = {};
+        Object.keys(totales).forEach(function (k) {
+            var d = Math.floor(k / nSexos);
+            porDepartamento[d] = (porDepartamento[d] || 0) + totales[k];
+        });
+        var orden = Object.keys(porDepartamento).map(Number).sort(function (a, b) {
+            return porDepartamento[b] - porDepartamento[a];
+        });
+        var trazas = [];
+        for (var s = 0; s < nSexos; s++) {
+            var x = [], y = [], customdata = [];
+            orden.forEach(function (d) {
+                var total = totales[d * nSexos + s];
+                if (total) {
+                    x.push(cubo.departamentos[d]);
+                    y.push(total);
+                    customdata.push([cubo.valores.COD_DANE_DPTO[d]]);
+                }
+            });
+            if (x.length) {
+                trazas.push({
+                    type: 'bar', name: String(cubo.valores.SEXO[s]), x: x, y: y, customdata: customdata,
+                    hovertemplate: 'SEXO=' + cubo.valores.SEXO[s] +
+                        '<br>Departamento=%{x}<br>Total de Casos=%{y}<extra></extra>'
+                });
+            }
+        }
+        return {
+            data: trazas,
+            layout: {
+                title: {text: 'Comparación de Muertes por Sexo y Departamento, Colombia ' + anioDe(filtros, config)},
+                height: 600,
+                barmode: 'stack',
+                xaxis: {title: {text: 'Departamento'}, categoryorder: 'total descending', tickangle: 45},
+                yaxis: {title: {text: 'Total de Casos'}},
+                legend: {title: {text: 'Género'}}
+            }
+        };
+    }
+
+    function edad(filtros, cubo, config) {
+        if (requiereServidor('edad', filtros, config) || !cuboVigente(cubo, filtros, config)) {
+            return noUpdate();
+        }
+        var totales = agregar(cubo, filtros, false, function (i) { return cubo.columnas.GRUPO_EDAD_CAT[i]; });
+        // En el orden de las categorías, como groupby sobre la columna categórica
+        var grupos = Object.keys(totales).map(Number).sort(function (a, b) { return a - b; });
+        return {
+            data: [{
+                type: 'bar',
+                x: grupos.map(function (g) { return cubo.valores.GRUPO_EDAD_CAT[g]; }),
+                y: grupos.map(function (g) { return totales[g]; }),
+                marker: {color: '#4c78a8'},
+                texttemplate: '%{y}',
+                textposition: 'outside',
+                hovertemplate: 'Grupo de Edad=%{x}<br>Total de Muertes=%{y}<extra></extra>'
+            }],
+            layout: {
+                title: {text: 'Distribución de Muertes por Grupo de Edad (' + anioDe(filtros, config) + ')'},
+                height: 550,
+                xaxis: {title: {text: 'Grupo de Edad'}, categoryorder: 'array',
+                        categoryarray: config.grupos_edad, tickangle: -45},
+                yaxis: {title: {text: 'Total de Muertes'}},
+                bargap: 0.1,
+                uniformtext: {minsize: 8, mode: 'hide'}
+            }
+        };
+    }
+
+    // Filtros para cada callback del servidor de cliente.FIGURAS_SERVIDOR (no_update si el cubo alcanza);
+    // 'sexo' no está: compara departamentos y el cubo siempre le alcanza
+    function enrutar(filtros, config) {
+        return config.figuras_servidor.map(function (figura) {
+            return requiereServidor(figura, filtros, config) ? filtros : noUpdate();
+        });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        mortalidad: {enrutar: enrutar, mapa: mapa, mensual: mensual, sexo: sexo, edad: edad}
+    });
+})();
@@ -0,0 +1,297 @@
+"""Benchmark reproducible del preprocesamiento y de cada callback del dashboard.
+
+Genera datos de mortalidad sintéticos (mismas columnas que el archivo real:
+COD_DEPARTAMENTO, COD_MUNICIPIO, COD_MUERTE, FECHA_DEFUNCION, SEXO,
+GRUPO_EDAD1) a 1x, 10x y 100x el tamaño real, con municipios y causas
+tomados de divipola.xlsx y codigos_causas.xlsx. Mide el tiempo y el pico de
+memoria (tracemalloc) de cada etapa de preprocesamiento.py y el tiempo y el
+tamaño de la respuesta de cada ``update_*`` de app.py, sin pasar por la caché
+de figuras. Con dos o más escalas se revisa además que los puntos de cada
+figura no crezcan con el número de filas (figuras sin agregar); si alguno
+crece, el benchmark sale con código 1.
+
+Los datos sintéticos se pasan como DataFrame: la lectura del Excel de
+mortalidad no se mide (a 100x supera el límite de filas de Excel), sí la de
+los demás libros. Las particiones de cada escala van a un directorio
+temporal; de data/ solo se leen los libros auxiliares y la geometría.
+
+Uso:
+    python benchmark.py --escalas 1 10 --salida resultados.json
+    python benchmark.py --base base.json --salida nuevo.json  # sale con 1 si algo empeora
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly
+
+import preprocesamiento as pre
+from cache_figuras import puntos_figura
+from cubo import construir_cubo
+from dimensiones import Dimensiones
+
+FILAS_REALES = 244355 # Defunciones no fetales registradas en Colombia en 2019
+ANIO_BENCHMARK = 2019
+SEMILLA = 2019
+
+# Estados de filtros con los que se mide cada callback
+FILTROS_BENCHMARK = {
+    'sin_filtros': {},
+    'departamento': {'departamento': '05'},
+    'municipio_sexo_meses': {'municipio': '05001', 'sexo': [1], 'meses': [3, 6]},
+    'capitulo_edad': {'capitulo': [20], 'grupo_edad': ['Vejez (60 a 84 años)']},
+}
+
+CALLBACKS = [
+    'update_map_chart',
+    'update_line_chart',
+    'update_violencia_bar_chart',
+    'update_top_causes_table',
+    'update_stacked_bar_chart',
+    'update_pie_chart_menor_mortalidad',
+    'update_age_histogram',
+]
+
+
+def generar_muertes(filas, df_divipola, df_codigos, semilla=SEMILLA):
+    """DataFrame sintético con las columnas del archivo de mortalidad."""
+    rng = np.random.default_rng(semilla)
+    municipios = df_divipola[[pre.COL_DPTO_DIVIPOLA, pre.COL_MPIO_DIVIPOLA]].dropna().to_numpy()
+    causas = df_codigos[pre.COL_CODIGO_CAUSA].dropna().astype(str).to_numpy()
+    # Las ciudades grandes concentran las muertes: pesos tipo Zipf sobre los municipios
+    pesos = 1.0 / np.arange(1, len(municipios) + 1)
+    fila_mpio = rng.choice(len(municipios), filas, p=pesos / pesos.sum())
+    dias = rng.integers(0, 365, filas)
+    return pd.DataFrame({
+        'COD_DEPARTAMENTO': municipios[fila_mpio, 0].astype(int),
+        'COD_MUNICIPIO': municipios[fila_mpio, 1].astype(int),
+        'COD_MUERTE': causas[rng.integers(0, len(causas), filas)],
+        'FECHA_DEFUNCION': pd.Timestamp(f'{ANIO_BENCHMARK}-01-01') + pd.to_timedelta(dias, unit='D'),
+        'SEXO': rng.choice([1, 2, 3], filas, p=[0.55, 0.44, 0.01]),
+        'GRUPO_EDAD1': rng.integers(0, 30, filas),
+    })
+
+
+def _filas(valor):
+    return len(valor) if hasattr(valor, '__len__') else None
+
+
+def medir(resultados, nombre, funcion, *args, entrada=None):
+    """Ejecuta ``funcion`` una vez y guarda segundos, pico de memoria y filas."""
+    tracemalloc.reset_peak()
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        salida = funcion(*args)
+    segundos = time.perf_counter() - inicio
+    resultados[nombre] = {
+        'segundos': round(segundos, 4),
+        'pico_mb': round(tracemalloc.get_traced_memory()[1] / 1e6, 1),
+        'filas_entrada': _filas(entrada),
+        'filas_salida': _filas(salida),
+    }
+    print(f"  {nombre:<24} {segundos:8.3f} s {resultados[nombre]['pico_mb']:9.1f} MB")
+    return salida
+
+
+def medir_etapas(df_muertes_raw, libros):
+    """Mide cada etapa del preprocesamiento y devuelve (resultados, tablas de la partición)."""
+    etapas = {}
+    df_muertes = medir(etapas, 'limpiar_muertes', pre.limpiar_muertes, df_muertes_raw, entrada=df_muertes_raw)
+    df_divipola = medir(etapas, 'preparar_divipola', pre.preparar_divipola, libros['divipola'].copy(),
+                        entrada=libros['divipola'])
+    df_codigos = medir(etapas, 'preparar_codigos', pre.preparar_codigos, libros['codigos'].copy(),
+                       entrada=libros['codigos'])
+    tablas_dimensiones = medir(etapas, 'preparar_dimensiones', pre.preparar_dimensiones, df_divipola, df_codigos,
+                               entrada=df_divipola)
+    dimensiones = Dimensiones(tablas_dimensiones)
+    df_final = medir(etapas, 'fusionar', pre.fusionar, df_muertes, dimensiones, entrada=df_muertes)
+    df_final['GRUPO_EDAD_CAT'] = medir(etapas, 'categorizar_grupo_edad', pre.categorizar_grupo_edad,
+                                       df_final['GRUPO_EDAD1'], entrada=df_final)
+    df_final = medir(etapas, 'aplicar_esquema', pre.aplicar_esquema, df_final, entrada=df_final)
+    cubo = medir(etapas, 'construir_cubo', construir_cubo, df_final, entrada=df_final)
+    df_poblacion = libros['poblacion']
+    df_tbm_completo = medir(etapas, 'calcular_tbm', pre.calcular_tbm, cubo, df_poblacion, dimensiones,
+                            entrada=cubo)
+    tablas = {'df_final': df_final, 'cubo': cubo, 'df_tbm_completo': df_tbm_completo, **tablas_dimensiones}
+    return etapas, tablas
+
+
+def medir_callbacks(app, repeticiones):
+    """Mejor tiempo de ``repeticiones`` llamadas y bytes de la respuesta, por callback y filtro."""
+    resultados = {}
+    for nombre in CALLBACKS:
+        # __wrapped__ evita la caché de figuras; la caché de cortes del índice se vacía en cada llamada
+        funcion = getattr(app, nombre).__wrapped__
+        for etiqueta, filtros in FILTROS_BENCHMARK.items():
+            filtros = {**filtros, 'anio': ANIO_BENCHMARK}
+            tiempos = []
+            for _ in range(repeticiones):
+                app.datos_anio(ANIO_BENCHMARK)['indice']._filtrar.cache_clear()
+                inicio = time.perf_counter()
+                salida = funcion(filtros)
+                texto = json.dumps(salida, cls=plotly.utils.PlotlyJSONEncoder)
+                tiempos.append(time.perf_counter() - inicio)
+            clave = f"{nombre}[{etiqueta}]"
+            resultados[clave] = {'segundos': round(min(tiempos), 4), 'bytes': len(texto), 'puntos': puntos_figura(salida)}
+            print(f"  {clave:<52} {min(tiempos):8.3f} s {len(texto):>10} B {resultados[clave]['puntos']:>8} pts")
+    return resultados
+
+
+def leer_libros():
+    """Lee una sola vez los libros auxiliares reales y mide su lectura."""
+    lectura = {}
+    libros = {}
+    for clave, path in (('codigos', pre.PATH_CODIGOS), ('divipola', pre.PATH_DIVIPOLA)):
+        libros[clave] = medir(lectura, f"leer_{clave}", pd.read_excel, path)
+    poblacion = medir(lectura, 'leer_poblacion', lambda path: pd.read_excel(path, usecols=pre.COLUMNAS_LIBROS['poblacion']),
+                      pre.PATH_POBLACION)
+    poblacion = medir(lectura, 'preparar_poblacion', pre.preparar_poblacion, poblacion, entrada=poblacion)
+    tablas = medir(lectura, 'tablas_poblacion', pre.tablas_poblacion, poblacion, entrada=poblacion)
+    libros['poblacion_anios'] = tablas
+    usado = min(poblacion['ANIO'].unique(), key=lambda a: (abs(a - ANIO_BENCHMARK), a))
+    libros['poblacion'] = pre.poblacion_total(tablas[f"anio={usado}"])
+    return lectura, libros
+
+
+def preparar_cache(directorio, tablas, libros):
+    """Escribe la partición sintética y la población en ``directorio`` y apunta preprocesamiento ahí."""
+    pre.DIR_CACHE = directorio
+    pre.DIR_CACHE_POBLACION = os.path.join(directorio, 'poblacion')
+    # Sin fuentes en el manifiesto: la partición se considera vigente y no se busca ningún .xlsx
+    pre.DIR_DATOS = directorio
+    pre.PATH_MUERTES = os.path.join(directorio, 'sin_fuente.xlsx')
+    pre.guardar_particion(pre.DIR_CACHE_POBLACION, libros['poblacion_anios'], [])
+    pre.guardar_particion(pre._dir_anio(ANIO_BENCHMARK), tablas, [])
+
+
+def ejecutar(escalas, repeticiones):
+    tracemalloc.start()
+    lectura, libros = leer_libros()
+    resultado = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'lectura': lectura,
+        'escalas': {},
+    }
+    app = None
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as tmp:
+        for escala in escalas:
+            filas = int(FILAS_REALES * escala)
+            print(f"\n=== Escala {escala:g}x ({filas} filas) ===")
+            df_muertes = generar_muertes(filas, libros['divipola'], libros['codigos'])
+            etapas, tablas = medir_etapas(df_muertes, libros)
+            del df_muertes
+
+            preparar_cache(os.path.join(tmp, f"escala_{escala:g}"), tablas, libros)
+            del tablas
+            tracemalloc.stop() # Los callbacks se miden sin la sobrecarga de tracemalloc
+            if app is None:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    import app
+            app._anios_en_memoria.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                app.datos_anio(ANIO_BENCHMARK)
+            callbacks = medir_callbacks(app, repeticiones)
+            app._anios_en_memoria.clear()
+            tracemalloc.start()
+
+            resultado['escalas'][f"{escala:g}"] = {
+                'filas': filas,
+                'etapas': etapas,
+                'callbacks': callbacks,
+            }
+    tracemalloc.stop()
+    return resultado
+
+
+def comparar(base, actual, umbral):
+    """Imprime la razón actual/base de cada medición; devuelve las que superan ``umbral``."""
+    regresiones = []
+    for escala, datos in actual['escalas'].items():
+        if escala not in base.get('escalas', {}):
+            continue
+        for grupo in ('etapas', 'callbacks'):
+            for nombre, medicion in datos[grupo].items():
+                previa = base['escalas'][escala][grupo].get(nombre)
+                if not previa or not previa['segundos']:
+                    continue
+                razon = medicion['segundos'] / previa['segundos']
+                marca = ' <-- regresión' if razon > umbral else ''
+                print(f"{escala:>4}x {nombre:<52} {previa['segundos']:8.3f} -> {medicion['segundos']:8.3f} s "
+                      f"({razon:5.2f}x){marca}")
+                if razon > umbral:
+                    regresiones.append(f"{escala}x {nombre}")
+    return regresiones
+
+
+def revisar_escalamiento(resultado, fraccion=0.5):
+    """Callbacks cuyos puntos crecen con las filas entre la escala menor y la mayor.
+
+    Se marcan los que crecen al menos ``fraccion`` de lo que crecen las filas:
+    una figura agregada queda acotada por el número de municipios, causas, etc.
+    """
+    escalas = sorted(resultado['escalas'].values(), key=lambda datos: datos['filas'])
+    if len(escalas) < 2:
+        return []
+    menor, mayor = escalas[0], escalas[-1]
+    razon_filas = mayor['filas'] / menor['filas']
+    crecen = []
+    for nombre, medicion in mayor['callbacks'].items():
+        previa = menor['callbacks'].get(nombre)
+        if not previa or not previa.get('puntos') or 'puntos' not in medicion:
+            continue
+        razon = medicion['puntos'] / previa['puntos']
+        if razon_filas > 1 and razon >= 1 + fraccion * (razon_filas - 1):
+            print(f"  {nombre:<52} {previa['puntos']:>8} -> {medicion['puntos']:>8} puntos "
+                  f"({razon:5.2f}x con {razon_filas:g}x filas) <-- crece con las filas")
+            crecen.append(nombre)
+    return crecen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--escalas', type=float, nargs='+', default=[1, 10, 100],
+                        help="Múltiplos del tamaño real a medir (por defecto 1 10 100).")
+    parser.add_argument('--repeticiones', type=int, default=3,
+                        help="Llamadas por callback; se guarda el mejor tiempo.")
+    parser.add_argument('--salida', default='benchmark.json', help="Archivo JSON de resultados.")
+    parser.add_argument('--base', help="JSON de una ejecución anterior con el cual comparar.")
+    parser.add_argument('--umbral', type=float, default=1.2,
+                        help="Razón actual/base a partir de la cual se reporta una regresión.")
+    args = parser.parse_args()
+
+    resultado = ejecutar(args.escalas, args.repeticiones)
+    with open(args.salida, 'w') as f:
+        json.dump(resultado, f, indent=2)
+    print(f"\nResultados escritos en '{args.salida}'.")
+
+    crecen = revisar_escalamiento(resultado)
+    if crecen:
+        print(f"\n{len(crecen)} figuras crecen con el número de filas (no están agregadas).")
+        sys.exit(1)
+
+    if args.base:
+        with open(args.base, 'r') as f:
+            base = json.load(f)
+        print(f"\n=== Comparación con '{args.base}' ===")
+        regresiones = comparar(base, resultado, args.umbral)
+        if regresiones:
+            print(f"\n{len(regresiones)} mediciones superan {args.umbral:g}x la base.")
+            sys.exit(1)
+        print("\nSin regresiones.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Caché de las figuras que devuelven los callbacks del dashboard.
+
+Las figuras se guardan ya serializadas en JSON, con llave ``callback + filtros
+normalizados + versión de los datos``; la versión puede ser una función,
+que se evalúa en cada consulta. La caché en memoria es LRU con tamaño
+máximo; si se define ``CACHE_FIGURAS_DIR`` también se escriben en disco, de
+modo que todos los workers de gunicorn comparten las figuras ya calculadas.
+
+Cada figura nueva pasa además por ``puntos_figura``: las figuras deben
+llevar datos ya agregados (una barra por categoría, un polígono por
+municipio), así que una con más de ``MAX_PUNTOS_FIGURA`` puntos casi seguro
+crece con el número de registros (ej. un ``px.histogram`` sobre las filas) y
+se reporta. ``FIGURAS_ESTRICTO=1`` la convierte en error (para desarrollo).
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly
+from plotly.basedatatypes import BaseFigure
+
+from cubo import normalizar_filtros
+
+MAX_ENTRADAS_MEMORIA = int(os.environ.get('CACHE_FIGURAS_MAX', 256))
+MAX_ARCHIVOS_DISCO = int(os.environ.get('CACHE_FIGURAS_MAX_DISCO', 2048))
+DIR_CACHE_FIGURAS = os.environ.get('CACHE_FIGURAS_DIR') # None = solo memoria
+# Más puntos que municipios (1.122) con holgura; ver puntos_figura
+MAX_PUNTOS_FIGURA = int(os.environ.get('MAX_PUNTOS_FIGURA', 5000))
+FIGURAS_ESTRICTO = os.environ.get('FIGURAS_ESTRICTO', '0') == '1'
+
+
+class FiguraNoAgregada(ValueError):
+    """Figura con más puntos que ``MAX_PUNTOS_FIGURA`` (con ``FIGURAS_ESTRICTO``)."""
+
+
+def puntos_figura(figura):
+    """Puntos que lleva ``figura`` al navegador.
+
+    En una figura de plotly, la suma del arreglo más largo de cada traza
+    (x, y, values, locations, customdata...); en un componente con ``data``
+    (una DataTable), sus filas.
+    """
+    if isinstance(figura, BaseFigure):
+        total = 0
+        for traza in figura.data:
+            largos = [
+                len(valor) for valor in traza.to_plotly_json().values()
+                if isinstance(valor, (list, tuple, np.ndarray))
+            ]
+            total += max(largos, default=0)
+        return total
+    datos = getattr(figura, 'data', None)
+    return len(datos) if isinstance(datos, list) else 0
+
+
+class CacheFiguras:
+    """LRU en memoria con respaldo opcional en un directorio compartido."""
+
+    def __init__(self, max_entradas=MAX_ENTRADAS_MEMORIA, directorio=DIR_CACHE_FIGURAS,
+                 max_archivos=MAX_ARCHIVOS_DISCO, version=''):
+        self.max_entradas = max_entradas
+        self.directorio = directorio
+        self.max_archivos = max_archivos
+        self.version = version
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.figuras_grandes = 0
+        self._reportadas = set()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, hashlib.sha1(clave.encode()).hexdigest() + '.json')
+
+    def obtener(self, clave):
+        """JSON guardado para ``clave`` o None si no está en memoria ni en disco."""
+        with self._lock:
+            texto = self._memoria.get(clave)
+            if texto is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos_memoria += 1
+                return texto
+        if self.directorio:
+            ruta = self._ruta(clave)
+            try:
+                with open(ruta, 'r') as f:
+                    texto = f.read()
+                os.utime(ruta) # Marcar como usado recientemente para el desalojo en disco
+            except OSError:
+                texto = None
+            if texto is not None:
+                with self._lock:
+                    self.aciertos_disco += 1
+                self._guardar_memoria(clave, texto)
+                return texto
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave, texto):
+        self._guardar_memoria(clave, texto)
+        if self.directorio:
+            ruta = self._ruta(clave)
+            tmp = f"{ruta}.tmp{os.getpid()}"
+            try:
+                with open(tmp, 'w') as f:
+                    f.write(texto)
+                os.replace(tmp, ruta) # Escritura atómica: otro worker nunca lee un archivo a medias
+                self._podar_disco()
+            except OSError as e:
+                print(f"¡Advertencia! No se pudo escribir la figura en '{self.directorio}': {e}")
+
+    def _guardar_memoria(self, clave, texto):
+        with self._lock:
+            self._memoria[clave] = texto
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_entradas:
+                self._memoria.popitem(last=False)
+                self.desalojos += 1
+
+    def _podar_disco(self):
+        """Borra los archivos menos usados cuando el directorio supera ``max_archivos``."""
+        archivos = [e for e in os.scandir(self.directorio) if e.name.endswith('.json')]
+        if len(archivos) <= self.max_archivos:
+            return
+        archivos.sort(key=lambda e: e.stat().st_mtime)
+        for entrada in archivos[:len(archivos) - self.max_archivos]:
+            try:
+                os.remove(entrada.path)
+            except OSError:
+                pass # Otro worker ya lo borró
+
+    def limpiar(self):
+        with self._lock:
+            self._memoria.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos_memoria + self.aciertos_disco + self.fallos
+            return {
+                'entradas_memoria': len(self._memoria),
+                'max_entradas_memoria': self.max_entradas,
+                'directorio': self.directorio,
+                'aciertos_memoria': self.aciertos_memoria,
+                'aciertos_disco': self.aciertos_disco,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'figuras_grandes': self.figuras_grandes,
+                'tasa_aciertos': (consultas - self.fallos) / consultas if consultas else 0.0,
+            }
+
+    def revisar_puntos(self, nombre, figura):
+        """Reporta (una vez por callback) una figura cuyo tamaño no es el de datos agregados."""
+        puntos = puntos_figura(figura)
+        if puntos <= MAX_PUNTOS_FIGURA:
+            return
+        mensaje = (f"La figura '{nombre}' lleva {puntos} puntos (máximo {MAX_PUNTOS_FIGURA}): "
+                   f"¿se envían registros sin agregar al navegador?")
+        if FIGURAS_ESTRICTO:
+            raise FiguraNoAgregada(mensaje)
+        with self._lock:
+            self.figuras_grandes += 1
+            nueva = nombre not in self._reportadas
+            self._reportadas.add(nombre)
+        if nueva:
+            print(f"¡Advertencia! {mensaje}")
+
+    def memoizar(self, nombre, ignorar=()):
+        """Decorador para callbacks que reciben el estado de filtros.
+
+        ``ignorar`` debe coincidir con los filtros que el callback no usa, para
+        que estados que producen la misma figura compartan la entrada. Los
+        demás argumentos del callback (ej. un selector propio) van en la llave.
+        """
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(filtros, *args):
+                version = self.version() if callable(self.version) else self.version
+                clave = json.dumps(
+                    [version, nombre, normalizar_filtros(filtros, ignorar), *args], default=str
+                )
+                texto = self.obtener(clave)
+                if texto is None:
+                    figura = funcion(filtros, *args)
+                    self.revisar_puntos(nombre, figura)
+                    texto = json.dumps(figura, cls=plotly.utils.PlotlyJSONEncoder)
+                    self.guardar(clave, texto)
+                # Dash acepta la figura (o el componente) como diccionario JSON
+                return json.loads(texto)
+            return envoltura
+        return decorador
@@ -0,0 +1,183 @@
+"""Índice jerárquico de los códigos CIE-10 de las celdas del cubo.
+
+Cada código (ej. 'X954') se convierte en un entero ordenable
+(``letra * 1000 + categoría * 10 + subcategoría``), de modo que un rango
+como X85-Y09 es un intervalo de enteros. Por cada celda del cubo se guardan,
+como arreglos de enteros, los cuatro niveles de la jerarquía:
+
+* ``capitulo``: capítulo CIE-10 (1 a 22), del archivo de códigos;
+* ``bloque``: grupo de causas de ``BLOQUES`` (ej. agresiones X85-Y09), -1 si no
+  pertenece a ninguno;
+* ``tres``: categoría de tres caracteres (ej. X95);
+* ``codigo``: el código completo.
+
+Además, las celdas se ordenan por código: un rango o un prefijo se resuelve
+con dos ``searchsorted`` sobre ese orden (sin comparar texto fila por fila),
+y sobre un subconjunto de celdas con comparaciones de enteros.
+"""
+import numpy as np
+import pandas as pd
+
+NIVELES = ['capitulo', 'bloque', 'tres', 'codigo']
+
+# Grupos de causas usados en los reportes de mortalidad: los bloques CIE-10 de
+# causas externas y las familias más frecuentes de los demás capítulos.
+# Rangos inclusivos de categorías de tres caracteres, ordenados y sin traslapes.
+BLOQUES = [
+    ('A00', 'A09', 'Enfermedades infecciosas intestinales'),
+    ('A15', 'A19', 'Tuberculosis'),
+    ('B20', 'B24', 'Enfermedad por VIH'),
+    ('C00', 'C97', 'Tumores malignos'),
+    ('E10', 'E14', 'Diabetes mellitus'),
+    ('E40', 'E46', 'Desnutrición'),
+    ('I10', 'I15', 'Enfermedades hipertensivas'),
+    ('I20', 'I25', 'Enfermedades isquémicas del corazón'),
+    ('I60', 'I69', 'Enfermedades cerebrovasculares'),
+    ('J09', 'J18', 'Influenza y neumonía'),
+    ('J40', 'J47', 'Enfermedades crónicas de las vías respiratorias inferiores'),
+    ('K70', 'K77', 'Enfermedades del hígado'),
+    ('N17', 'N19', 'Insuficiencia renal'),
+    ('P00', 'P96', 'Afecciones originadas en el periodo perinatal'),
+    ('U07', 'U07', 'COVID-19'),
+    ('V01', 'V99', 'Accidentes de transporte'),
+    ('W00', 'X59', 'Otras causas externas de traumatismos accidentales'),
+    ('X60', 'X84', 'Lesiones autoinfligidas intencionalmente'),
+    ('X85', 'Y09', 'Agresiones'),
+    ('Y10', 'Y34', 'Eventos de intención no determinada'),
+    ('Y35', 'Y36', 'Intervención legal y operaciones de guerra'),
+    ('Y40', 'Y84', 'Complicaciones de la atención médica y quirúrgica'),
+    ('Y85', 'Y89', 'Secuelas de causas externas'),
+]
+
+
+def codigo_numerico(codigos):
+    """Enteros ordenables de ``codigos`` ('X954', 'X95', 'I10X'); -1 si no son CIE-10.
+
+    Una categoría sin subcategorías ('I10X') o escrita con tres caracteres
+    ('X95') queda con subcategoría 0.
+    """
+    partes = pd.Series(codigos, dtype=object).astype(str).str.strip().str.upper().str.extract(
+        r'^([A-Z])(\d\d)([0-9X]?)$'
+    )
+    validos = partes[0].notna().to_numpy()
+    numeros = np.full(len(partes), -1, dtype=np.int32)
+    if validos.any():
+        p = partes[validos]
+        letra = p[0].map(ord).to_numpy() - ord('A')
+        categoria = p[1].astype(int).to_numpy()
+        subcategoria = pd.to_numeric(p[2], errors='coerce').fillna(0).astype(int).to_numpy()
+        numeros[validos] = letra * 1000 + categoria * 10 + subcategoria
+    return numeros
+
+
+def etiqueta_tres(numero):
+    """'X95' a partir del entero de una categoría de tres caracteres (``codigo // 10``)."""
+    return f"{chr(ord('A') + numero // 100)}{numero % 100:02d}"
+
+
+def limites(desde, hasta):
+    """Intervalo de enteros [inicio, fin] del rango de códigos ``desde``-``hasta``.
+
+    Un extremo de tres caracteres incluye todas sus subcategorías: X85-Y09 va de
+    X850 a Y099. Un extremo que no es un código CIE-10 es un ValueError (como
+    -1 el rango tomaría todas las celdas, también las que no tienen código).
+    """
+    inicio, fin = codigo_numerico([desde, hasta])
+    invalidos = [codigo for codigo, numero in ((desde, inicio), (hasta, fin)) if numero < 0]
+    if invalidos:
+        raise ValueError(f"Códigos CIE-10 no válidos en el rango {desde}-{hasta}: {invalidos}")
+    if len(hasta.strip()) == 3:
+        fin += 9
+    return int(inicio), int(fin)
+
+
+# Límites de cada bloque en la escala de ``codigo_numerico``
+_INICIO_BLOQUES = np.array([limites(desde, hasta)[0] for desde, hasta, _ in BLOQUES])
+_FIN_BLOQUES = np.array([limites(desde, hasta)[1] for desde, hasta, _ in BLOQUES])
+
+
+def bloque_de(numeros):
+    """Posición en ``BLOQUES`` del bloque de cada código numérico, -1 si no tiene."""
+    numeros = np.asarray(numeros)
+    posicion = np.searchsorted(_INICIO_BLOQUES, numeros, side='right') - 1
+    dentro = (posicion >= 0) & (numeros >= 0) & (numeros <= _FIN_BLOQUES[np.maximum(posicion, 0)])
+    return np.where(dentro, posicion, -1)
+
+
+def _nombres_por_valor(valores, etiquetas, nombres):
+    """valor -> (etiqueta, nombre) con el primer nombre no nulo de cada valor (valores >= 0)."""
+    resultado = {}
+    for valor, etiqueta, nombre in zip(valores, etiquetas, nombres):
+        if valor >= 0 and not pd.isna(nombre) and valor not in resultado:
+            resultado[int(valor)] = (etiqueta, nombre)
+    return resultado
+
+
+class IndiceCIE10:
+    """Niveles de la jerarquía CIE-10 de cada celda del cubo y las celdas ordenadas por código.
+
+    ``causas`` es la columna categórica CAUSA_CODIGO del cubo; los niveles se
+    calculan una vez por categoría y se expanden a las celdas con sus códigos.
+    """
+
+    def __init__(self, causas, dimensiones):
+        causas = pd.Categorical(causas)
+        categorias = causas.categories
+        numeros = codigo_numerico(categorias)
+        capitulos = (
+            pd.Series(dimensiones.valores('CAPITULO', categorias)).astype(float).fillna(-1).astype(np.int16).to_numpy()
+        )
+        por_categoria = {
+            'capitulo': capitulos,
+            'bloque': bloque_de(numeros).astype(np.int16),
+            'tres': np.where(numeros >= 0, numeros // 10, -1).astype(np.int16),
+            'codigo': numeros.astype(np.int16),
+        }
+        # -1 (celda sin código) toma el último elemento: -1
+        self.columnas = {
+            nivel: np.append(valores, np.int16(-1))[causas.codes] for nivel, valores in por_categoria.items()
+        }
+
+        # Celdas ordenadas por código: un rango de códigos es un tramo contiguo de este orden
+        self._orden = np.argsort(self.columnas['codigo'], kind='stable')
+        self._ordenados = self.columnas['codigo'][self._orden]
+
+        # Etiqueta y nombre de cada valor de cada nivel, para las tablas
+        self._nombres = {
+            'codigo': _nombres_por_valor(numeros, categorias.astype(str), dimensiones.valores('CAUSA_NOMBRE', categorias)),
+            'tres': _nombres_por_valor(
+                por_categoria['tres'], [etiqueta_tres(t) for t in por_categoria['tres']],
+                dimensiones.valores('CAUSA_3_NOMBRE', categorias),
+            ),
+            'capitulo': _nombres_por_valor(capitulos, capitulos.tolist(), dimensiones.valores('CAPITULO_NOMBRE', categorias)),
+            'bloque': {i: (f"{desde}-{hasta}", nombre) for i, (desde, hasta, nombre) in enumerate(BLOQUES)},
+        }
+
+    def filas(self, rangos):
+        """Posiciones (ordenadas) de las celdas cuyo código cae en alguno de ``rangos``.
+
+        ``rangos`` es una lista de pares (desde, hasta), ej. ``[('X85', 'Y09')]``;
+        un prefijo es el rango de un solo extremo (``('X95', 'X95')``). Una
+        celda en varios rangos que se traslapan se devuelve una sola vez.
+        """
+        tramos = []
+        for desde, hasta in rangos:
+            inicio, fin = limites(desde, hasta)
+            tramos.append(self._orden[
+                np.searchsorted(self._ordenados, inicio, side='left'):np.searchsorted(self._ordenados, fin, side='right')
+            ])
+        return np.unique(np.concatenate(tramos)) if tramos else np.array([], dtype=np.int64)
+
+    def mascara(self, filas, rangos):
+        """Máscara de las celdas en posiciones ``filas`` cuyo código cae en alguno de ``rangos``."""
+        codigos = self.columnas['codigo'][filas]
+        mascara = np.zeros(len(codigos), dtype=bool)
+        for desde, hasta in rangos:
+            inicio, fin = limites(desde, hasta)
+            mascara |= (codigos >= inicio) & (codigos <= fin)
+        return mascara
+
+    def nombres(self, nivel, valores):
+        """Etiqueta y nombre de cada uno de ``valores`` del ``nivel`` (None si no tiene nombre)."""
+        nombres = self._nombres[nivel]
+        return [nombres.get(valor, (None, None)) for valor in valores]
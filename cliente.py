@@ -0,0 +1,67 @@
+"""Modo cliente: cubo compacto en el navegador y figuras con callbacks clientside.
+
+Con ``MODO_CLIENTE=1`` el servidor envía una vez por año un cubo compacto
+(muertes por departamento, mes, sexo, grupo de edad y capítulo CIE-10) a un
+``dcc.Store``. Filtrar, volver a agregar y armar la figura corre en el
+navegador (assets/cliente.js) para las figuras de ``FIGURAS_CLIENTE``; una
+interacción con los filtros no llega al servidor.
+
+El servidor solo vuelve a calcular una de esas figuras cuando los filtros
+pasan la granularidad del cubo: un municipio seleccionado o, con geometría
+municipal, el mapa de un departamento. La regla vive solo en cliente.js
+(``requiereServidor``): el callback clientside ``enrutar`` es quien decide
+qué filtros llegan a los callbacks del servidor de ``FIGURAS_SERVIDOR``. Las figuras por municipio
+y por causa (homicidios, top de causas, menor mortalidad) siguen
+calculándose en el servidor.
+"""
+import os
+
+import pandas as pd
+
+MODO_CLIENTE = os.environ.get('MODO_CLIENTE', '0') == '1'
+
+# Columnas del cubo compacto (la granularidad más fina disponible en el navegador)
+DIMENSIONES_CLIENTE = ['COD_DANE_DPTO', 'MES', 'SEXO', 'GRUPO_EDAD_CAT', 'CAPITULO']
+
+# Figuras que se calculan en el navegador: nombre en cliente.js -> id del dcc.Graph
+FIGURAS_CLIENTE = {
+    'mapa': 'mapa-departamentos',
+    'mensual': 'lineas-mensual',
+    'sexo': 'barras-apiladas-sexo',
+    'edad': 'histograma-edad',
+}
+# Las que pueden necesitar más detalle que el del cubo y tienen un callback del
+# servidor de respaldo. 'sexo' compara departamentos (ignora departamento y
+# municipio): el cubo siempre le alcanza y no tiene ruta al servidor.
+FIGURAS_SERVIDOR = ('mapa', 'mensual', 'edad')
+
+
+def cubo_cliente(indice, anio):
+    """Cubo compacto de ``anio`` para el navegador, en columnas de enteros.
+
+    Cada dimensión va como códigos más su lista de valores (la de
+    GRUPO_EDAD_CAT en el orden de sus categorías); MES y las muertes, tal
+    cual.
+    """
+    cubo = indice.agregar(indice.cubo, DIMENSIONES_CLIENTE)
+    columnas = {}
+    valores = {}
+    for col in DIMENSIONES_CLIENTE:
+        if col == 'MES':
+            columnas[col] = cubo[col].astype(int).tolist()
+            continue
+        codigos, unicos = pd.factorize(cubo[col], sort=True)
+        columnas[col] = codigos.tolist()
+        valores[col] = [valor.item() if hasattr(valor, 'item') else valor for valor in unicos]
+
+    # Nombre de cada departamento del cubo (mismo orden que valores['COD_DANE_DPTO'])
+    deptos = indice.agregar(indice.cubo, ['COD_DANE_DPTO', 'DEPARTAMENTO']).drop_duplicates('COD_DANE_DPTO')
+    nombres = dict(zip(deptos['COD_DANE_DPTO'].astype(str), deptos['DEPARTAMENTO'].astype(str)))
+    valores['COD_DANE_DPTO'] = [str(cod) for cod in valores['COD_DANE_DPTO']]
+    return {
+        'anio': anio,
+        'valores': valores,
+        'departamentos': [nombres.get(cod, cod) for cod in valores['COD_DANE_DPTO']],
+        'columnas': columnas,
+        'muertes': cubo['Total Muertes'].astype(int).tolist(),
+    }
@@ -0,0 +1,118 @@
+"""Tablas en disco como un archivo .npy por columna, abiertas con memory-map.
+
+Cada tabla es un directorio con ``esquema.json`` (nombre, tipo y tabla de
+valores de cada columna) y un ``colNN.npy`` por columna:
+
+* numéricas: los valores tal cual;
+* categóricas y de texto: los códigos (int8/int16/int32) y, en el esquema,
+  la lista de valores (codificación por diccionario).
+
+``abrir_tabla`` mapea los .npy en modo solo lectura y arma el DataFrame sin
+copiar los arreglos: el proceso arranca sin deserializar nada, el sistema
+operativo carga solo las páginas de las columnas que se usan y todos los
+workers (y reinicios) comparten esas páginas desde la caché de archivos.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ESQUEMA = 'esquema.json'
+
+
+def _tipo_codigos(n):
+    """Entero más pequeño que representa ``n`` categorías más el -1 de los nulos."""
+    for tipo in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(tipo).max:
+            return tipo
+    return np.int64
+
+
+def _guardar_npy(path, arreglo):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        np.save(f, np.ascontiguousarray(arreglo), allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def _cargar_npy(path):
+    try:
+        return np.load(path, mmap_mode='r', allow_pickle=False).view(np.ndarray)
+    except ValueError:
+        # numpy no puede mapear un arreglo de tamaño cero
+        return np.load(path, allow_pickle=False)
+
+
+def guardar_tabla(df, directorio):
+    """Escribe ``df`` en ``directorio``; el esquema va de último para no dejar tablas a medias."""
+    os.makedirs(directorio, exist_ok=True)
+    columnas = []
+    for i, (nombre, serie) in enumerate(df.items()):
+        columna = {'nombre': nombre, 'archivo': f"col{i:02d}.npy", 'dtype': str(serie.dtype)}
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            columna['tipo'] = 'categoria'
+            columna['ordenada'] = bool(serie.cat.ordered)
+            columna['valores'] = serie.cat.categories.tolist()
+            arreglo = serie.array.codes
+        elif serie.dtype.kind in 'biuf':
+            columna['tipo'] = 'numero'
+            arreglo = serie.to_numpy()
+        else:
+            columna['tipo'] = 'texto'
+            codigos, valores = pd.factorize(serie)
+            columna['valores'] = valores.tolist()
+            arreglo = codigos.astype(_tipo_codigos(len(valores)))
+        _guardar_npy(os.path.join(directorio, columna['archivo']), arreglo)
+        columnas.append(columna)
+    tmp = os.path.join(directorio, f"{ESQUEMA}.tmp{os.getpid()}")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'filas': len(df), 'columnas': columnas}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(directorio, ESQUEMA))
+
+
+def abrir_tabla(directorio, columnas=None):
+    """DataFrame sobre los .npy de ``directorio`` sin copiarlos (solo lectura).
+
+    ``columnas`` limita las columnas que se mapean; por defecto, todas.
+    """
+    with open(os.path.join(directorio, ESQUEMA), 'r', encoding='utf-8') as f:
+        esquema = json.load(f)
+    datos = {}
+    for columna in esquema['columnas']:
+        if columnas is not None and columna['nombre'] not in columnas:
+            continue
+        arreglo = _cargar_npy(os.path.join(directorio, columna['archivo']))
+        if columna['tipo'] == 'numero':
+            datos[columna['nombre']] = arreglo
+            continue
+        tipo = pd.CategoricalDtype(columna['valores'], ordered=columna.get('ordenada', False))
+        categorias = pd.Categorical.from_codes(arreglo, dtype=tipo, validate=False)
+        # El texto se decodifica a su tipo original (tablas pequeñas, como las tasas)
+        datos[columna['nombre']] = categorias if columna['tipo'] == 'categoria' else categorias.astype(columna['dtype'])
+    return pd.DataFrame(datos, copy=False)
+
+
+def tabla_existe(directorio):
+    return os.path.exists(os.path.join(directorio, ESQUEMA))
+
+
+def concatenar(tablas):
+    """Une DataFrames con las mismas columnas; las categóricas quedan con la unión de sus categorías.
+
+    Las categorías de la primera tabla conservan sus códigos y las nuevas se
+    agregan al final (``pd.concat`` convertiría a object las que difieren).
+    """
+    tablas = list(tablas)
+    for col in tablas[0].columns:
+        tipos = [tabla[col].dtype for tabla in tablas]
+        if not all(isinstance(tipo, pd.CategoricalDtype) for tipo in tipos) or len(set(tipos)) == 1:
+            continue
+        categorias = tipos[0].categories
+        for tipo in tipos[1:]:
+            categorias = categorias.append(tipo.categories.difference(categorias))
+        tablas = [
+            tabla.assign(**{col: tabla[col].cat.set_categories(categorias, ordered=tipos[0].ordered)})
+            for tabla in tablas
+        ]
+    return pd.concat(tablas, ignore_index=True)
@@ -0,0 +1,240 @@
+"""Motor SQL embebido (DuckDB o SQLite) sobre los cubos de todos los años.
+
+Con ``MOTOR_SQL`` (``duckdb``, ``sqlite`` o ``auto``: DuckDB si está
+instalado, si no SQLite de la biblioteca estándar) el proceso carga en una
+base en memoria:
+
+* ``hechos``: las celdas del cubo de cada año con su columna ANIO,
+  COD_DANE_DPTO (para indexarla) y CAUSA_NUMERO, el código CIE-10 como
+  entero (``cie10.codigo_numerico``): los rangos de causas se filtran con
+  ``BETWEEN`` sobre los mismos límites que el índice de pandas;
+* ``dim_municipio`` y ``dim_causa``: las tablas de dimensiones.
+
+``agregar`` traduce filtros, agrupación y top-N a una sola consulta
+(``WHERE`` + ``GROUP BY`` + ``ORDER BY ... LIMIT``) con parámetros; las
+columnas se validan contra ``COLUMNAS_SQL``, nunca se interpola texto del
+cliente. En SQLite se crean índices por año y departamento, municipio y
+causa; DuckDB ejecuta vectorizado y en varios hilos sin necesitarlos.
+
+Para un solo año, ``como_pandas=True`` devuelve el resultado con los mismos
+tipos y el mismo orden que ``cubo.agregar`` (las categorías del cubo y de
+las dimensiones), de modo que los callbacks dan las mismas figuras con
+cualquiera de los dos caminos.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cie10 import codigo_numerico, limites
+from cubo import COL_MUERTES, DIMENSIONES_CUBO, agregar, normalizar_filtros
+from dimensiones import ATRIBUTOS, COLUMNAS, DIM_CAUSA, DIM_MUNICIPIO, LLAVES, Dimensiones
+
+try:
+    import duckdb
+except ImportError: # Opcional: sin el paquete se usa SQLite
+    duckdb = None
+
+MOTOR_SQL = os.environ.get('MOTOR_SQL', '').lower() # '' = desactivado (los callbacks usan pandas)
+
+# Columna pública -> expresión SQL (h = hechos, m = dim_municipio, c = dim_causa)
+ALIAS_TABLA = {DIM_MUNICIPIO: 'm', DIM_CAUSA: 'c'}
+COLUMNAS_SQL = {
+    'ANIO': 'h.ANIO',
+    'COD_DANE_DPTO': 'h.COD_DANE_DPTO',
+    **{col: f'h.{col}' for col in DIMENSIONES_CUBO},
+    **{atributo: f'{ALIAS_TABLA[tabla]}.{atributo}' for atributo, tabla in ATRIBUTOS.items() if atributo != 'COD_DANE_DPTO'},
+}
+
+# Filtro del dashboard -> columna
+FILTROS_SQL = {
+    'departamento': 'COD_DANE_DPTO',
+    'municipio': 'COD_DANE_COMPLETO',
+    'sexo': 'SEXO',
+    'grupo_edad': 'GRUPO_EDAD_CAT',
+    'capitulo': 'CAPITULO',
+}
+MAX_LIMITE = 10000
+ESCALARES = (str, int, float, np.integer, np.floating) # Valores de filtro que se pasan como parámetro
+
+
+def backend_disponible(nombre=MOTOR_SQL):
+    """'duckdb' o 'sqlite' según ``nombre`` y lo instalado; None si el motor está desactivado."""
+    if nombre in ('', '0', 'no'):
+        return None
+    if nombre == 'duckdb' and duckdb is None:
+        print("¡Advertencia! MOTOR_SQL=duckdb pero el paquete duckdb no está instalado; se usa SQLite.")
+        return 'sqlite'
+    if nombre == 'auto':
+        return 'duckdb' if duckdb is not None else 'sqlite'
+    if nombre not in ('duckdb', 'sqlite'):
+        raise ValueError(f"MOTOR_SQL desconocido: '{nombre}' (duckdb, sqlite o auto)")
+    return nombre
+
+
+def _columna_plana(serie):
+    """Valores de una columna (categórica o no) como tipos que entiende el motor."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(serie.cat.categories.dtype if serie.notna().all() else object)
+    return serie
+
+
+def _numero_causa(causas):
+    """``codigo_numerico`` de cada celda (-1 sin código), calculado una vez por categoría."""
+    causas = causas.array
+    return np.append(codigo_numerico(causas.categories), -1)[causas.codes]
+
+
+def _tabla_plana(df):
+    return pd.DataFrame({col: _columna_plana(df[col]) for col in df.columns})
+
+
+class MotorConsultas:
+    """Base SQL en memoria con los cubos de ``cubos`` (``{anio: (cubo, tablas_dimensiones)}``)."""
+
+    def __init__(self, cubos, backend='sqlite', version=None):
+        self.backend = backend
+        self.version = version
+        self.anios = sorted(cubos)
+        self._lock = threading.Lock()
+        # Tipos de cada año para devolver resultados como cubo.agregar
+        self._plantillas = {
+            anio: (cubo.iloc[:0], Dimensiones(tablas)) for anio, (cubo, tablas) in cubos.items()
+        }
+
+        hechos = pd.concat([
+            _tabla_plana(cubo[DIMENSIONES_CUBO + [COL_MUERTES]]).assign(
+                ANIO=anio, COD_DANE_DPTO=lambda df: df['COD_DANE_COMPLETO'].astype(str).str[:2],
+                CAUSA_NUMERO=_numero_causa(cubo['CAUSA_CODIGO']),
+            )
+            for anio, (cubo, _) in cubos.items()
+        ], ignore_index=True)
+        dimensiones = {
+            nombre: pd.concat([_tabla_plana(tablas[nombre]) for _, tablas in cubos.values()])
+            .drop_duplicates(LLAVES[nombre], keep='last').reset_index(drop=True)
+            for nombre in COLUMNAS
+        }
+        if backend == 'duckdb':
+            self._conexion = duckdb.connect(':memory:')
+            for nombre, df in {'hechos': hechos, **dimensiones}.items():
+                self._conexion.register('_df', df)
+                self._conexion.execute(f'CREATE TABLE {nombre} AS SELECT * FROM _df')
+                self._conexion.unregister('_df')
+        else:
+            import sqlite3
+            self._conexion = sqlite3.connect(':memory:', check_same_thread=False)
+            hechos.to_sql('hechos', self._conexion, index=False)
+            for nombre, df in dimensiones.items():
+                df.to_sql(nombre, self._conexion, index=False)
+                self._conexion.execute(f'CREATE UNIQUE INDEX ix_{nombre} ON {nombre} ({LLAVES[nombre]})')
+            for columnas in ('ANIO, COD_DANE_DPTO', 'ANIO, COD_DANE_COMPLETO', 'ANIO, CAUSA_NUMERO'):
+                nombre = 'ix_hechos_' + columnas.replace(', ', '_').lower()
+                self._conexion.execute(f'CREATE INDEX {nombre} ON hechos ({columnas})')
+            self._conexion.execute('ANALYZE')
+        print(f"Motor SQL ({backend}) listo: {len(hechos)} celdas de {len(self.anios)} años.")
+
+    @classmethod
+    def desde_particiones(cls, anios, backend, version=None):
+        """Carga el cubo y las dimensiones de cada año de sus particiones."""
+        from preprocesamiento import cargar_anio
+
+        cubos = {}
+        for anio in anios:
+            datos = cargar_anio(anio, tablas=['cubo', DIM_MUNICIPIO, DIM_CAUSA], poblacion=False)
+            cubos[anio] = (datos['cubo'], {nombre: datos[nombre] for nombre in COLUMNAS})
+        return cls(cubos, backend, version)
+
+    def sql(self, columnas, filtros=None, ignorar=(), rangos=None, orden=None, limite=None):
+        """Consulta y parámetros de ``agregar`` (sin ejecutarla)."""
+        columnas = list(columnas)
+        desconocidas = [col for col in columnas if col not in COLUMNAS_SQL]
+        if desconocidas:
+            raise ValueError(f"Columnas desconocidas: {desconocidas}; válidas: {sorted(COLUMNAS_SQL)}")
+        if orden not in (None, 'asc', 'desc'):
+            raise ValueError("orden debe ser 'asc' o 'desc'")
+        if limite is not None:
+            # LIMIT -1 en SQLite es "sin límite": solo se aceptan enteros positivos, hasta MAX_LIMITE
+            limite = int(limite)
+            if limite <= 0:
+                raise ValueError(f"limite debe ser un entero positivo (máximo {MAX_LIMITE})")
+            limite = min(limite, MAX_LIMITE)
+
+        condiciones, parametros = [], []
+        usadas = set(columnas) # Columnas de la consulta: deciden qué dimensiones se unen
+        anios = (filtros or {}).get('anio')
+        if anios is not None:
+            anios = anios if isinstance(anios, (list, tuple)) else [anios]
+            condiciones.append(f"h.ANIO IN ({', '.join('?' * len(anios))})")
+            parametros += [int(anio) for anio in anios]
+        for filtro, valor in normalizar_filtros(filtros, ignorar):
+            if filtro == 'anio':
+                continue
+            if filtro == 'meses':
+                condiciones.append('h.MES BETWEEN ? AND ?')
+                parametros += list(valor)
+                continue
+            usadas.add(FILTROS_SQL[filtro])
+            expresion = COLUMNAS_SQL[FILTROS_SQL[filtro]]
+            valores = list(valor) if isinstance(valor, tuple) else [valor]
+            invalidos = [v for v in valores if not isinstance(v, ESCALARES)]
+            if invalidos:
+                raise ValueError(f"Filtro '{filtro}': se esperan textos o números (o una lista de ellos), "
+                                 f"no {type(invalidos[0]).__name__}")
+            condiciones.append(f"{expresion} IN ({', '.join('?' * len(valores))})")
+            parametros += valores
+        if rangos:
+            # Mismos intervalos que el índice CIE-10 (cie10.limites) sobre el código numérico
+            partes = []
+            for desde, hasta in rangos:
+                partes.append('h.CAUSA_NUMERO BETWEEN ? AND ?')
+                parametros += list(limites(desde, hasta))
+            condiciones.append('(' + ' OR '.join(partes) + ')')
+        # Como groupby: las llaves nulas (o sin nombre en las dimensiones) se descartan
+        condiciones += [f'{COLUMNAS_SQL[col]} IS NOT NULL' for col in columnas]
+
+        expresiones = [COLUMNAS_SQL[col] for col in columnas]
+        tablas = {ATRIBUTOS[col] for col in usadas if not COLUMNAS_SQL[col].startswith('h.')}
+        uniones = [
+            f'LEFT JOIN {tabla} {alias} ON {alias}.{LLAVES[tabla]} = h.{LLAVES[tabla]}'
+            for tabla, alias in ALIAS_TABLA.items() if tabla in tablas
+        ]
+        consulta = ' '.join([
+            'SELECT', ', '.join(expresiones + [f'SUM(h.{COL_MUERTES}) AS total']),
+            'FROM hechos h', *uniones,
+            'WHERE ' + ' AND '.join(condiciones) if condiciones else '',
+            'GROUP BY ' + ', '.join(expresiones) if expresiones else '',
+            f'ORDER BY total {orden.upper()}' if orden else '',
+            f'LIMIT {limite}' if limite is not None else '',
+        ])
+        return consulta, parametros
+
+    def agregar(self, columnas, filtros=None, ignorar=(), rangos=None, nombre='Total Muertes',
+                orden=None, limite=None, como_pandas=False):
+        """Suma de muertes por ``columnas`` de las celdas que cumplen ``filtros`` (y ``rangos`` de causas).
+
+        ``filtros`` tiene el formato del dashboard; ``anio`` puede ser un año,
+        una lista o faltar (todos). Con ``orden`` y ``limite`` el top-N también
+        se resuelve en el motor.
+        """
+        consulta, parametros = self.sql(columnas, filtros, ignorar, rangos, orden, limite)
+        with self._lock:
+            filas = self._conexion.execute(consulta, parametros).fetchall()
+        df = pd.DataFrame.from_records(filas, columns=list(columnas) + [nombre])
+        if como_pandas:
+            df = self._como_pandas(df, list(columnas), nombre, filtros['anio'], ordenar=orden is None)
+        return df
+
+    def _como_pandas(self, df, columnas, nombre, anio, ordenar=True):
+        """Mismos tipos (categorías incluidas) y, si ``ordenar``, el mismo orden que ``cubo.agregar``."""
+        cubo, dimensiones = self._plantillas[anio]
+        tipos = agregar(cubo, columnas, nombre, dimensiones).dtypes
+        for col, tipo in tipos.items():
+            if isinstance(tipo, pd.CategoricalDtype):
+                categorias = tipo.categories if len(tipo.categories) else np.sort(df[col].unique())
+                df[col] = pd.Categorical(df[col], categories=categorias, ordered=tipo.ordered)
+            else:
+                df[col] = df[col].astype(tipo)
+        if ordenar and columnas:
+            df = df.sort_values(columnas, kind='stable')
+        return df.reset_index(drop=True)
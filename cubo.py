@@ -0,0 +1,254 @@
+"""Cubo de agregación de muertes para los callbacks del dashboard.
+
+El cubo se construye una sola vez a partir de ``df_final`` y guarda el número
+de muertes por (municipio, mes, sexo, grupo de edad, causa). Todos los gráficos
+se calculan sumando celdas del cubo en lugar de recorrer el DataFrame fila a
+fila en cada carga de página.
+
+``IndiceCubo`` guarda los desplazamientos de cada departamento y municipio
+sobre el cubo ordenado por municipio, de modo que un filtro geográfico es un
+corte contiguo y el resto de filtros se evalúan solo sobre ese corte. El cubo
+ya sale ordenado de ``construir_cubo``, así que el índice usa directamente
+las columnas mapeadas desde disco, sin copiarlas.
+
+El cubo solo tiene llaves: los nombres de departamento, municipio, causa y
+capítulo se resuelven con las tablas de dimensiones (dimensiones.py) sobre
+el resultado ya agregado.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from cie10 import IndiceCIE10
+from columnar import concatenar
+from dimensiones import llave_de
+
+# Llaves del cubo: cada celda es una combinación única de estas columnas
+DIMENSIONES_CUBO = ['COD_DANE_COMPLETO', 'MES', 'SEXO', 'GRUPO_EDAD_CAT', 'CAUSA_CODIGO']
+
+COL_MUERTES = 'MUERTES'
+
+
+def _llave_municipio(cubo):
+    """Rango alfabético del municipio de cada celda (-1 sin municipio) y los códigos ordenados."""
+    municipios = cubo['COD_DANE_COMPLETO'].array
+    categorias = np.asarray(municipios.categories.astype(str))
+    # Rango de cada categoría en orden alfabético: así los municipios de un
+    # mismo departamento quedan contiguos aunque las categorías no estén ordenadas
+    rango = np.empty(len(categorias), dtype=np.int64)
+    rango[np.argsort(categorias)] = np.arange(len(categorias))
+    codigos = municipios.codes
+    return np.where(codigos >= 0, rango[codigos], -1), np.sort(categorias)
+
+
+def construir_cubo(df_final):
+    """Agrupa ``df_final`` en celdas con el conteo de muertes de cada combinación."""
+    # dropna=False conserva las muertes sin código de municipio o de causa,
+    # igual que el DataFrame original; los callbacks deciden si las descartan.
+    cubo = (
+        df_final
+        .groupby(DIMENSIONES_CUBO, dropna=False, observed=True, sort=False)
+        .size()
+        .reset_index(name=COL_MUERTES)
+    )
+    cubo = _ordenar_por_municipio(cubo)
+    print(f"Cubo de agregación listo: {len(cubo)} celdas para {len(df_final)} registros.")
+    return cubo
+
+
+def _ordenar_por_municipio(cubo):
+    """Ordena las celdas por municipio, el orden en que las recorre IndiceCubo."""
+    llave, _ = _llave_municipio(cubo)
+    return cubo.iloc[np.argsort(llave, kind='stable')].reset_index(drop=True)
+
+
+def sumar_cubos(cubo, delta):
+    """Cubo con las muertes de ``cubo`` más las de ``delta`` (ej. el cubo de un lote nuevo).
+
+    Solo se reagrupan las celdas de ambos cubos, no los registros originales.
+    """
+    unido = concatenar([cubo, delta])
+    cubo = (
+        unido
+        .groupby(DIMENSIONES_CUBO, dropna=False, observed=True, sort=False)[COL_MUERTES]
+        .sum()
+        .reset_index()
+    )
+    return _ordenar_por_municipio(cubo)
+
+
+def agregar(cubo, columnas, nombre='Total Muertes', dimensiones=None):
+    """Suma las muertes del cubo por ``columnas``.
+
+    Equivale a ``df_final.groupby(columnas).size()``: las llaves nulas se
+    descartan como lo hace ``groupby`` por defecto. Las columnas que no están
+    en el cubo (nombres, departamento, capítulo) se resuelven con
+    ``dimensiones`` después de sumar por sus llaves, sobre pocas filas.
+    """
+    atributos = [col for col in columnas if col not in cubo.columns]
+    if atributos:
+        llaves = list(dict.fromkeys(
+            [col for col in columnas if col in cubo.columns] + [llave_de(col) for col in atributos]
+        ))
+        cubo = dimensiones.resolver(agregar(cubo, llaves, COL_MUERTES), atributos)
+    return (
+        cubo
+        .groupby(columnas, observed=True)[COL_MUERTES]
+        .sum()
+        .reset_index(name=nombre)
+    )
+
+
+# --- Filtros del dashboard ---
+# Estado normalizado que comparten todos los callbacks (se guarda en dcc.Store)
+FILTROS_VACIOS = {
+    'anio': None,           # None = año por defecto (el más reciente)
+    'departamento': None,   # Código DANE de 2 dígitos
+    'municipio': None,      # Código DANE de 5 dígitos
+    'sexo': [],
+    'grupo_edad': [],
+    'meses': [1, 12],       # Rango inclusivo
+    'capitulo': [],         # Capítulos CIE-10
+}
+
+# Filtros categóricos (lista de valores permitidos) y la columna del cubo que filtran
+COLUMNAS_FILTRO = {
+    'sexo': 'SEXO',
+    'grupo_edad': 'GRUPO_EDAD_CAT',
+    'capitulo': 'CAPITULO',
+}
+
+
+def normalizar_filtros(filtros, ignorar=()):
+    """Convierte el estado de filtros en una tupla ordenada y hashable.
+
+    Los filtros en ``ignorar`` y los que no restringen nada (listas vacías,
+    todos los meses) se omiten, de modo que estados equivalentes comparten la
+    misma llave de caché.
+    """
+    filtros = {**FILTROS_VACIOS, **(filtros or {})}
+    normalizado = []
+    for nombre in sorted(FILTROS_VACIOS):
+        valor = filtros[nombre]
+        if nombre in ignorar or valor in (None, []):
+            continue
+        if nombre == 'meses':
+            valor = (int(valor[0]), int(valor[1]))
+            if valor == (1, 12):
+                continue
+        elif isinstance(valor, list):
+            valor = tuple(sorted(valor, key=str))
+        normalizado.append((nombre, valor))
+    return tuple(normalizado)
+
+
+class IndiceCubo:
+    """Cubo ordenado por municipio con desplazamientos para consultas filtradas.
+
+    ``filtrar`` responde cualquier combinación de filtros cortando primero el
+    rango contiguo del departamento o municipio y aplicando después las
+    máscaras de sexo, grupo de edad, meses y capítulo sobre los códigos de
+    categoría (arreglos NumPy) de ese corte. ``dimensiones`` resuelve los
+    nombres en ``agregar`` y el capítulo de cada causa para su filtro.
+    """
+
+    def __init__(self, cubo, dimensiones=None):
+        self.dimensiones = dimensiones
+        llave, ordenadas = _llave_municipio(cubo)
+        if np.all(llave[:-1] <= llave[1:]):
+            self.cubo = cubo # Ya ordenado por construir_cubo: se usa sin copiar
+        else:
+            orden = np.argsort(llave, kind='stable')
+            self.cubo = cubo.iloc[orden].reset_index(drop=True)
+            llave = llave[orden]
+
+        # Desplazamientos [inicio, fin) de cada municipio y de cada departamento
+        limites = np.searchsorted(llave, np.arange(len(ordenadas) + 1))
+        self._rango_municipio = {
+            cod: (limites[i], limites[i + 1]) for i, cod in enumerate(ordenadas)
+        }
+        self._rango_departamento = {}
+        for i, cod in enumerate(ordenadas):
+            inicio, fin = self._rango_departamento.get(cod[:2], (limites[i], limites[i + 1]))
+            self._rango_departamento[cod[:2]] = (min(inicio, limites[i]), max(fin, limites[i + 1]))
+
+        # Códigos de categoría por columna filtrable y el mapa valor -> código
+        # (.array.codes no copia; .cat.codes sí)
+        self._codigos = {}
+        self._valores = {}
+        for col in COLUMNAS_FILTRO.values():
+            if col in self.cubo.columns:
+                categorias = self.cubo[col].array
+                self._codigos[col] = categorias.codes
+            else:
+                # Atributo de una dimensión (el capítulo de la causa), resuelto una vez por celda
+                categorias = dimensiones.valores(col, self.cubo[llave_de(col)])
+                self._codigos[col] = categorias.codes
+            self._valores[col] = {valor: i for i, valor in enumerate(categorias.categories.tolist())}
+        self._meses = self.cubo['MES'].to_numpy()
+        # Jerarquía CIE-10 de cada celda (necesita el capítulo de la tabla de causas)
+        self.causas = IndiceCIE10(self.cubo['CAUSA_CODIGO'], dimensiones) if dimensiones is not None else None
+
+        self._filtrar = lru_cache(maxsize=256)(self._filtrar_normalizado)
+
+    def opciones(self, columna):
+        """Valores presentes en el cubo para ``columna`` (para llenar los controles)."""
+        return list(self._valores[columna])
+
+    def agregar(self, celdas, columnas, nombre='Total Muertes'):
+        """``agregar`` sobre ``celdas`` (un resultado de ``filtrar``) con las dimensiones del índice."""
+        return agregar(celdas, columnas, nombre, self.dimensiones)
+
+    def filtrar_causas(self, celdas, rangos):
+        """Las ``celdas`` (un resultado de ``filtrar``) cuya causa cae en alguno de ``rangos``.
+
+        ``rangos`` son pares de códigos CIE-10, ej. ``[('X85', 'Y09')]``. Sin
+        filtros se cortan directamente las celdas del orden por código.
+        """
+        if len(celdas) == len(self.cubo):
+            return self.cubo.iloc[self.causas.filas(rangos)]
+        return celdas[self.causas.mascara(celdas.index.to_numpy(), rangos)]
+
+    def top_causas(self, celdas, nivel='codigo', n=10):
+        """Las ``n`` causas con más muertes en ``celdas`` agrupadas por ``nivel`` de la jerarquía CIE-10.
+
+        Devuelve las columnas ETIQUETA (código, rango o capítulo), NOMBRE y
+        'Total Casos'; los valores sin nombre (códigos que no están en la
+        tabla de causas, celdas fuera de los bloques) no se listan.
+        """
+        valores = self.causas.columnas[nivel][celdas.index.to_numpy()]
+        validos = valores >= 0
+        totales = pd.Series(celdas[COL_MUERTES].to_numpy()[validos]).groupby(valores[validos]).sum()
+        etiquetas = self.causas.nombres(nivel, totales.index)
+        top = pd.DataFrame({
+            'ETIQUETA': [etiqueta for etiqueta, _ in etiquetas],
+            'NOMBRE': [nombre for _, nombre in etiquetas],
+            'Total Casos': totales.to_numpy(),
+        }).dropna(subset=['NOMBRE'])
+        return top.sort_values('Total Casos', ascending=False).head(n).reset_index(drop=True)
+
+    def filtrar(self, filtros, ignorar=()):
+        """Celdas del cubo que cumplen ``filtros``; resultados recientes quedan en memoria."""
+        return self._filtrar(normalizar_filtros(filtros, ignorar))
+
+    def _filtrar_normalizado(self, filtros):
+        filtros = dict(filtros)
+        inicio, fin = 0, len(self.cubo)
+        if 'municipio' in filtros:
+            inicio, fin = self._rango_municipio.get(filtros['municipio'], (0, 0))
+        elif 'departamento' in filtros:
+            inicio, fin = self._rango_departamento.get(filtros['departamento'], (0, 0))
+
+        mascara = np.ones(fin - inicio, dtype=bool)
+        for nombre, col in COLUMNAS_FILTRO.items():
+            if nombre in filtros:
+                permitidos = [self._valores[col][v] for v in filtros[nombre] if v in self._valores[col]]
+                mascara &= np.isin(self._codigos[col][inicio:fin], permitidos)
+        if 'meses' in filtros:
+            desde, hasta = filtros['meses']
+            meses = self._meses[inicio:fin]
+            mascara &= (meses >= desde) & (meses <= hasta)
+
+        corte = self.cubo.iloc[inicio:fin]
+        return corte if mascara.all() else corte[mascara]
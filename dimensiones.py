@@ -0,0 +1,94 @@
+"""Tablas de dimensiones: nombres de municipios y de causas indexados por su código.
+
+``df_final`` y el cubo guardan solo las llaves (código DANE de 5 dígitos y
+código CIE-10, como categorías: códigos enteros más la tabla de valores).
+Departamento, municipio, causa y capítulo se guardan una sola vez en estas
+tablas y se resuelven con un índice hash (``Index.get_indexer``) sobre las
+pocas filas ya agregadas que se muestran, en lugar de copiarse a cada
+registro con ``pd.merge``.
+"""
+import numpy as np
+import pandas as pd
+
+DIM_MUNICIPIO = 'dim_municipio'
+DIM_CAUSA = 'dim_causa'
+
+# Columnas de cada tabla de dimensiones; la primera es la llave
+COLUMNAS = {
+    DIM_MUNICIPIO: ['COD_DANE_COMPLETO', 'DEPARTAMENTO', 'MUNICIPIO'],
+    DIM_CAUSA: ['CAUSA_CODIGO', 'CAUSA_NOMBRE', 'CAUSA_3_NOMBRE', 'CAPITULO', 'CAPITULO_NOMBRE'],
+}
+LLAVES = {nombre: columnas[0] for nombre, columnas in COLUMNAS.items()}
+
+# Atributo -> tabla de dimensiones de la que sale. COD_DANE_DPTO no está en
+# ninguna tabla: son los dos primeros dígitos del código del municipio, así que
+# existe aunque el municipio no esté en DIVIPOLA.
+ATRIBUTOS = {
+    'COD_DANE_DPTO': DIM_MUNICIPIO,
+    'DEPARTAMENTO': DIM_MUNICIPIO,
+    'MUNICIPIO': DIM_MUNICIPIO,
+    'CAUSA_NOMBRE': DIM_CAUSA,
+    'CAUSA_3_NOMBRE': DIM_CAUSA, # Nombre de la categoría de tres caracteres
+    'CAPITULO': DIM_CAUSA,
+    'CAPITULO_NOMBRE': DIM_CAUSA,
+}
+
+
+def llave_de(atributo):
+    """Columna del cubo con la que se resuelve ``atributo``."""
+    return LLAVES[ATRIBUTOS[atributo]]
+
+
+def construir_dimensiones(df_municipios, df_causas):
+    """Tablas de dimensiones con las columnas de ``COLUMNAS``.
+
+    Queda una fila por código (la primera si se repite) y los nombres como
+    categorías.
+    """
+    tablas = {}
+    for nombre, df in ((DIM_MUNICIPIO, df_municipios), (DIM_CAUSA, df_causas)):
+        llave = LLAVES[nombre]
+        df = df[COLUMNAS[nombre]].dropna(subset=[llave]).drop_duplicates(llave).reset_index(drop=True)
+        tablas[nombre] = df.astype({col: str if col == llave else 'category' for col in df.columns})
+    return tablas
+
+
+class Dimensiones:
+    """Índice hash de cada tabla de dimensiones para resolver atributos por llave."""
+
+    def __init__(self, tablas):
+        self.tablas = tablas
+        self._indices = {
+            nombre: pd.Index(tablas[nombre][llave].astype(str)) for nombre, llave in LLAVES.items()
+        }
+
+    def _posiciones(self, tabla, llaves):
+        return self._indices[tabla].get_indexer(pd.Index(llaves))
+
+    def valores(self, atributo, llaves):
+        """``atributo`` de cada una de ``llaves`` como Categorical (nulo si la llave no está)."""
+        llaves = pd.Index(llaves)
+        if isinstance(llaves, pd.CategoricalIndex):
+            # Una búsqueda por categoría, expandida a las filas con los códigos
+            por_categoria = self.valores(atributo, llaves.categories)
+            codigos = np.append(por_categoria.codes, -1)[llaves.codes]
+            return pd.Categorical.from_codes(codigos, dtype=por_categoria.dtype)
+        if atributo == 'COD_DANE_DPTO':
+            return pd.Categorical(llaves.str[:2])
+        tabla = ATRIBUTOS[atributo]
+        columna = self.tablas[tabla][atributo].array
+        codigos = np.append(columna.codes, -1)[self._posiciones(tabla, llaves)]
+        return pd.Categorical.from_codes(codigos, dtype=columna.dtype)
+
+    def resolver(self, df, atributos):
+        """Agrega a ``df`` las columnas ``atributos`` a partir de sus llaves."""
+        return df.assign(**{
+            atributo: self.valores(atributo, df[llave_de(atributo)]) for atributo in atributos
+        })
+
+    def faltantes(self, tabla, llaves):
+        """Número de ``llaves`` (nulas incluidas) que no están en la tabla de dimensiones ``tabla``."""
+        # Se busca cada valor distinto una sola vez (hay pocos municipios y causas)
+        codigos, unicos = pd.factorize(llaves)
+        faltan = np.append(self._posiciones(tabla, unicos) < 0, True)
+        return int(faltan[codigos].sum())
@@ -0,0 +1,187 @@
+"""Exportación por bloques (CSV, JSON Lines o Parquet) de las tablas del dashboard.
+
+Las respuestas se generan a medida que se envían: las tablas de la
+partición se recorren en bloques de ``TAMANO_BLOQUE`` filas (sobre los
+arreglos mapeados en memoria, sin cargar la tabla completa), cada bloque se
+filtra, se serializa y se entrega al servidor antes de leer el siguiente.
+Así una exportación de cientos de miles de registros ocupa en el worker el
+tamaño de un bloque, no el de la tabla.
+
+``desde`` y ``limite`` paginan sobre las filas ya filtradas; el límite nunca
+pasa de ``MAX_FILAS_EXPORTACION``. Parquet necesita el paquete opcional
+``pyarrow``; cada bloque se escribe como un row group.
+"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo import COLUMNAS_FILTRO, normalizar_filtros
+from dimensiones import llave_de
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Opcional: sin el paquete no se exporta a Parquet
+    pa = pq = None
+
+TAMANO_BLOQUE = int(os.environ.get('EXPORTACION_BLOQUE', 50000))
+MAX_FILAS_EXPORTACION = int(os.environ.get('MAX_FILAS_EXPORTACION', 1000000))
+
+FORMATOS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Filtro del dashboard -> columna de la tabla (o atributo que se resuelve con las dimensiones)
+COLUMNAS_REGISTROS = {
+    'departamento': 'COD_DANE_DPTO',
+    'municipio': 'COD_DANE_COMPLETO',
+    **COLUMNAS_FILTRO,
+}
+
+
+def formato_disponible(formato):
+    """None si se puede exportar en ``formato``; si no, el motivo."""
+    if formato not in FORMATOS:
+        return f"Formato desconocido: '{formato}' ({', '.join(FORMATOS)})"
+    if formato == 'parquet' and pq is None:
+        return "Exportar a Parquet requiere el paquete pyarrow."
+    return None
+
+
+def mascara(df, filtros, dimensiones=None, ignorar=('anio',)):
+    """Filas de ``df`` que cumplen ``filtros`` (formato del dashboard) como arreglo booleano."""
+    resultado = np.ones(len(df), dtype=bool)
+    for nombre, valor in normalizar_filtros(filtros, ignorar):
+        if nombre == 'meses':
+            resultado &= df['MES'].between(*valor).to_numpy()
+            continue
+        columna = COLUMNAS_REGISTROS[nombre]
+        if columna in df.columns:
+            serie = df[columna]
+        else:
+            serie = pd.Series(dimensiones.valores(columna, df[llave_de(columna)]))
+        resultado &= serie.isin(valor if isinstance(valor, tuple) else [valor]).to_numpy()
+    return resultado
+
+
+def bloques(df, filtros=None, dimensiones=None, ignorar=('anio',), tamano=None):
+    """Bloques de ``df`` con las filas que cumplen ``filtros`` (los cortes no copian la tabla)."""
+    tamano = tamano or TAMANO_BLOQUE
+    for inicio in range(0, len(df), tamano):
+        bloque = df.iloc[inicio:inicio + tamano]
+        if filtros:
+            filas = mascara(bloque, filtros, dimensiones, ignorar)
+            if not filas.all():
+                bloque = bloque[filas]
+        if len(bloque):
+            yield bloque
+
+
+def paginar(bloques, desde=0, limite=None):
+    """Recorta ``bloques`` a las filas ``[desde, desde + limite)``; deja de leer al completar el límite."""
+    limite = min(limite, MAX_FILAS_EXPORTACION) if limite is not None else MAX_FILAS_EXPORTACION
+    saltar, restantes = max(desde, 0), limite
+    for bloque in bloques:
+        if restantes <= 0:
+            return
+        if saltar >= len(bloque):
+            saltar -= len(bloque)
+            continue
+        bloque = bloque.iloc[saltar:saltar + restantes]
+        saltar = 0
+        restantes -= len(bloque)
+        yield bloque
+
+
+def _decodificar(bloque):
+    """Categóricas como sus valores: los bloques de años distintos tienen otras categorías."""
+    return bloque.assign(**{
+        col: bloque[col].astype(object).where(bloque[col].notna(), None)
+        for col in bloque.columns if isinstance(bloque[col].dtype, pd.CategoricalDtype)
+    })
+
+
+def _csv(bloques, columnas):
+    encabezado = True
+    for bloque in bloques:
+        yield bloque.to_csv(index=False, header=encabezado)
+        encabezado = False
+    if encabezado:
+        yield ','.join(columnas) + '\n' # Sin filas: solo el encabezado
+
+
+def _jsonl(bloques, columnas):
+    for bloque in bloques:
+        yield bloque.to_json(orient='records', lines=True, force_ascii=False).rstrip('\n') + '\n'
+
+
+class _Salida(io.RawIOBase):
+    """Archivo de solo escritura que acumula lo escrito hasta que se lo saca con ``vaciar``.
+
+    Lleva la posición total (no la del búfer), que es la que ParquetWriter
+    usa para los desplazamientos del pie del archivo.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _parquet(bloques, columnas):
+    salida = _Salida()
+    escritor = esquema = None
+    for bloque in bloques:
+        tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+        if escritor is None:
+            esquema = tabla.schema.remove_metadata()
+            escritor = pq.ParquetWriter(salida, esquema)
+        escritor.write_table(tabla.cast(esquema))
+        yield salida.vaciar()
+    if escritor is None:
+        # Sin filas: archivo válido con las columnas y sin row groups
+        escritor = pq.ParquetWriter(salida, pa.schema([(col, pa.string()) for col in columnas]))
+    escritor.close()
+    yield salida.vaciar()
+
+
+SERIALIZADORES = {'csv': _csv, 'jsonl': _jsonl, 'parquet': _parquet}
+
+
+def serializar(bloques, formato, columnas):
+    """Texto o bytes de ``bloques`` en ``formato``, un trozo por bloque."""
+    return SERIALIZADORES[formato]((_decodificar(bloque) for bloque in bloques), columnas)
+
+
+def respuesta_exportacion(bloques, formato, columnas, nombre):
+    """Respuesta de Flask que envía ``bloques`` en ``formato`` a medida que se generan."""
+    from flask import Response, stream_with_context
+
+    respuesta = Response(
+        stream_with_context(serializar(bloques, formato, columnas)),
+        mimetype=FORMATOS[formato],
+    )
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    respuesta.headers['Cache-Control'] = 'no-store'
+    return respuesta
@@ -0,0 +1,304 @@
+"""Simplificación y cuantización de la geometría de ``Colombia.geo.json``.
+
+La simplificación preserva la topología: los bordes que comparten dos
+departamentos se dividen en arcos entre vértices de unión y cada arco se
+simplifica una sola vez (Douglas-Peucker), de modo que ambos polígonos usan
+exactamente los mismos vértices y no aparecen huecos ni traslapes. Después las
+coordenadas se redondean a ``decimales`` cifras.
+
+El resultado se guarda en ``data/cache/geometria/`` y solo se recalcula si el
+GeoJSON fuente es más nuevo.
+
+Para el mapa municipal, ``data/Colombia.municipios.geo.json`` (Marco
+Geoestadístico Nacional del DANE) se simplifica una vez y se divide en un
+archivo por departamento en ``data/cache/geometria/municipios/``; el mapa carga
+solo los polígonos del departamento seleccionado.
+
+``python geometria.py`` imprime una comparación de bytes y vértices para
+varias tolerancias::
+
+    python geometria.py --tolerancias 0.001 0.005 0.01 --decimales 3
+"""
+import argparse
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+PATH_GEOJSON = 'data/Colombia.geo.json'
+DIR_CACHE_GEOMETRIA = 'data/cache/geometria'
+
+# Tolerancia en grados (CRS84): 0.005° ≈ 550 m, invisible a la escala del mapa del país
+TOLERANCIA = float(os.environ.get('GEOMETRIA_TOLERANCIA', 0.005))
+# 3 decimales ≈ 110 m de precisión
+DECIMALES = int(os.environ.get('GEOMETRIA_DECIMALES', 3))
+
+# Geometría municipal (MGN del DANE): se ve a escala de un departamento, así que
+# admite una tolerancia menor que la del mapa nacional
+PATH_GEOJSON_MUNICIPIOS = 'data/Colombia.municipios.geo.json'
+DIR_CACHE_MUNICIPIOS = os.path.join(DIR_CACHE_GEOMETRIA, 'municipios')
+CLAVE_MUNICIPIO = 'MPIO_CCNCT' # Código DANE de 5 dígitos en las propiedades del MGN
+CLAVE_DPTO_MUNICIPIO = 'DPTO_CCDGO' # Código DANE de 2 dígitos
+TOLERANCIA_MUNICIPIOS = float(os.environ.get('GEOMETRIA_TOLERANCIA_MUNICIPIOS', 0.001))
+
+
+def _douglas_peucker(puntos, tolerancia):
+    """Índices a conservar de la polilínea ``puntos`` (arreglo n x 2)."""
+    n = len(puntos)
+    conservar = np.zeros(n, dtype=bool)
+    conservar[0] = conservar[-1] = True
+    pila = [(0, n - 1)]
+    while pila:
+        i, j = pila.pop()
+        if j <= i + 1:
+            continue
+        a, b = puntos[i], puntos[j]
+        tramo = puntos[i + 1:j]
+        ab = b - a
+        largo = np.hypot(ab[0], ab[1])
+        if largo == 0:
+            distancias = np.hypot(tramo[:, 0] - a[0], tramo[:, 1] - a[1])
+        else:
+            distancias = np.abs(ab[0] * (tramo[:, 1] - a[1]) - ab[1] * (tramo[:, 0] - a[0])) / largo
+        k = int(np.argmax(distancias))
+        if distancias[k] > tolerancia:
+            conservar[i + 1 + k] = True
+            pila.append((i, i + 1 + k))
+            pila.append((i + 1 + k, j))
+    return conservar
+
+
+def _anillos(geometria):
+    """Lista de anillos (listas de coordenadas) de un Polygon o MultiPolygon."""
+    if geometria['type'] == 'Polygon':
+        return list(geometria['coordinates'])
+    if geometria['type'] == 'MultiPolygon':
+        return [anillo for poligono in geometria['coordinates'] for anillo in poligono]
+    return []
+
+
+def _cuantizar_anillo(anillo, decimales):
+    """Redondea las coordenadas, quita el punto de cierre y los duplicados consecutivos."""
+    puntos = []
+    for x, y, *_ in anillo:
+        punto = (round(x, decimales), round(y, decimales))
+        if not puntos or punto != puntos[-1]:
+            puntos.append(punto)
+    if len(puntos) > 1 and puntos[0] == puntos[-1]:
+        puntos.pop()
+    return puntos
+
+
+def _vertices_de_union(anillos):
+    """Vértices donde cambia el conjunto de anillos que comparten el borde."""
+    miembros = {}
+    for i, anillo in enumerate(anillos):
+        for punto in anillo:
+            miembros.setdefault(punto, set()).add(i)
+    uniones = set()
+    for anillo in anillos:
+        n = len(anillo)
+        for k, punto in enumerate(anillo):
+            propio = miembros[punto]
+            if len(propio) > 1 and (
+                miembros[anillo[k - 1]] != propio or miembros[anillo[(k + 1) % n]] != propio
+            ):
+                uniones.add(punto)
+    return uniones
+
+
+def _simplificar_arco(arco, tolerancia, memoria):
+    """Simplifica un arco con orientación canónica para que ambos lados coincidan."""
+    invertido = tuple(reversed(arco))
+    directo = tuple(arco)
+    canonico, al_reves = (directo, False) if directo <= invertido else (invertido, True)
+    resultado = memoria.get(canonico)
+    if resultado is None:
+        puntos = np.array(canonico, dtype=float)
+        resultado = [canonico[i] for i in np.flatnonzero(_douglas_peucker(puntos, tolerancia))]
+        memoria[canonico] = resultado
+    return list(reversed(resultado)) if al_reves else list(resultado)
+
+
+def _simplificar_anillo(anillo, uniones, tolerancia, memoria):
+    n = len(anillo)
+    if n < 4:
+        return anillo
+    cortes = [k for k, punto in enumerate(anillo) if punto in uniones]
+    if not cortes:
+        # Isla o anillo sin vecinos: cortarlo en el primer punto y en el más lejano
+        puntos = np.array(anillo, dtype=float)
+        lejano = int(np.argmax(np.hypot(*(puntos - puntos[0]).T)))
+        cortes = sorted({0, lejano})
+    simplificado = []
+    for i, inicio in enumerate(cortes):
+        fin = cortes[(i + 1) % len(cortes)]
+        arco = anillo[inicio:fin + 1] if fin > inicio else anillo[inicio:] + anillo[:fin + 1]
+        simplificado.extend(_simplificar_arco(arco, tolerancia, memoria)[:-1])
+    # Un anillo válido necesita al menos 3 vértices distintos; si no, se deja cuantizado
+    return simplificado if len(simplificado) >= 3 else anillo
+
+
+def simplificar_geojson(geojson, tolerancia=TOLERANCIA, decimales=DECIMALES):
+    """Devuelve una copia de ``geojson`` simplificada y con coordenadas redondeadas."""
+    entidades = geojson['features']
+    cuantizados = [
+        [_cuantizar_anillo(anillo, decimales) for anillo in _anillos(entidad['geometry'])]
+        for entidad in entidades
+    ]
+    todos = [anillo for anillos in cuantizados for anillo in anillos]
+    uniones = _vertices_de_union(todos)
+    memoria = {}
+
+    nuevas = []
+    for entidad, anillos in zip(entidades, cuantizados):
+        cerrados = []
+        for anillo in anillos:
+            anillo = _simplificar_anillo(anillo, uniones, tolerancia, memoria)
+            cerrados.append([list(p) for p in anillo] + [list(anillo[0])])
+        geometria = entidad['geometry']
+        if geometria['type'] == 'Polygon':
+            coordenadas = cerrados
+        else:
+            # Reagrupar los anillos en los polígonos originales
+            coordenadas, k = [], 0
+            for poligono in geometria['coordinates']:
+                coordenadas.append(cerrados[k:k + len(poligono)])
+                k += len(poligono)
+        nuevas.append({
+            'type': 'Feature',
+            'properties': entidad['properties'],
+            'geometry': {'type': geometria['type'], 'coordinates': coordenadas},
+        })
+    return {'type': 'FeatureCollection', 'features': nuevas}
+
+
+def contar_vertices(geojson):
+    return sum(len(anillo) for entidad in geojson['features'] for anillo in _anillos(entidad['geometry']))
+
+
+def serializar(geojson):
+    """JSON compacto (sin espacios) del GeoJSON."""
+    return json.dumps(geojson, separators=(',', ':'), ensure_ascii=False)
+
+
+def ruta_cache(path, tolerancia, decimales):
+    base = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(DIR_CACHE_GEOMETRIA, f"{base}.t{tolerancia:g}.d{decimales}.geo.json")
+
+
+def cargar_geojson_simplificado(path=PATH_GEOJSON, tolerancia=TOLERANCIA, decimales=DECIMALES):
+    """GeoJSON simplificado desde la caché en disco; lo genera si falta o si la fuente cambió."""
+    destino = ruta_cache(path, tolerancia, decimales)
+    if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(path):
+        with open(destino, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    with open(path, 'r') as f:
+        original = json.load(f)
+    simplificado = simplificar_geojson(original, tolerancia, decimales)
+    try:
+        os.makedirs(DIR_CACHE_GEOMETRIA, exist_ok=True)
+        tmp = f"{destino}.tmp{os.getpid()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(serializar(simplificado))
+        os.replace(tmp, destino)
+    except OSError as e:
+        print(f"¡Advertencia! No se pudo guardar la geometría simplificada: {e}")
+    print(f"Geometría simplificada: {contar_vertices(original)} -> {contar_vertices(simplificado)} vértices "
+          f"(tolerancia {tolerancia:g}, {decimales} decimales).")
+    return simplificado
+
+
+def _fragmentos_vigentes(path):
+    marca = os.path.join(DIR_CACHE_MUNICIPIOS, 'LISTO')
+    return os.path.exists(marca) and os.path.getmtime(marca) >= os.path.getmtime(path)
+
+
+def dividir_municipios(path=PATH_GEOJSON_MUNICIPIOS, tolerancia=TOLERANCIA_MUNICIPIOS, decimales=DECIMALES):
+    """Simplifica la geometría municipal completa y escribe un GeoJSON por departamento.
+
+    Se simplifica antes de dividir para que los bordes entre municipios de
+    departamentos vecinos sigan coincidiendo.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        original = json.load(f)
+    simplificado = simplificar_geojson(original, tolerancia, decimales)
+
+    por_departamento = {}
+    for entidad in simplificado['features']:
+        propiedades = entidad['properties']
+        codigo = str(propiedades[CLAVE_MUNICIPIO]).zfill(5)
+        propiedades[CLAVE_MUNICIPIO] = codigo
+        dpto = str(propiedades.get(CLAVE_DPTO_MUNICIPIO, codigo[:2])).zfill(2)
+        por_departamento.setdefault(dpto, []).append(entidad)
+
+    os.makedirs(DIR_CACHE_MUNICIPIOS, exist_ok=True)
+    for dpto, entidades in por_departamento.items():
+        destino = os.path.join(DIR_CACHE_MUNICIPIOS, f"{dpto}.geo.json")
+        tmp = f"{destino}.tmp{os.getpid()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(serializar({'type': 'FeatureCollection', 'features': entidades}))
+        os.replace(tmp, destino)
+    # La marca se escribe de última: su mtime indica que todos los fragmentos están completos
+    with open(os.path.join(DIR_CACHE_MUNICIPIOS, 'LISTO'), 'w') as f:
+        f.write(str(len(por_departamento)))
+    print(f"Geometría municipal dividida en {len(por_departamento)} departamentos: "
+          f"{contar_vertices(original)} -> {contar_vertices(simplificado)} vértices.")
+
+
+def hay_geometria_municipal(path=PATH_GEOJSON_MUNICIPIOS):
+    return os.path.exists(path) or os.path.exists(os.path.join(DIR_CACHE_MUNICIPIOS, 'LISTO'))
+
+
+@lru_cache(maxsize=8)
+def cargar_municipios_departamento(dpto, path=PATH_GEOJSON_MUNICIPIOS):
+    """Polígonos municipales de un departamento, o None si no hay geometría municipal."""
+    if os.path.exists(path) and not _fragmentos_vigentes(path):
+        dividir_municipios(path)
+    destino = os.path.join(DIR_CACHE_MUNICIPIOS, f"{dpto}.geo.json")
+    try:
+        with open(destino, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def comparar(path=PATH_GEOJSON, tolerancias=(0.001, 0.0025, 0.005, 0.01, 0.02), decimales=DECIMALES):
+    """Bytes y vértices del GeoJSON original y de cada tolerancia."""
+    with open(path, 'r') as f:
+        original = json.load(f)
+    filas = [{
+        'tolerancia': 'original',
+        'bytes': os.path.getsize(path),
+        'vertices': contar_vertices(original),
+    }]
+    for tolerancia in tolerancias:
+        simplificado = simplificar_geojson(original, tolerancia, decimales)
+        filas.append({
+            'tolerancia': tolerancia,
+            'bytes': len(serializar(simplificado).encode('utf-8')),
+            'vertices': contar_vertices(simplificado),
+        })
+    return filas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compara tolerancias de simplificación del GeoJSON.")
+    parser.add_argument('--geojson', default=PATH_GEOJSON)
+    parser.add_argument('--tolerancias', type=float, nargs='+', default=[0.001, 0.0025, 0.005, 0.01, 0.02])
+    parser.add_argument('--decimales', type=int, default=DECIMALES)
+    parser.add_argument('--dividir-municipios', action='store_true',
+                        help="Generar además los fragmentos municipales por departamento.")
+    args = parser.parse_args()
+
+    if args.dividir_municipios:
+        dividir_municipios()
+
+    filas = comparar(args.geojson, args.tolerancias, args.decimales)
+    base = filas[0]
+    print(f"{'Tolerancia':>12} {'Bytes':>12} {'% bytes':>8} {'Vértices':>10} {'% vért.':>8}")
+    for fila in filas:
+        print(f"{str(fila['tolerancia']):>12} {fila['bytes']:>12,} {100 * fila['bytes'] / base['bytes']:>7.1f}% "
+              f"{fila['vertices']:>10,} {100 * fila['vertices'] / base['vertices']:>7.1f}%")
@@ -0,0 +1,43 @@
+"""Configuración de gunicorn: los datos se cargan una vez en el proceso maestro.
+
+Con ``preload_app`` el maestro importa app.py (cubo, índices, tasas y
+geometría) antes de crear los workers, y estos heredan esas páginas de memoria
+por copy-on-write. Las tablas grandes son arreglos NumPy/Arrow (códigos de
+categoría y conteos), que no se reescriben al leerlos; ``gc.freeze()`` mueve
+los objetos de Python ya creados a la generación permanente para que el
+recolector de basura de cada worker no toque sus encabezados y fuerce la copia.
+
+Los hilos no sobreviven al fork, así que el precálculo de figuras
+(precalentamiento.py) arranca en cada worker, en ``post_worker_init``; el
+worker atiende peticiones desde el inicio y ``/listo`` responde 503 hasta que
+termina.
+
+Uso: ``gunicorn -c gunicorn.conf.py app:server`` (ver Procfile).
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+
+def when_ready(server):
+    """Precarga los años que caben en memoria y congela el heap antes del primer fork."""
+    import app
+
+    # El año por defecto ya se cargó al importar app; los demás se leen aquí
+    # para que también queden compartidos en lugar de repetirse por worker
+    for anio in app.ANIOS[-app.MAX_ANIOS_EN_MEMORIA:]:
+        app.datos_anio(anio)
+    gc.collect()
+    gc.freeze()
+    server.log.info("Datos precargados en el maestro (%d objetos congelados).", gc.get_freeze_count())
+
+
+def post_worker_init(worker):
+    """Arranca el precálculo de las figuras más consultadas en segundo plano."""
+    import app
+
+    app.iniciar_precalentamiento()
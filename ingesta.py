@@ -0,0 +1,186 @@
+"""Ingesta incremental de lotes de defunciones (ej. el corte mensual del DANE).
+
+Un lote es un libro con las mismas columnas que ``datos_mortalidad.xlsx``
+pero solo con los registros nuevos. Se limpia y enriquece con las mismas
+etapas de preprocesamiento.py, se reparte por año de defunción y en cada
+partición se aplica como delta:
+
+* ``df_final``: el lote se agrega como un segmento más; los anteriores
+  pasan a la versión nueva por enlace duro, sin reescribirse;
+* ``cubo``: las celdas del lote se suman a las existentes (``sumar_cubos``),
+  y de él salen los conteos por municipio, los totales por mes, etc.;
+* ``df_tbm_completo``: se recalcula desde el cubo nuevo (una fila por municipio);
+* ``dim_municipio`` y ``dim_causa``: se reescriben desde DIVIPOLA y los
+  códigos CIE-10 actuales (son pequeñas).
+
+La versión nueva se publica reemplazando el manifiesto de la partición: los
+workers en ejecución la cargan en su siguiente callback, sin reiniciar. Un
+lote ya aplicado (mismo hash) se ignora.
+
+Uso:
+    python ingesta.py data/entrantes/lote_2019_11.xlsx [...]
+    python ingesta.py --vigilar data/entrantes --intervalo 30
+
+Con ``--vigilar`` se revisa la carpeta periódicamente y cada libro se mueve
+a ``procesados/`` (o a ``errores/`` si falla). Si más adelante cambia el
+libro anual de un año, su partición se reconstruye desde Excel y los lotes
+que ese libro no incluya hay que volver a ingerirlos. Un año sin libro anual
+cuya partición es de una versión anterior del formato no se puede
+reconstruir: el lote se rechaza en lugar de reemplazar lo que ya tenía.
+"""
+import argparse
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import preprocesamiento as pre
+from cubo import construir_cubo, sumar_cubos
+from dimensiones import Dimensiones
+from metricas import etapa, etiquetas
+
+DIR_ENTRANTES = os.path.join(pre.DIR_DATOS, 'entrantes')
+INTERVALO = 30 # Segundos entre revisiones de la carpeta vigilada
+ESPERA_ESCRITURA = 5 # Un libro modificado hace menos de esto puede estar copiándose aún
+
+
+def enriquecer(df_lote, dimensiones):
+    """Limpia un lote y deja sus llaves igual que el libro anual; devuelve ``{anio: df_final}``."""
+    df_lote = pre.limpiar_muertes(df_lote)
+    df_final = pre.fusionar(df_lote, dimensiones)
+    df_final['GRUPO_EDAD_CAT'] = pre.categorizar_grupo_edad(df_final['GRUPO_EDAD1'])
+    return {
+        int(anio): pre.aplicar_esquema(grupo)
+        for anio, grupo in df_final.groupby(df_final['FECHA_DEFUNCION'].dt.year)
+    }
+
+
+def aplicar_lote(anio, df_nuevo, lote, tablas_dimensiones):
+    """Suma ``df_nuevo`` a la partición de ``anio`` y publica la versión nueva.
+
+    Devuelve False si el lote ya estaba aplicado en esa partición.
+    """
+    directorio = pre._dir_anio(anio)
+    archivos = [os.path.join(nombre, 'esquema.json') for nombre in pre.TABLAS_CACHE]
+    if anio in pre.fuentes_muertes() and not pre.cache_vigente(directorio, archivos):
+        # Partición ausente o desactualizada: primero se construye desde el libro anual
+        pre.cargar_anio(anio, tablas=[], poblacion=False)
+
+    with pre.bloqueo_particion(directorio):
+        manifiesto = pre._leer_manifiesto(directorio)
+        vigente = manifiesto is not None and manifiesto.get('version') == pre.VERSION_CACHE
+        if manifiesto is not None and not vigente:
+            # Partición de otra versión del formato que no se pudo reconstruir desde el libro
+            # anual: publicar solo el lote borraría los registros y los lotes que ya tiene
+            raise ValueError(
+                f"La partición {anio} es de otra versión del formato ({manifiesto.get('version')}, "
+                f"la actual es {pre.VERSION_CACHE}) y no se pudo reconstruir desde el libro anual; "
+                f"tiene {len(manifiesto.get('lotes', []))} lote(s) aplicado(s). Reconstrúyala antes de ingerir."
+            )
+        lotes = manifiesto.get('lotes', []) if vigente else []
+        if any(previo['sha256'] == lote['sha256'] for previo in lotes):
+            print(f"El lote '{lote['archivo']}' ya estaba aplicado en {anio}; se omite.")
+            return False
+
+        delta = construir_cubo(df_nuevo)
+        if vigente:
+            cubo = sumar_cubos(pre.leer_particion(anio, ['cubo'])['cubo'], delta)
+            segmentos = manifiesto.get('segmentos', {}).get('df_final', ['df_final'])
+            segmento = f"df_final.lote{manifiesto['secuencia'] + 1:06d}"
+            huellas = manifiesto['fuentes']
+        else:
+            # Año sin libro anual ni partición: el lote es la partición completa
+            print(f"No hay partición vigente para {anio}; se crea con el lote.")
+            cubo, segmentos, segmento, huellas = delta, [], 'df_final', {}
+
+        df_tbm_completo = pre.calcular_tbm(cubo, pre.cargar_poblacion(anio), Dimensiones(tablas_dimensiones))
+        pre.guardar_particion(
+            directorio,
+            {segmento: df_nuevo, 'cubo': cubo, 'df_tbm_completo': df_tbm_completo, **tablas_dimensiones},
+            [],
+            reutilizar=segmentos,
+            huellas=huellas,
+            segmentos={'df_final': segmentos + [segmento]},
+            lotes=lotes + [lote],
+        )
+    print(f"Lote '{lote['archivo']}': {len(df_nuevo)} registros aplicados a {anio} "
+          f"({pre.version_particion(anio)}).")
+    return True
+
+
+def ingerir(path):
+    """Aplica el lote ``path`` a las particiones de los años que contiene.
+
+    Devuelve ``{anio: filas}`` con los años en los que se aplicó.
+    """
+    lote = {
+        'archivo': os.path.basename(path),
+        'sha256': pre._sha256(path),
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    with etapa('leer_lote') as registro:
+        libros = pre.leer_libros({'muertes': path, 'codigos': pre.PATH_CODIGOS, 'divipola': pre.PATH_DIVIPOLA})
+        registro['filas_salida'] = len(libros['muertes'])
+    tablas_dimensiones = pre.preparar_dimensiones(
+        pre.preparar_divipola(libros['divipola']), pre.preparar_codigos(libros['codigos'])
+    )
+    por_anio = enriquecer(libros['muertes'], Dimensiones(tablas_dimensiones))
+    if not por_anio:
+        print(f"El lote '{lote['archivo']}' no tiene registros con fecha de defunción válida.")
+
+    aplicados = {}
+    for anio, df_nuevo in sorted(por_anio.items()):
+        with etiquetas(anio=anio), etapa('aplicar_lote', df_nuevo) as registro:
+            if aplicar_lote(anio, df_nuevo, dict(lote, filas=len(df_nuevo)), tablas_dimensiones):
+                aplicados[anio] = len(df_nuevo)
+            registro['filas_salida'] = aplicados.get(anio, 0)
+    return aplicados
+
+
+def _mover(path, subdirectorio):
+    destino = os.path.join(os.path.dirname(path), subdirectorio)
+    os.makedirs(destino, exist_ok=True)
+    shutil.move(path, os.path.join(destino, os.path.basename(path)))
+
+
+def vigilar(directorio=DIR_ENTRANTES, intervalo=INTERVALO):
+    """Ingiere cada libro .xlsx que aparece en ``directorio``, revisándolo cada ``intervalo`` segundos."""
+    os.makedirs(directorio, exist_ok=True)
+    print(f"Vigilando '{directorio}' cada {intervalo} s (Ctrl+C para terminar).")
+    while True:
+        for nombre in sorted(os.listdir(directorio)):
+            path = os.path.join(directorio, nombre)
+            if not nombre.endswith('.xlsx') or nombre.startswith(('~$', '.')) or not os.path.isfile(path):
+                continue
+            if time.time() - os.path.getmtime(path) < ESPERA_ESCRITURA:
+                continue
+            try:
+                ingerir(path)
+            except Exception as e:
+                # Un lote defectuoso no detiene la vigilancia; queda aparte para revisarlo
+                print(f"¡Error! No se pudo ingerir '{nombre}': {e}")
+                _mover(path, 'errores')
+            else:
+                _mover(path, 'procesados')
+        time.sleep(intervalo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('lotes', nargs='*', help="Libros .xlsx con los registros nuevos.")
+    parser.add_argument('--vigilar', nargs='?', const=DIR_ENTRANTES, metavar='CARPETA',
+                        help=f"Carpeta a vigilar (por defecto {DIR_ENTRANTES}).")
+    parser.add_argument('--intervalo', type=float, default=INTERVALO,
+                        help="Segundos entre revisiones de la carpeta vigilada.")
+    args = parser.parse_args()
+    if not args.lotes and not args.vigilar:
+        parser.error("indique al menos un lote o --vigilar")
+
+    for path in args.lotes:
+        ingerir(path)
+    if args.vigilar:
+        vigilar(args.vigilar, args.intervalo)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""Métricas de tiempo y memoria del preprocesamiento y de los callbacks.
+
+Cada etapa del preprocesamiento se envuelve en ``with etapa(nombre, df)``,
+que registra el tiempo, las filas de entrada y salida y la variación de la
+memoria residente (RSS) del proceso. ``instrumentar_servidor`` mide la
+latencia y el tamaño de la respuesta de cada callback de Dash.
+
+Todo queda en memoria para ``exportar_prometheus()`` (formato de texto de
+Prometheus, servido en /metrics) y además se emite una línea JSON por
+evento en el logger ``metricas``. Con gunicorn cada worker lleva sus propios
+contadores.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('metricas')
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+BUCKETS_LATENCIA = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+_TAMANO_PAGINA = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+_lock = threading.Lock()
+_etapas = {}    # (etapa, etiquetas) -> último registro
+_callbacks = {} # callback -> contadores del histograma
+_etiquetas = {} # Etiquetas comunes de las etapas en curso (ej. anio)
+
+
+def configurar_logs(nivel=None):
+    """Envía los eventos del logger ``metricas`` a stderr, una línea JSON por evento."""
+    if not logger.handlers:
+        manejador = logging.StreamHandler()
+        manejador.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(manejador)
+        logger.propagate = False
+    logger.setLevel(nivel or os.environ.get('METRICAS_NIVEL_LOG', 'INFO'))
+
+
+def rss_bytes():
+    """Memoria residente del proceso (Linux: /proc/self/statm); None si no se puede leer."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _TAMANO_PAGINA
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _filas(valor):
+    return len(valor) if valor is not None and hasattr(valor, '__len__') else None
+
+
+def _log(evento):
+    logger.info(json.dumps(evento, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def etiquetas(**valores):
+    """Agrega ``valores`` como etiquetas de todas las etapas dentro del bloque."""
+    previas = dict(_etiquetas)
+    _etiquetas.update({k: str(v) for k, v in valores.items()})
+    try:
+        yield
+    finally:
+        _etiquetas.clear()
+        _etiquetas.update(previas)
+
+
+@contextmanager
+def etapa(nombre, entrada=None):
+    """Mide el bloque como la etapa ``nombre``.
+
+    Devuelve un diccionario en el que el bloque anota ``filas_salida`` antes
+    de terminar.
+    """
+    registro = {'filas_entrada': _filas(entrada), 'filas_salida': None}
+    rss_inicio = rss_bytes()
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        segundos = time.perf_counter() - inicio
+        rss_fin = rss_bytes()
+        evento = {
+            'evento': 'etapa',
+            'etapa': nombre,
+            **_etiquetas,
+            'segundos': round(segundos, 4),
+            'filas_entrada': registro['filas_entrada'],
+            'filas_salida': registro['filas_salida'],
+            'rss_delta_bytes': rss_fin - rss_inicio if rss_inicio is not None and rss_fin is not None else None,
+            'rss_bytes': rss_fin,
+        }
+        with _lock:
+            _etapas[(nombre, tuple(sorted(_etiquetas.items())))] = evento
+        _log(evento)
+
+
+def registrar_callback(nombre, segundos, bytes_respuesta, estado=200):
+    """Suma una llamada de ``nombre`` al histograma de latencia y al total de bytes."""
+    with _lock:
+        datos = _callbacks.setdefault(nombre, {
+            'buckets': [0] * len(BUCKETS_LATENCIA), 'suma': 0.0, 'cuenta': 0, 'bytes': 0, 'errores': 0,
+        })
+        for i, limite in enumerate(BUCKETS_LATENCIA):
+            if segundos <= limite:
+                datos['buckets'][i] += 1
+        datos['suma'] += segundos
+        datos['cuenta'] += 1
+        datos['bytes'] += bytes_respuesta
+        if estado >= 400:
+            datos['errores'] += 1
+    _log({
+        'evento': 'callback',
+        'callback': nombre,
+        'segundos': round(segundos, 4),
+        'bytes': bytes_respuesta,
+        'estado': estado,
+    })
+
+
+def instrumentar_servidor(server, ruta='/_dash-update-component'):
+    """Mide cada petición de callback de Dash en el servidor Flask ``server``."""
+    from flask import g, request
+
+    @server.before_request
+    def _inicio_callback():
+        if request.path.endswith(ruta):
+            g.inicio_callback = time.perf_counter()
+
+    @server.after_request
+    def _fin_callback(respuesta):
+        inicio = g.pop('inicio_callback', None)
+        if inicio is not None:
+            cuerpo = request.get_json(silent=True) or {}
+            # La salida identifica al callback (ej. 'mapa-departamentos.figure')
+            nombre = cuerpo.get('output', 'desconocido')
+            bytes_respuesta = respuesta.calculate_content_length()
+            if bytes_respuesta is None and not respuesta.direct_passthrough:
+                bytes_respuesta = len(respuesta.get_data())
+            registrar_callback(nombre, time.perf_counter() - inicio, bytes_respuesta or 0, respuesta.status_code)
+        return respuesta
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas_prometheus(pares):
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}' if pares else ''
+
+
+def exportar_prometheus(extra=None):
+    """Todas las métricas en formato de texto de Prometheus (versión 0.0.4).
+
+    ``extra`` es un diccionario ``nombre -> valor`` de indicadores adicionales
+    (ej. los contadores de la caché de figuras).
+    """
+    lineas = []
+    with _lock:
+        etapas = list(_etapas.items())
+        callbacks = {k: dict(v, buckets=list(v['buckets'])) for k, v in _callbacks.items()}
+
+    campos_etapa = [
+        ('mortalidad_etapa_segundos', 'segundos', 'Duración de la última ejecución de la etapa.'),
+        ('mortalidad_etapa_filas_entrada', 'filas_entrada', 'Filas de entrada de la etapa.'),
+        ('mortalidad_etapa_filas_salida', 'filas_salida', 'Filas de salida de la etapa.'),
+        ('mortalidad_etapa_rss_delta_bytes', 'rss_delta_bytes', 'Variación de la memoria residente durante la etapa.'),
+    ]
+    for metrica, campo, ayuda in campos_etapa:
+        lineas.append(f"# HELP {metrica} {ayuda}")
+        lineas.append(f"# TYPE {metrica} gauge")
+        for (nombre, extras), evento in etapas:
+            if evento[campo] is not None:
+                lineas.append(f"{metrica}{_etiquetas_prometheus((('etapa', nombre),) + extras)} {evento[campo]}")
+
+    lineas.append("# HELP mortalidad_callback_segundos Latencia de los callbacks de Dash.")
+    lineas.append("# TYPE mortalidad_callback_segundos histogram")
+    for nombre, datos in sorted(callbacks.items()):
+        for limite, cuenta in zip(BUCKETS_LATENCIA, datos['buckets']):
+            lineas.append(
+                f"mortalidad_callback_segundos_bucket{_etiquetas_prometheus([('callback', nombre), ('le', limite)])} {cuenta}"
+            )
+        etiqueta = _etiquetas_prometheus([('callback', nombre)])
+        lineas.append(
+            f"mortalidad_callback_segundos_bucket{_etiquetas_prometheus([('callback', nombre), ('le', '+Inf')])} {datos['cuenta']}"
+        )
+        lineas.append(f"mortalidad_callback_segundos_sum{etiqueta} {datos['suma']:.6f}")
+        lineas.append(f"mortalidad_callback_segundos_count{etiqueta} {datos['cuenta']}")
+    lineas.append("# HELP mortalidad_callback_bytes_total Bytes enviados en las respuestas de los callbacks.")
+    lineas.append("# TYPE mortalidad_callback_bytes_total counter")
+    for nombre, datos in sorted(callbacks.items()):
+        lineas.append(f"mortalidad_callback_bytes_total{_etiquetas_prometheus([('callback', nombre)])} {datos['bytes']}")
+    lineas.append("# HELP mortalidad_callback_errores_total Respuestas de callbacks con estado >= 400.")
+    lineas.append("# TYPE mortalidad_callback_errores_total counter")
+    for nombre, datos in sorted(callbacks.items()):
+        lineas.append(f"mortalidad_callback_errores_total{_etiquetas_prometheus([('callback', nombre)])} {datos['errores']}")
+
+    rss = rss_bytes()
+    if rss is not None:
+        lineas.append("# HELP mortalidad_proceso_rss_bytes Memoria residente del proceso.")
+        lineas.append("# TYPE mortalidad_proceso_rss_bytes gauge")
+        lineas.append(f"mortalidad_proceso_rss_bytes {rss}")
+
+    for nombre, valor in (extra or {}).items():
+        lineas.append(f"# TYPE {nombre} gauge")
+        lineas.append(f"{nombre} {valor}")
+    return '\n'.join(lineas) + '\n'
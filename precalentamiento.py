@@ -0,0 +1,83 @@
+"""Precálculo de las figuras más consultadas al arrancar cada worker.
+
+Sin esto, el primer usuario después de un despliegue paga todas las
+agregaciones y la construcción de las figuras de los callbacks (el mapa es
+el más lento). ``Precalentamiento`` recorre, en un hilo en segundo plano,
+una lista de estados de filtros en orden de prioridad (la vista por defecto
+primero) y llama cada callback memoizado con cada uno, de modo que sus
+respuestas quedan en la caché de figuras.
+
+El hilo no bloquea al servidor: las peticiones se atienden desde el
+arranque. ``estado()`` resume el avance para el endpoint de disponibilidad
+(``/listo`` en app.py), que responde 503 hasta que termina; así el balanceador
+solo envía tráfico a workers con la caché caliente.
+"""
+import threading
+import time
+import traceback
+
+import metricas
+
+
+class Precalentamiento:
+    """Llama cada uno de ``callbacks`` con cada estado de ``vistas`` en un hilo aparte."""
+
+    def __init__(self, callbacks, vistas):
+        self.callbacks = list(callbacks)
+        self.vistas = list(vistas)
+        self.total = len(self.callbacks) * len(self.vistas)
+        self.completadas = 0
+        self.errores = 0
+        self._estado = 'pendiente'
+        self._inicio = None
+        self._fin = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        """Arranca el hilo (una sola vez por proceso) y devuelve de inmediato."""
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._estado = 'en_curso'
+            self._inicio = time.perf_counter()
+            self._hilo = threading.Thread(target=self._ejecutar, name='precalentamiento', daemon=True)
+        self._hilo.start()
+
+    def _ejecutar(self):
+        with metricas.etapa('precalentamiento') as registro:
+            for filtros in self.vistas:
+                for callback in self.callbacks:
+                    try:
+                        callback(filtros)
+                    except Exception:
+                        # Una figura que falla no deja al worker fuera de servicio
+                        with self._lock:
+                            self.errores += 1
+                        print(f"¡Advertencia! Falló el precálculo de {callback.__name__} con {filtros}:")
+                        traceback.print_exc()
+                    with self._lock:
+                        self.completadas += 1
+            registro['filas_salida'] = self.completadas
+        with self._lock:
+            self._estado = 'listo'
+            self._fin = time.perf_counter()
+        print(f"Precálculo terminado: {self.completadas} figuras ({self.errores} con error) "
+              f"en {self._fin - self._inicio:.1f} s.")
+
+    def listo(self):
+        with self._lock:
+            return self._estado == 'listo'
+
+    def estado(self):
+        """Avance del precálculo como diccionario (para responder en JSON)."""
+        with self._lock:
+            fin = self._fin if self._fin is not None else time.perf_counter()
+            return {
+                'estado': self._estado,
+                'completadas': self.completadas,
+                'total': self.total,
+                'errores': self.errores,
+                'vistas': len(self.vistas),
+                'segundos': round(fin - self._inicio, 2) if self._inicio is not None else 0.0,
+            }
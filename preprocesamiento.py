@@ -0,0 +1,881 @@
+"""Preprocesamiento de los datos de mortalidad y caché columnar particionada por año.
+
+Cada año de mortalidad (``data/datos_mortalidad_<AÑO>.xlsx``; el archivo
+original ``data/datos_mortalidad.xlsx`` corresponde a 2019) se procesa por
+separado y se guarda en su propia partición ``data/cache/anio=<AÑO>/``. Las
+proyecciones de población se parsean una sola vez y quedan en
+``data/cache/poblacion/anio=<AÑO>/``: un arreglo por área indexado por el
+código DANE del municipio como entero.
+
+Cada tabla se guarda en el formato columnar de columnar.py (un .npy por
+columna) y se abre con memory-map: ``cargar_anio(anio)`` no deserializa
+nada y solo mapea las tablas pedidas. Cada partición se reconstruye desde
+Excel únicamente cuando cambia alguno de sus archivos fuente.
+``python preprocesamiento.py`` reconstruye todas las particiones.
+
+Las tablas de una partición viven en un subdirectorio de versión
+(``anio=<AÑO>/v000001/``) y ``manifiesto.json`` apunta a la vigente;
+ingesta.py publica versiones nuevas con los lotes que llegan sin tocar las
+anteriores, y los procesos en ejecución las detectan con
+``version_particion``.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from columnar import abrir_tabla, concatenar, guardar_tabla, tabla_existe
+from cubo import agregar, construir_cubo
+from dimensiones import DIM_CAUSA, DIM_MUNICIPIO, Dimensiones, construir_dimensiones
+from metricas import etapa, etiquetas
+
+# --- Rutas de los archivos fuente ---
+DIR_DATOS = 'data'
+PATH_MUERTES = 'data/datos_mortalidad.xlsx' # Archivo original, sin año en el nombre
+ANIO_MUERTES_ORIGINAL = 2019
+PATRON_MUERTES = re.compile(r'^datos_mortalidad_(\d{4})\.xlsx$') # Un archivo por año
+PATH_CODIGOS = 'data/codigos_causas.xlsx'
+PATH_DIVIPOLA = 'data/divipola.xlsx'
+PATH_POBLACION = 'data/proyecciones_poblacion_municipal.xlsx'
+
+# --- Caché columnar ---
+DIR_CACHE = 'data/cache'
+DIR_CACHE_POBLACION = os.path.join(DIR_CACHE, 'poblacion')
+TABLAS_CACHE = ['df_final', 'cubo', 'df_tbm_completo', DIM_MUNICIPIO, DIM_CAUSA]
+# Incrementar cuando cambie la lógica de limpieza para invalidar cachés viejas
+VERSION_CACHE = 11
+
+# --- Lectura de los libros ---
+# openpyxl es CPU y retiene el GIL: sin caché, los libros se parsean en procesos
+# separados (LECTURA_PARALELA=0 lo desactiva). Cada hoja se lee en modo
+# read_only y se convierte a DataFrame por bloques de filas.
+LECTURA_PARALELA = os.environ.get('LECTURA_PARALELA', '1') != '0'
+FILAS_POR_BLOQUE = 50000
+# Columnas que se conservan de cada libro (los demás, todas)
+COLUMNAS_LIBROS = {'poblacion': ['MPIO', 'AÑO', 'AREA', 'TOTAL']}
+
+# Ejemplo de nombres de columnas en el archivo de mortalidad
+COL_DPTO_MUERTES = 'COD_DEPARTAMENTO' # Código del departamento
+COL_MPIO_MUERTES = 'COD_MUNICIPIO' # Código del municipio
+COL_CAUSA_MUERTES = 'COD_MUERTE' # Código CIE-10
+
+# Ejemplo de nombres de columnas en el archivo DIVIPOLA
+COL_DPTO_DIVIPOLA = 'COD_DEPARTAMENTO'
+COL_MPIO_DIVIPOLA = 'COD_MUNICIPIO'
+COL_NOMBRE_DPTO = 'DEPARTAMENTO'
+COL_NOMBRE_MPIO = 'MUNICIPIO'
+
+# Ejemplo de nombres de columnas en el archivo de Códigos
+COL_CODIGO_CAUSA = 'Codigo' # CIE-10
+COL_NOMBRE_CAUSA = 'Nombre Causa'
+COL_CAPITULO = 'Capítulo' # Capítulo CIE-10 (1 a 22)
+COL_NOMBRE_CAPITULO = 'Nombre capítulo'
+COL_NOMBRE_TRES = 'Descripción  de códigos mortalidad a tres caracteres' # Nombre de la categoría (ej. X95)
+
+
+# --- MAPEO DE GRUPOS DE EDAD DANE A CATEGORÍA ---
+# 1. Lista actualizada para forzar el orden cronológico de las categorías
+ORDEN_GRUPOS_EDAD_FINAL = [
+    'Mortalidad neonatal (<1 mes)',
+    'Mortalidad infantil (1 a 11 meses)',
+    'Primera infancia (1 a 4 años)',
+    'Niñez (5 a 14 años)',
+    'Adolescencia (15 a 19 años)',
+    'Juventud (20 a 29 años)',
+    'Adultez temprana (30 a 44 años)',
+    'Adultez intermedia (45 a 59 años)',
+    'Vejez (60 a 84 años)',
+    'Longevidad / Centenarios (85+)',
+    'Edad desconocida'
+]
+# Categorías para códigos fuera de la tabla DANE; van al final del orden
+GRUPO_EDAD_NO_VALIDO = 'Código no válido'
+GRUPO_EDAD_FALTANTE = 'Dato faltante o incorrecto'
+CATEGORIAS_GRUPO_EDAD = ORDEN_GRUPOS_EDAD_FINAL + [GRUPO_EDAD_NO_VALIDO, GRUPO_EDAD_FALTANTE]
+
+# Límite superior (exclusivo) de cada grupo sobre el código GRUPO_EDAD1 (0 a 29)
+LIMITES_GRUPO_EDAD = [5, 7, 9, 11, 12, 14, 17, 20, 25, 29, 30]
+
+# Tabla de búsqueda: posición = código GRUPO_EDAD1, valor = índice de la categoría
+TABLA_GRUPO_EDAD = np.searchsorted(LIMITES_GRUPO_EDAD, np.arange(LIMITES_GRUPO_EDAD[-1]), side='right')
+
+
+def categorizar_grupo_edad(serie):
+    """Convierte la columna GRUPO_EDAD1 en un Categorical ordenado con las categorías descriptivas.
+
+    Los códigos se resuelven indexando ``TABLA_GRUPO_EDAD``; los que están
+    fuera del rango 0-29 quedan como 'Código no válido' y los no numéricos o
+    vacíos como 'Dato faltante o incorrecto'.
+    """
+    numeros = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
+    faltante = np.isnan(numeros)
+    # Truncar como int() para que 3.0 o '3' caigan en el mismo grupo
+    enteros = np.trunc(np.where(faltante, -1, numeros))
+    valido = (enteros >= 0) & (enteros < len(TABLA_GRUPO_EDAD))
+
+    codigos = np.full(len(numeros), CATEGORIAS_GRUPO_EDAD.index(GRUPO_EDAD_NO_VALIDO), dtype=np.int8)
+    codigos[valido] = TABLA_GRUPO_EDAD[enteros[valido].astype(np.int64)]
+    codigos[faltante] = CATEGORIAS_GRUPO_EDAD.index(GRUPO_EDAD_FALTANTE)
+
+    return pd.Categorical.from_codes(codigos, categories=CATEGORIAS_GRUPO_EDAD, ordered=True)
+
+
+# --- Esquema compacto de df_final ---
+# Solo las llaves y las columnas que usa el dashboard. Las llaves DANE y CIE-10
+# y el texto de baja cardinalidad se guardan como categorías (códigos
+# int8/int16 + tabla de valores), el mes como int8. Los nombres van en las
+# tablas de dimensiones (dimensiones.py).
+ESQUEMA_DF_FINAL = {
+    'COD_DANE_COMPLETO': 'category',
+    'CAUSA_CODIGO': 'category',
+    'SEXO': 'category',
+    'GRUPO_EDAD_CAT': pd.CategoricalDtype(CATEGORIAS_GRUPO_EDAD, ordered=True),
+    'MES': 'int8',
+}
+
+
+def _megabytes(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def aplicar_esquema(df_final):
+    """Reduce ``df_final`` a las columnas de ``ESQUEMA_DF_FINAL`` con tipos compactos."""
+    antes = _megabytes(df_final)
+    df_final = df_final[list(ESQUEMA_DF_FINAL)].astype(ESQUEMA_DF_FINAL)
+    print(f"Memoria de df_final: {antes:.1f} MB -> {_megabytes(df_final):.1f} MB (memory_usage deep=True)")
+    return df_final
+
+
+def fuentes_muertes():
+    """Archivo de mortalidad de cada año encontrado en ``DIR_DATOS``."""
+    fuentes = {}
+    if os.path.exists(PATH_MUERTES):
+        fuentes[ANIO_MUERTES_ORIGINAL] = PATH_MUERTES
+    for nombre in sorted(os.listdir(DIR_DATOS)):
+        coincidencia = PATRON_MUERTES.match(nombre)
+        if coincidencia:
+            fuentes[int(coincidencia.group(1))] = os.path.join(DIR_DATOS, nombre)
+    return fuentes
+
+
+def _dir_anio(anio):
+    return os.path.join(DIR_CACHE, f"anio={anio}")
+
+
+def anios_disponibles():
+    """Años con archivo fuente o con partición ya construida en la caché."""
+    anios = set(fuentes_muertes())
+    if os.path.isdir(DIR_CACHE):
+        for nombre in os.listdir(DIR_CACHE):
+            if nombre.startswith('anio=') and os.path.exists(os.path.join(DIR_CACHE, nombre, 'manifiesto.json')):
+                anios.add(int(nombre[len('anio='):]))
+    return sorted(anios)
+
+
+# --- Lectura de los libros ---
+def _inferir_tipos(df):
+    """Tipos por columna como los infiere ``pd.read_excel``: numéricas si todo valor lo es."""
+    for col in df.columns:
+        valores = df[col]
+        numeros = pd.to_numeric(valores, errors='coerce')
+        if numeros.notna().sum() == valores.notna().sum():
+            df[col] = numeros
+        else:
+            df[col] = valores.infer_objects()
+    return df
+
+
+def leer_excel(path, filas_por_bloque=FILAS_POR_BLOQUE, columnas=None):
+    """Primera hoja de ``path`` como DataFrame, leída fila a fila en modo read_only.
+
+    Equivale a ``pd.read_excel(path)`` (encabezado en la primera fila, filas
+    vacías descartadas, columnas de texto numérico convertidas a número) sin
+    materializar todas las filas como listas de Python: se acumulan en
+    bloques de ``filas_por_bloque`` y los tipos se infieren una sola vez al
+    final, sobre cada columna completa. ``columnas`` (nombres del encabezado)
+    limita las que se conservan, como ``usecols``.
+    """
+    from openpyxl import load_workbook
+
+    libro = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = list(next(filas, ()))
+        nombres = [
+            f"Unnamed: {i}" if nombre is None else nombre for i, nombre in enumerate(encabezado)
+        ]
+        if columnas is not None:
+            faltantes = [col for col in columnas if col not in nombres]
+            if faltantes:
+                raise ValueError(f"Columnas {faltantes} no están en '{path}'.")
+            posiciones = [nombres.index(col) for col in columnas]
+        else:
+            posiciones = None
+        bloques = []
+        bloque = []
+        for fila in filas:
+            if all(valor is None for valor in fila):
+                continue
+            fila = fila[:len(nombres)]
+            bloque.append(fila if posiciones is None else [fila[i] if i < len(fila) else None for i in posiciones])
+            if len(bloque) >= filas_por_bloque:
+                bloques.append(pd.DataFrame(bloque, columns=columnas or nombres, dtype=object))
+                bloque = []
+        if bloque or not bloques:
+            bloques.append(pd.DataFrame(bloque, columns=columnas or nombres, dtype=object))
+    finally:
+        libro.close()
+    df = pd.concat(bloques, ignore_index=True) if len(bloques) > 1 else bloques[0]
+
+    # Como pandas, descartar las columnas finales sin encabezado ni datos
+    while (columnas is None and len(df.columns) and encabezado[len(df.columns) - 1] is None
+           and df.iloc[:, -1].isna().all()):
+        df = df.iloc[:, :-1]
+    return _inferir_tipos(df)
+
+
+def _leer_libro(nombre, path):
+    with etapa(f"leer_{nombre}") as registro:
+        df = leer_excel(path, columnas=COLUMNAS_LIBROS.get(nombre))
+        registro['filas_salida'] = len(df)
+    return df
+
+
+def procesos_lectura(tareas):
+    """Número de procesos para ``tareas`` lecturas simultáneas (1 = leer en serie)."""
+    if not LECTURA_PARALELA:
+        return 1
+    return max(1, min(tareas, os.cpu_count() or 1))
+
+
+def leer_libros(paths):
+    """Lee ``{nombre: path}`` a la vez en un pool de procesos y devuelve ``{nombre: DataFrame}``.
+
+    El tiempo total queda cerca del libro más lento en lugar de la suma. Si
+    no hay más de un núcleo o el pool no se puede crear, se lee en serie.
+    """
+    procesos = procesos_lectura(len(paths))
+    if procesos > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                futuros = {nombre: pool.submit(_leer_libro, nombre, path) for nombre, path in paths.items()}
+                return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+        except (BrokenProcessPool, PermissionError) as e:
+            print(f"¡Advertencia! No se pudo leer en paralelo ({e}). Se lee en serie.")
+    return {nombre: _leer_libro(nombre, path) for nombre, path in paths.items()}
+
+
+# --- Etapas del preprocesamiento ---
+def limpiar_muertes(df_muertes):
+    """Fechas válidas, códigos DANE de 2, 3 y 5 dígitos y código CIE-10 como texto."""
+    # # ** Importante: Fusión y limpieza de datos aquí **
+    with etapa('fechas', df_muertes) as registro:
+        df_muertes['FECHA_DEFUNCION'] = pd.to_datetime(df_muertes['FECHA_DEFUNCION'], errors='coerce')
+        df_muertes.dropna(subset=['FECHA_DEFUNCION'], inplace=True) # Elimina filas sin fecha
+        registro['filas_salida'] = len(df_muertes)
+
+    # 🔑 Estandarizar el código DANE completo (5 dígitos)
+    # Crear el código DANE completo de 5 dígitos (e.g., 05 + 001 = 05001)
+    with etapa('codigos_dane', df_muertes) as registro:
+        df_muertes['COD_DANE_DPTO'] = df_muertes[COL_DPTO_MUERTES].astype(str).str.zfill(2)
+        df_muertes['COD_DANE_MPIO'] = df_muertes[COL_MPIO_MUERTES].astype(str).str.zfill(3)
+        df_muertes['COD_DANE_COMPLETO'] = df_muertes['COD_DANE_DPTO'] + df_muertes['COD_DANE_MPIO']
+
+        # Asegurar que el código CIE-10 sea String
+        df_muertes[COL_CAUSA_MUERTES] = df_muertes[COL_CAUSA_MUERTES].astype(str).str.strip()
+        registro['filas_salida'] = len(df_muertes)
+
+    print("df_muertes listo.")
+    return df_muertes
+
+
+def preparar_divipola(df_divipola):
+    # 🔑 Crear el código DANE completo de 5 dígitos
+    df_divipola['COD_DANE_DPTO'] = df_divipola[COL_DPTO_DIVIPOLA].astype(str).str.zfill(2)
+    df_divipola['COD_DANE_MPIO'] = df_divipola[COL_MPIO_DIVIPOLA].astype(str).str.zfill(3)
+    df_divipola['COD_DANE_COMPLETO'] = df_divipola['COD_DANE_DPTO'] + df_divipola['COD_DANE_MPIO']
+
+    # Seleccionar solo las columnas necesarias para evitar duplicados en la fusión
+    df_divipola = df_divipola[[
+        'COD_DANE_COMPLETO',
+        COL_NOMBRE_DPTO,
+        COL_NOMBRE_MPIO
+    ]].drop_duplicates()
+
+    print("df_divipola listo.")
+    return df_divipola
+
+
+def preparar_codigos(df_codigos):
+    df_codigos[COL_CODIGO_CAUSA] = df_codigos[COL_CODIGO_CAUSA].astype(str).str.strip()
+
+    # Renombrar para claridad después de la fusión
+    df_codigos = df_codigos.rename(columns={
+        COL_CODIGO_CAUSA: COL_CAUSA_MUERTES,
+        COL_NOMBRE_CAUSA: 'NOMBRE_CAUSA_CIE10',
+        COL_CAPITULO: 'CAPITULO',
+        COL_NOMBRE_CAPITULO: 'CAPITULO_NOMBRE',
+        COL_NOMBRE_TRES: 'CAUSA_3_NOMBRE',
+    })
+
+    print("df_codigos listo.")
+    return df_codigos
+
+
+def preparar_dimensiones(df_divipola, df_codigos):
+    """Tablas de dimensiones (municipio y causa) a partir de DIVIPOLA y los códigos CIE-10 preparados."""
+    df_municipios = df_divipola.rename(columns={COL_NOMBRE_DPTO: 'DEPARTAMENTO', COL_NOMBRE_MPIO: 'MUNICIPIO'})
+    df_causas = df_codigos.rename(columns={COL_CAUSA_MUERTES: 'CAUSA_CODIGO', 'NOMBRE_CAUSA_CIE10': 'CAUSA_NOMBRE'})
+    return construir_dimensiones(df_municipios, df_causas)
+
+
+def fusionar(df_muertes, dimensiones):
+    """Deja las muertes con sus llaves (código DANE y CIE-10) y las columnas para Dash.
+
+    Los nombres de DIVIPOLA y de los códigos CIE-10 no se copian a cada
+    registro: quedan en ``dimensiones`` y se resuelven al graficar. Aquí solo
+    se buscan las llaves en sus índices para reportar las que no tienen nombre.
+    """
+    with etapa('llaves', df_muertes) as registro:
+        sin_municipio = dimensiones.faltantes(DIM_MUNICIPIO, df_muertes['COD_DANE_COMPLETO'])
+        sin_causa = dimensiones.faltantes(DIM_CAUSA, df_muertes[COL_CAUSA_MUERTES])
+        registro['filas_salida'] = len(df_muertes)
+    if sin_municipio or sin_causa:
+        print(f"¡Advertencia! {sin_municipio} registros sin municipio en DIVIPOLA y "
+              f"{sin_causa} sin causa en los códigos CIE-10 (se conservan, sin nombre).")
+
+    # --- Limpieza Final de Columnas para Dash ---
+    # Crear el mes como una columna numérica para el gráfico de líneas
+    df_muertes['MES'] = df_muertes['FECHA_DEFUNCION'].dt.month
+
+    # Renombrar columnas clave para que coincidan con la lógica del Dash:
+    df_final = df_muertes.rename(columns={
+        COL_CAUSA_MUERTES: 'CAUSA_CODIGO',
+        'SEXO': 'SEXO', # Asegúrate que esta columna existe en tu archivo de muertes
+        'GRUPO_EDAD1': 'GRUPO_EDAD1' # Asegúrate que esta columna existe
+    })
+
+    # ¡DataFrame final listo para ser usado por Plotly y Dash!
+    print("\n✅ Fusión completa. DataFrame final (df_final) creado.")
+    print(f"Número de registros en el DataFrame final: {len(df_final)}")
+    print(df_final[['COD_DANE_COMPLETO', 'CAUSA_CODIGO', 'MES']].head())
+    return df_final
+
+
+def preparar_poblacion(df_poblacion_raw):
+    """Población por año, código DANE del municipio (entero) y área, en formato largo.
+
+    El código se convierte a número una sola vez (5001.0, '5001' y '05001'
+    son 5001), sin limpiar texto; las áreas van con el nombre de columna de
+    ``AREAS_POBLACION`` y se conservan todas.
+    """
+    print("Iniciando preparación del DataFrame de Población...")
+    with etapa('preparar_poblacion', df_poblacion_raw) as registro:
+        df_poblacion = pd.DataFrame({
+            'ANIO': pd.to_numeric(df_poblacion_raw['AÑO'], errors='coerce'),
+            'CODIGO': pd.to_numeric(df_poblacion_raw['MPIO'], errors='coerce'),
+            'AREA': df_poblacion_raw['AREA'].map(AREAS_POBLACION),
+            'POBLACION': pd.to_numeric(df_poblacion_raw['TOTAL'], errors='coerce'),
+        }).dropna()
+        df_poblacion = df_poblacion[(df_poblacion['CODIGO'] >= 0) & (df_poblacion['CODIGO'] < MAX_CODIGO_DANE)]
+        df_poblacion = df_poblacion.astype({'ANIO': 'int16', 'CODIGO': 'int32', 'POBLACION': 'float64'})
+        registro['filas_salida'] = len(df_poblacion)
+    return df_poblacion
+
+
+def tablas_poblacion(df_poblacion):
+    """Una tabla por año con una fila por código DANE (0 a MAX_CODIGO_DANE - 1) y una columna por área.
+
+    La población total de 05001 en 2020 es ``tablas['anio=2020']['TOTAL'][5001]``
+    (NaN si el código no existe); se llenan todas con una sola asignación.
+    """
+    anios, posicion = np.unique(df_poblacion['ANIO'].to_numpy(), return_inverse=True)
+    areas = list(AREAS_POBLACION.values())
+    arreglo = np.full((len(anios), len(areas), MAX_CODIGO_DANE), np.nan)
+    arreglo[posicion, pd.Index(areas).get_indexer(df_poblacion['AREA']), df_poblacion['CODIGO'].to_numpy()] = (
+        df_poblacion['POBLACION'].to_numpy()
+    )
+    return {
+        f"anio={anio}": pd.DataFrame(dict(zip(areas, arreglo[i])), copy=False) for i, anio in enumerate(anios)
+    }
+
+
+def calcular_tbm(cubo, df_poblacion, dimensiones):
+    """Tasa Bruta de Mortalidad por municipio, con el nombre del municipio."""
+    # 1. Contar el total de muertes por municipio (usando el código DANE completo)
+    df_muertes_muni = agregar(cubo, ['COD_DANE_COMPLETO'])
+    df_muertes_muni['COD_DANE_COMPLETO'] = df_muertes_muni['COD_DANE_COMPLETO'].astype(str)
+
+    # 2. Fusionar el conteo de muertes con la población (df_poblacion)
+    df_tbm = pd.merge(
+        df_muertes_muni,
+        df_poblacion[['COD_DANE_COMPLETO', 'POBLACION']],
+        on='COD_DANE_COMPLETO',
+        how='inner' # Asegura que solo se incluyan municipios con datos de población
+    )
+
+    # 3. Calcular la Tasa Bruta de Mortalidad (TBM)
+    # TBM = (Total de Muertes / Población) * 100,000
+    df_tbm['TASA_MORTALIDAD'] = (df_tbm['Total Muertes'] / df_tbm['POBLACION']) * 100000
+
+    # 4. Nombre del municipio desde la tabla de dimensiones (una búsqueda por municipio)
+    df_tbm['MUNICIPIO'] = dimensiones.valores('MUNICIPIO', df_tbm['COD_DANE_COMPLETO']).astype(object)
+    return df_tbm
+
+
+def construir_anio(anio, path_muertes):
+    """Ejecuta la carga, fusión y limpieza completas de un año desde los archivos Excel.
+
+    Devuelve un diccionario con ``df_final``, el ``cubo`` de agregación,
+    ``df_tbm_completo`` (muertes del año sobre la población proyectada del mismo
+    año) y las tablas de dimensiones ``dim_municipio`` y ``dim_causa``.
+    """
+    with etiquetas(anio=anio):
+        return _construir_anio(anio, path_muertes)
+
+
+def _construir_anio(anio, path_muertes):
+    # 1. Cargar DataFrames (en paralelo; la población solo si no está en caché)
+    paths = {'muertes': path_muertes, 'codigos': PATH_CODIGOS, 'divipola': PATH_DIVIPOLA}
+    if not poblacion_vigente():
+        paths['poblacion'] = PATH_POBLACION
+    try:
+        with etapa('leer_libros') as registro:
+            libros = leer_libros(paths)
+            registro['filas_salida'] = sum(len(df) for df in libros.values())
+    except FileNotFoundError as e:
+        print(f"Error al cargar archivos: {e}")
+        sys.exit(1)
+    df_muertes = libros['muertes']
+    df_codigos = libros['codigos']
+    df_divipola = libros['divipola']
+    if 'poblacion' in libros:
+        construir_poblacion(libros.pop('poblacion'))
+
+    print(f"Datos de {anio} cargados exitosamente.")
+
+    df_muertes = limpiar_muertes(df_muertes)
+    tablas_dimensiones = preparar_dimensiones(preparar_divipola(df_divipola), preparar_codigos(df_codigos))
+    dimensiones = Dimensiones(tablas_dimensiones)
+    df_final = fusionar(df_muertes, dimensiones)
+
+    # Crea una nueva columna categórica con los nombres descriptivos
+    with etapa('grupo_edad', df_final) as registro:
+        df_final['GRUPO_EDAD_CAT'] = categorizar_grupo_edad(df_final['GRUPO_EDAD1'])
+        registro['filas_salida'] = len(df_final)
+
+    # Descartar columnas sin uso y compactar tipos antes de construir el cubo
+    with etapa('esquema', df_final) as registro:
+        df_final = aplicar_esquema(df_final)
+        registro['filas_salida'] = len(df_final)
+
+    # Cubo de agregación del que se alimentan todos los gráficos
+    with etapa('cubo', df_final) as registro:
+        cubo = construir_cubo(df_final)
+        registro['filas_salida'] = len(cubo)
+
+    df_poblacion = cargar_poblacion(anio)
+    with etapa('tbm', cubo) as registro:
+        df_tbm_completo = calcular_tbm(cubo, df_poblacion, dimensiones)
+        registro['filas_salida'] = len(df_tbm_completo)
+
+    return {
+        'df_final': df_final,
+        'cubo': cubo,
+        'df_tbm_completo': df_tbm_completo,
+        **tablas_dimensiones,
+    }
+
+
+# --- Caché en disco ---
+def _sha256(path):
+    """Hash del contenido de un archivo, leído en bloques de 1 MB."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _huella_fuentes(fuentes):
+    """Tamaño, mtime y hash de cada archivo fuente."""
+    huella = {}
+    for path in fuentes:
+        st = os.stat(path)
+        huella[path] = {
+            'tamano': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': _sha256(path),
+        }
+    return huella
+
+
+def _leer_manifiesto(directorio):
+    try:
+        with open(os.path.join(directorio, 'manifiesto.json'), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _escribir_json_atomico(path, contenido):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        json.dump(contenido, f, indent=2)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def bloqueo_particion(directorio):
+    """Bloqueo exclusivo entre procesos para modificar el manifiesto de ``directorio``.
+
+    Usa ``fcntl.flock`` sobre un archivo ``.bloqueo``; donde no existe
+    (Windows) no bloquea.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, '.bloqueo'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _dir_version(directorio, manifiesto):
+    """Subdirectorio con las tablas de la versión a la que apunta ``manifiesto``."""
+    return os.path.join(directorio, manifiesto['datos'])
+
+
+def cache_vigente(directorio, archivos):
+    """Indica si la partición en ``directorio`` corresponde a las fuentes actuales.
+
+    Primero compara tamaño y mtime (una llamada a ``stat`` por archivo); solo si
+    difieren recalcula el hash, de modo que un ``git checkout`` que toca los
+    mtimes sin cambiar el contenido no obliga a reconstruir. Una fuente que ya
+    no existe no invalida la partición: así se puede desplegar solo la caché.
+    """
+    manifiesto = _leer_manifiesto(directorio)
+    if not manifiesto or manifiesto.get('version') != VERSION_CACHE:
+        return False
+    actualizado = False
+    for path, registro in manifiesto['fuentes'].items():
+        if not os.path.exists(path):
+            continue
+        st = os.stat(path)
+        if st.st_size == registro['tamano'] and st.st_mtime_ns == registro['mtime_ns']:
+            continue
+        if _sha256(path) != registro['sha256']:
+            return False
+        registro['mtime_ns'] = st.st_mtime_ns
+        actualizado = True
+    if actualizado:
+        # Mismo contenido con otro mtime: refrescar para no volver a hashear,
+        # salvo que entretanto se haya publicado otra versión (ingesta.py)
+        with bloqueo_particion(directorio):
+            if (_leer_manifiesto(directorio) or {}).get('datos') == manifiesto['datos']:
+                _escribir_json_atomico(os.path.join(directorio, 'manifiesto.json'), manifiesto)
+    base = _dir_version(directorio, manifiesto)
+    return all(os.path.exists(os.path.join(base, archivo)) for archivo in archivos)
+
+
+def _enlazar_tabla(origen, destino):
+    """Pasa una tabla sin cambios a otra versión con enlaces duros (copia si no se puede)."""
+    os.makedirs(destino, exist_ok=True)
+    for nombre in os.listdir(origen):
+        try:
+            os.link(os.path.join(origen, nombre), os.path.join(destino, nombre))
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(os.path.join(origen, nombre), os.path.join(destino, nombre))
+
+
+def _podar_versiones(directorio, conservar):
+    """Borra los subdirectorios de versiones que ya no están en ``conservar``."""
+    for nombre in os.listdir(directorio):
+        path = os.path.join(directorio, nombre)
+        if os.path.isdir(path) and nombre not in conservar:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def guardar_particion(directorio, tablas, fuentes, reutilizar=(), huellas=None, **extra):
+    """Escribe una versión nueva de la partición y la publica reemplazando el manifiesto.
+
+    Las tablas van a un subdirectorio ``vNNNNNN`` nuevo; las de ``reutilizar``
+    pasan sin cambios desde la versión vigente (enlaces duros, sin copiar
+    datos). El manifiesto se reemplaza de último con ``os.replace`` y es el
+    puntero a la versión: un proceso que lo lee ve la versión anterior o la
+    nueva completa, nunca una a medias. Se conserva la versión anterior para
+    los procesos que la estén abriendo en ese momento.
+
+    ``huellas`` reemplaza a las de ``fuentes`` (ej. la ingesta conserva las
+    del libro con que se construyó la partición). ``extra`` son campos
+    adicionales del manifiesto (``segmentos``, ``lotes``).
+    """
+    os.makedirs(directorio, exist_ok=True)
+    previo = _leer_manifiesto(directorio)
+    if previo is None or previo.get('version') != VERSION_CACHE:
+        previo = None
+    secuencia = previo['secuencia'] + 1 if previo else 1
+    datos = f"v{secuencia:06d}"
+    destino = os.path.join(directorio, datos)
+    shutil.rmtree(destino, ignore_errors=True) # Restos de un intento que no llegó a publicarse
+    for nombre in reutilizar:
+        _enlazar_tabla(os.path.join(_dir_version(directorio, previo), nombre), os.path.join(destino, nombre))
+    for nombre, df in tablas.items():
+        guardar_tabla(df, os.path.join(destino, nombre))
+    # El manifiesto se escribe de último: si el proceso muere antes, sigue vigente la versión anterior
+    _escribir_json_atomico(os.path.join(directorio, 'manifiesto.json'), {
+        'version': VERSION_CACHE,
+        'fuentes': huellas if huellas is not None else _huella_fuentes(fuentes),
+        'secuencia': secuencia,
+        'datos': datos,
+        **extra,
+    })
+    _podar_versiones(directorio, {datos, previo['datos'] if previo else datos})
+
+
+def leer_particion(anio, tablas=TABLAS_CACHE, con_version=False):
+    """Tablas de la partición de ``anio`` mapeadas en memoria (sin copia).
+
+    Una tabla con varios segmentos (``df_final`` tras ingerir lotes) se une
+    en una sola; es la única que se copia. Con ``con_version`` devuelve
+    también la versión del manifiesto que se leyó.
+    """
+    directorio = _dir_anio(anio)
+    manifiesto = _leer_manifiesto(directorio)
+    if manifiesto is None:
+        raise FileNotFoundError(f"No hay manifiesto en '{directorio}'.")
+    base = _dir_version(directorio, manifiesto)
+    segmentos = manifiesto.get('segmentos', {})
+    datos = {}
+    for nombre in tablas:
+        partes = [abrir_tabla(os.path.join(base, s)) for s in segmentos.get(nombre, [nombre])]
+        datos[nombre] = partes[0] if len(partes) == 1 else concatenar(partes)
+    return (datos, manifiesto['datos']) if con_version else datos
+
+
+def _estado_manifiesto(directorio):
+    """Inodo y mtime del manifiesto: cambian cada vez que se publica una versión."""
+    try:
+        st = os.stat(os.path.join(directorio, 'manifiesto.json'))
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+_memo_versiones = {} # directorio de la partición -> (estado del manifiesto, versión)
+_memo_version_datos = [None, None] # (estado de todos los manifiestos, versión)
+
+
+def version_particion(anio):
+    """Versión publicada de la partición de ``anio`` (ej. 'v000003'), o None si no hay.
+
+    Solo relee el manifiesto cuando cambia su inodo o su mtime, así que se
+    puede consultar en cada callback para detectar lotes nuevos.
+    """
+    return _version_directorio(_dir_anio(anio))
+
+
+def _version_directorio(directorio):
+    estado = _estado_manifiesto(directorio)
+    memo = _memo_versiones.get(directorio)
+    if memo is None or memo[0] != estado:
+        memo = (estado, (_leer_manifiesto(directorio) or {}).get('datos'))
+        _memo_versiones[directorio] = memo
+    return memo[1]
+
+
+# --- Población por año ---
+# Cada año es una tabla columnar indexada por el código DANE del municipio como
+# entero: una columna (un .npy) por área de la proyección
+AREAS_POBLACION = {
+    'Total': 'TOTAL',
+    'Cabecera Municipal': 'CABECERA',
+    'Centros Poblados y Rural Disperso': 'RURAL',
+}
+MAX_CODIGO_DANE = 100000 # Códigos de municipio de 5 dígitos
+
+
+def _path_poblacion(anio):
+    manifiesto = _leer_manifiesto(DIR_CACHE_POBLACION)
+    return os.path.join(_dir_version(DIR_CACHE_POBLACION, manifiesto), f"anio={anio}")
+
+
+def construir_poblacion(df_poblacion_raw=None):
+    """Parsea el libro de proyecciones una sola vez y escribe la tabla de cada año.
+
+    ``df_poblacion_raw`` es el libro ya leído (por ejemplo, en paralelo con los demás).
+    """
+    # Suponiendo que el archivo DANE se llama 'proyecciones_poblacion_municipal.xlsx'
+    if df_poblacion_raw is None:
+        df_poblacion_raw = _leer_libro('poblacion', PATH_POBLACION)
+    tablas = tablas_poblacion(preparar_poblacion(df_poblacion_raw))
+    guardar_particion(DIR_CACHE_POBLACION, tablas, [PATH_POBLACION])
+    print(f"Población por año lista: {', '.join(nombre[len('anio='):] for nombre in tablas)}.")
+
+
+def anios_poblacion():
+    manifiesto = _leer_manifiesto(DIR_CACHE_POBLACION)
+    if not manifiesto or 'datos' not in manifiesto:
+        return []
+    base = _dir_version(DIR_CACHE_POBLACION, manifiesto)
+    if not os.path.isdir(base):
+        return []
+    return sorted(
+        int(nombre[len('anio='):])
+        for nombre in os.listdir(base)
+        if nombre.startswith('anio=') and tabla_existe(os.path.join(base, nombre))
+    )
+
+
+def poblacion_vigente():
+    return cache_vigente(DIR_CACHE_POBLACION, []) and bool(anios_poblacion())
+
+
+@lru_cache(maxsize=8)
+def _anios_publicados(directorio, datos):
+    """Años de la versión ``datos`` de la población."""
+    base = os.path.join(directorio, datos)
+    return frozenset(
+        int(nombre[len('anio='):])
+        for nombre in os.listdir(base)
+        if nombre.startswith('anio=') and tabla_existe(os.path.join(base, nombre))
+    )
+
+
+@lru_cache(maxsize=64)
+def _arreglos_poblacion(directorio, datos, anio):
+    """Arreglos por área de ``anio`` (mapeados en memoria; se abren una vez por versión)."""
+    tabla = abrir_tabla(os.path.join(directorio, datos, f"anio={anio}"))
+    return {col: np.asarray(serie) for col, serie in tabla.items()}
+
+
+def tabla_poblacion(anio, verificar=True):
+    """Arreglos por área (ver ``tablas_poblacion``) del año de proyección de ``anio`` y el año usado.
+
+    Con ``verificar`` se reconstruye la población si el libro cambió; sin él
+    se usa la versión publicada (una llamada a ``stat`` del manifiesto).
+    """
+    datos = _version_directorio(DIR_CACHE_POBLACION)
+    if datos is None or (verificar and not poblacion_vigente()):
+        construir_poblacion()
+        datos = _version_directorio(DIR_CACHE_POBLACION)
+    anios = _anios_publicados(DIR_CACHE_POBLACION, datos)
+    usado = anio if anio in anios else min(anios, key=lambda a: (abs(a - anio), a))
+    return _arreglos_poblacion(DIR_CACHE_POBLACION, datos, usado), usado
+
+
+def poblacion_municipio(codigo, anio, area='TOTAL'):
+    """Población de un municipio (código DANE, texto o entero) en ``anio``; NaN si no está."""
+    return float(tabla_poblacion(anio, verificar=False)[0][area][int(codigo)])
+
+
+def poblacion_total(tabla):
+    """Municipios con proyección en ``tabla`` (de ``tablas_poblacion``) y su población total."""
+    total = np.asarray(tabla['TOTAL'])
+    codigos = np.flatnonzero(~np.isnan(total))
+    return pd.DataFrame({
+        'COD_DANE_COMPLETO': pd.array(np.char.zfill(codigos.astype(str), 5), dtype='str'),
+        'POBLACION': total[codigos],
+    })
+
+
+def cargar_poblacion(anio):
+    """Población total por municipio del año ``anio`` (columnas COD_DANE_COMPLETO, POBLACION)."""
+    tabla, usado = tabla_poblacion(anio)
+    if usado != anio:
+        # No hay proyección para ese año (ej. 2019): se usa la más cercana
+        print(f"¡Advertencia! No hay proyección de población para {anio}; se usa {usado}.")
+    df_poblacion = poblacion_total(tabla)
+    print(f"DataFrame de Población listo. Registros de {usado}: {len(df_poblacion)}")
+    return df_poblacion
+
+
+# --- Carga por año ---
+def version_datos():
+    """Identificador corto de la versión de los datos.
+
+    Hash de las fuentes y de la versión publicada de todas las particiones:
+    cambia al reconstruir desde Excel y al ingerir un lote. Se recalcula solo
+    si cambió algún manifiesto.
+    """
+    directorios = [DIR_CACHE_POBLACION] + [_dir_anio(a) for a in anios_disponibles()]
+    estado = [(directorio, _estado_manifiesto(directorio)) for directorio in directorios]
+    if _memo_version_datos[0] == estado:
+        return _memo_version_datos[1]
+    huellas = []
+    for directorio in directorios:
+        manifiesto = _leer_manifiesto(directorio) or {'fuentes': {}}
+        huellas.extend(sorted((path, f['sha256']) for path, f in manifiesto['fuentes'].items()))
+        huellas.append((directorio, manifiesto.get('datos')))
+    contenido = json.dumps([VERSION_CACHE, sorted(set(huellas), key=str)])
+    version = hashlib.sha1(contenido.encode()).hexdigest()[:12]
+    _memo_version_datos[:] = [estado, version]
+    return version
+
+
+def cargar_anio(anio, tablas=TABLAS_CACHE, forzar=False, poblacion=True):
+    """Devuelve las tablas pedidas de un año, usando su partición en disco si está vigente.
+
+    Además de ``tablas`` incluye ``version``, la versión de la partición que
+    se leyó (la recién publicada si hubo que reconstruirla), y, si
+    ``poblacion``, ``df_poblacion`` del mismo año, que las tasas necesitan
+    para recalcularse con filtros.
+    """
+    directorio = _dir_anio(anio)
+    archivos = [os.path.join(nombre, 'esquema.json') for nombre in TABLAS_CACHE]
+    if not forzar and cache_vigente(directorio, archivos):
+        try:
+            with etiquetas(anio=anio), etapa('leer_particion') as registro:
+                datos, version = leer_particion(anio, tablas, con_version=True)
+                registro['filas_salida'] = sum(len(df) for df in datos.values())
+            datos['version'] = version
+            if poblacion:
+                datos['df_poblacion'] = cargar_poblacion(anio)
+            print(f"Partición {anio} cargada desde '{directorio}'.")
+            return datos
+        except (OSError, ValueError, KeyError) as e:
+            print(f"¡Advertencia! No se pudo leer la partición {anio} ({e}). Se reconstruye desde Excel.")
+
+    path_muertes = fuentes_muertes().get(anio)
+    if path_muertes is None:
+        raise FileNotFoundError(f"No hay archivo de mortalidad ni partición en caché para {anio}.")
+    previo = _leer_manifiesto(directorio) or {}
+    if previo.get('lotes'):
+        # Los lotes ingeridos no están en el libro; se pierden salvo que el libro ya los incluya
+        print(f"¡Advertencia! La partición {anio} tenía {len(previo['lotes'])} lote(s) ingerido(s) "
+              "que no se aplican al reconstruir desde Excel; vuelva a ingerirlos con ingesta.py si hace falta.")
+    datos = construir_anio(anio, path_muertes)
+    try:
+        guardar_particion(directorio, datos, [path_muertes, PATH_CODIGOS, PATH_DIVIPOLA, PATH_POBLACION])
+        print(f"Partición {anio} escrita en '{directorio}'.")
+        # Reabrir desde disco para que también este proceso use las tablas mapeadas
+        datos, version = leer_particion(anio, tablas, con_version=True)
+    except (OSError, ValueError) as e:
+        # Sin permisos de escritura la app sigue funcionando, solo sin caché
+        print(f"¡Advertencia! No se pudo escribir la caché ({e}).")
+        datos, version = {nombre: datos[nombre] for nombre in tablas}, previo.get('datos')
+    datos['version'] = version
+    if poblacion:
+        datos['df_poblacion'] = cargar_poblacion(anio)
+    return datos
+
+
+if __name__ == '__main__':
+    for anio in fuentes_muertes():
+        cargar_anio(anio, forzar=True)
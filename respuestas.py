@@ -0,0 +1,83 @@
+"""Compresión y validación condicional (ETag) de las respuestas del servidor Flask.
+
+* Compresión: las respuestas de texto (JSON de los callbacks, layout,
+  geometría, HTML) de más de ``COMPRESION_MIN_BYTES`` se envían con brotli
+  si el cliente lo acepta y el paquete ``brotli`` está instalado, y si no
+  con gzip.
+* Recursos estáticos (la geometría del mapa): ``respuesta_cacheable`` los
+  sirve con ETag y ``Cache-Control`` inmutable; la URL lleva la versión, así
+  que el navegador los descarga una sola vez.
+
+Los ETag son débiles (``W/``): el mismo contenido comprimido con gzip, con
+brotli o sin comprimir es equivalente. Solo se usan en GET: los callbacks
+llegan por POST, que el navegador no guarda ni revalida, y el renderer de
+Dash trata cualquier respuesta distinta de 200/204 como un error.
+"""
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError: # Opcional: sin el paquete solo se usa gzip
+    brotli = None
+
+COMPRESION_MIN_BYTES = int(os.environ.get('COMPRESION_MIN_BYTES', 1024))
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5 # Compresión cercana a gzip -9 en menos tiempo que la máxima (11)
+TIPOS_COMPRIMIBLES = {
+    'application/json', 'application/geo+json', 'application/javascript',
+    'text/html', 'text/css', 'text/javascript', 'text/plain',
+}
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def huella(*partes):
+    """SHA-1 corto de ``partes`` (bytes o texto)."""
+    h = hashlib.sha1()
+    for parte in partes:
+        h.update(parte if isinstance(parte, bytes) else str(parte).encode())
+    return h.hexdigest()[:16]
+
+
+def comprimir(datos, aceptadas):
+    """``(datos, codificacion)`` con la mejor codificación de ``aceptadas`` (None si no se comprime)."""
+    if brotli is not None and aceptadas['br']:
+        return brotli.compress(datos, quality=CALIDAD_BROTLI), 'br'
+    if aceptadas['gzip']:
+        return gzip.compress(datos, compresslevel=NIVEL_GZIP), 'gzip'
+    return datos, None
+
+
+def _comprimir_respuesta(respuesta, request):
+    respuesta.vary.add('Accept-Encoding')
+    if (respuesta.status_code != 200 or respuesta.direct_passthrough or respuesta.is_streamed
+            or 'Content-Encoding' in respuesta.headers or respuesta.mimetype not in TIPOS_COMPRIMIBLES):
+        return respuesta
+    datos = respuesta.get_data()
+    if len(datos) < COMPRESION_MIN_BYTES:
+        return respuesta
+    comprimidos, codificacion = comprimir(datos, request.accept_encodings)
+    if codificacion is not None:
+        respuesta.set_data(comprimidos)
+        respuesta.headers['Content-Encoding'] = codificacion
+    return respuesta
+
+
+def configurar_respuestas(server):
+    """Compresión de las respuestas de ``server``."""
+    from flask import request
+
+    @server.after_request
+    def _preparar_respuesta(respuesta):
+        return _comprimir_respuesta(respuesta, request)
+
+
+def respuesta_cacheable(datos, mimetype='application/json'):
+    """Respuesta inmutable con ETag para ``datos`` (bytes); 304 si el cliente ya la tiene."""
+    from flask import Response, request
+
+    respuesta = Response(datos, mimetype=mimetype)
+    respuesta.set_etag(huella(datos), weak=True)
+    respuesta.headers['Cache-Control'] = CACHE_INMUTABLE
+    return respuesta.make_conditional(request)
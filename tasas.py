@@ -0,0 +1,229 @@
+"""Tasas de mortalidad por 100.000 habitantes de todas las unidades geográficas a la vez.
+
+``MotorTasas`` calcula sobre las celdas del cubo de un año, en una sola
+pasada vectorizada, las tasas de todos los municipios o departamentos
+cruzados con las causas (cualquier nivel de la jerarquía CIE-10) y, si la
+población tiene ese desglose, con el sexo y el grupo de edad:
+
+* muertes: las celdas filtradas se suman con un ``np.bincount`` sobre la
+  llave combinada (geografía × causa × sexo × edad), sin groupby;
+* población: el denominador de cada combinación se toma indexando el
+  arreglo de población de la geografía, sin merge;
+* tasa ajustada por edad (estandarización directa): suma de las tasas por
+  grupo de edad ponderadas con ``POBLACION_ESTANDAR``.
+
+La proyección municipal del DANE que usa el dashboard solo trae el total por
+municipio: las tasas por sexo, por grupo de edad y ajustadas necesitan una
+población con ese desglose (``poblacion_detalle``) y sin ella se rechazan.
+Como en ``df_tbm_completo``, solo se listan las combinaciones con muertes y
+con población conocida. Los resultados quedan en una caché LRU por filtros y
+parámetros.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from cubo import COL_MUERTES, normalizar_filtros
+
+POR_HABITANTES = 100000
+
+# Geografía -> (columna del código, columna del nombre)
+NIVELES_GEO = {
+    'municipio': ('COD_DANE_COMPLETO', 'MUNICIPIO'),
+    'departamento': ('COD_DANE_DPTO', 'DEPARTAMENTO'),
+}
+NIVELES_CAUSA = ('capitulo', 'bloque', 'tres', 'codigo')
+DESGLOSES = ('SEXO', 'GRUPO_EDAD_CAT') # Columnas del cubo por las que se pueden desglosar las tasas
+
+# Población estándar mundial de la OMS (2000-2025) agrupada en los grupos de edad
+# del DANE; el primer año de vida se reparte en proporción a su duración.
+# Los grupos sin edad válida no entran en la tasa ajustada.
+POBLACION_ESTANDAR = {
+    'Mortalidad neonatal (<1 mes)': 148,
+    'Mortalidad infantil (1 a 11 meses)': 1624,
+    'Primera infancia (1 a 4 años)': 7088,
+    'Niñez (5 a 14 años)': 17290,
+    'Adolescencia (15 a 19 años)': 8470,
+    'Juventud (20 a 29 años)': 16150,
+    'Adultez temprana (30 a 44 años)': 21350,
+    'Adultez intermedia (45 a 59 años)': 15960,
+    'Vejez (60 a 84 años)': 11320,
+    'Longevidad / Centenarios (85+)': 635,
+}
+
+
+def _matriz(posiciones, forma, valores):
+    """Suma ``valores`` en un arreglo de ``forma`` en ``posiciones`` (tupla de índices; -1 = se descarta)."""
+    validas = np.logical_and.reduce([p >= 0 for p in posiciones])
+    plana = np.bincount(
+        np.ravel_multi_index([p[validas] for p in posiciones], forma),
+        weights=np.asarray(valores, dtype=float)[validas],
+        minlength=int(np.prod(forma)),
+    )
+    return plana.reshape(forma)
+
+
+class MotorTasas:
+    """Tasas de las celdas de ``indice`` (un ``IndiceCubo``) sobre ``poblacion`` (total por municipio).
+
+    ``poblacion_detalle``, opcional, es la población por municipio, SEXO y
+    GRUPO_EDAD_CAT (columnas COD_DANE_COMPLETO, SEXO, GRUPO_EDAD_CAT,
+    POBLACION) con los mismos valores que el cubo.
+    """
+
+    def __init__(self, indice, poblacion, poblacion_detalle=None, estandar=POBLACION_ESTANDAR):
+        self.indice = indice
+        cubo = indice.cubo
+        self._muertes = cubo[COL_MUERTES].to_numpy()
+
+        # Geografía de cada celda: código del municipio y de su departamento
+        municipios = cubo['COD_DANE_COMPLETO'].array
+        codigos_mpio = pd.Index(municipios.categories.astype(str))
+        dpto_de_mpio, codigos_dpto = pd.factorize(codigos_mpio.str[:2], sort=True)
+        nombres_mpio = indice.dimensiones.valores('MUNICIPIO', codigos_mpio).astype(object)
+        nombres_dpto = indice.dimensiones.valores('DEPARTAMENTO', codigos_mpio).astype(object)
+        primero = np.unique(dpto_de_mpio, return_index=True)[1] # Un municipio de cada departamento
+        self._geo = {
+            'municipio': (municipios.codes, np.asarray(codigos_mpio), np.asarray(nombres_mpio)),
+            'departamento': (
+                np.append(dpto_de_mpio, -1)[municipios.codes], np.asarray(codigos_dpto), np.asarray(nombres_dpto)[primero],
+            ),
+        }
+        self._desgloses = {col: cubo[col].array.codes for col in DESGLOSES}
+        self._valores_desglose = {col: cubo[col].array.categories for col in DESGLOSES}
+        self._causas = {nivel: indice.causas.columnas[nivel] for nivel in NIVELES_CAUSA}
+
+        # Población de cada municipio y departamento (todas las filas de la proyección)
+        def posiciones_geo(codigos):
+            codigos = pd.Index(pd.Series(codigos).astype(str))
+            return {
+                'municipio': codigos_mpio.get_indexer(codigos),
+                'departamento': pd.Index(codigos_dpto).get_indexer(codigos.str[:2]),
+            }
+
+        self._poblacion = {}
+        posiciones = posiciones_geo(poblacion['COD_DANE_COMPLETO'])
+        for geo, (_, codigos, _) in self._geo.items():
+            total = _matriz((posiciones[geo],), (len(codigos),), poblacion['POBLACION'])
+            cubiertos = _matriz((posiciones[geo],), (len(codigos),), np.ones(len(poblacion)))
+            self._poblacion[geo] = np.where(cubiertos > 0, total, np.nan) # Sin proyección: sin tasa
+
+        self._poblacion_detalle = None
+        if poblacion_detalle is not None:
+            posiciones = posiciones_geo(poblacion_detalle['COD_DANE_COMPLETO'])
+            ejes = [
+                pd.Index(self._valores_desglose[col]).get_indexer(poblacion_detalle[col]) for col in DESGLOSES
+            ]
+            self._poblacion_detalle = {
+                geo: _matriz(
+                    (posiciones[geo], *ejes),
+                    (len(codigos), *(len(self._valores_desglose[col]) for col in DESGLOSES)),
+                    poblacion_detalle['POBLACION'],
+                )
+                for geo, (_, codigos, _) in self._geo.items()
+            }
+        # Pesos estándar por categoría de GRUPO_EDAD_CAT (0 para las que no están)
+        pesos = pd.Series(estandar, dtype=float).reindex(self._valores_desglose['GRUPO_EDAD_CAT']).fillna(0).to_numpy()
+        self._pesos = pesos / pesos.sum()
+
+        self._calcular_cache = lru_cache(maxsize=64)(self._calcular)
+
+    @property
+    def con_desglose(self):
+        """True si hay población por sexo y edad (tasas específicas y ajustadas)."""
+        return self._poblacion_detalle is not None
+
+    def tasas(self, filtros=None, geo='municipio', causa=None, por=(), ajustada=False):
+        """Tasas por 100.000 habitantes de las muertes que cumplen ``filtros``.
+
+        Una fila por ``geo`` (``municipio`` o ``departamento``), por valor del
+        nivel CIE-10 ``causa`` (si se da) y por cada columna de ``por``
+        (SEXO, GRUPO_EDAD_CAT). ``ajustada`` agrega TASA_AJUSTADA, la tasa
+        estandarizada por edad. Los dos últimos necesitan ``poblacion_detalle``.
+        """
+        if geo not in NIVELES_GEO:
+            raise ValueError(f"geo debe ser uno de {list(NIVELES_GEO)}")
+        if causa is not None and causa not in NIVELES_CAUSA:
+            raise ValueError(f"causa debe ser uno de {list(NIVELES_CAUSA)}")
+        desconocidos = [col for col in por if col not in DESGLOSES]
+        if desconocidos:
+            raise ValueError(f"Desgloses desconocidos: {desconocidos}; válidos: {list(DESGLOSES)}")
+        if ajustada and 'GRUPO_EDAD_CAT' in por:
+            raise ValueError("La tasa ajustada por edad no se desglosa por grupo de edad.")
+        if (por or ajustada) and not self.con_desglose:
+            raise ValueError("La población disponible no tiene desglose por sexo y edad: "
+                             "solo hay tasas brutas por geografía y causa.")
+        por = tuple(col for col in DESGLOSES if col in por) # Orden de los ejes de la población
+        return self._calcular_cache(normalizar_filtros(filtros), geo, causa, por, ajustada).copy()
+
+    def _forma(self, geo, causa, por):
+        """Tamaño de cada eje de la llave (geo, causa, *por)."""
+        forma = [len(self._geo[geo][1])]
+        if causa is not None:
+            forma.append(int(self._causas[causa].max()) + 1)
+        return tuple(forma + [len(self._valores_desglose[col]) for col in por])
+
+    def _sumar(self, filas, geo, causa, por):
+        """Muertes de ``filas`` por (geo, causa, *por): índices de cada eje y sumas, solo las no nulas.
+
+        Las combinaciones salen en el orden de la llave (geo primero).
+        """
+        ejes = [self._geo[geo][0][filas]]
+        if causa is not None:
+            ejes.append(self._causas[causa][filas])
+        ejes += [self._desgloses[col][filas] for col in por]
+
+        validas = np.logical_and.reduce([codigos >= 0 for codigos in ejes])
+        forma = self._forma(geo, causa, por)
+        llave = np.ravel_multi_index([codigos[validas] for codigos in ejes], forma)
+        claves, inversa = np.unique(llave, return_inverse=True)
+        muertes = np.bincount(inversa, weights=self._muertes[filas][validas])
+        return np.unravel_index(claves, forma), muertes
+
+    def _poblacion_de(self, geo, indices, por):
+        """Población de cada combinación (``indices`` de geo y de ``por``)."""
+        if not por:
+            return self._poblacion[geo][indices[0]]
+        matriz = self._poblacion_detalle[geo]
+        sumar = tuple(1 + i for i, col in enumerate(DESGLOSES) if col not in por)
+        return matriz.sum(axis=sumar)[tuple(indices)]
+
+    def _calcular(self, filtros, geo, causa, por, ajustada):
+        filas = self.indice.filtrar(dict(filtros)).index.to_numpy()
+        indices, muertes = self._sumar(filas, geo, causa, por)
+        ejes_poblacion = [indices[0]] + list(indices[2 if causa else 1:])
+        poblacion = self._poblacion_de(geo, ejes_poblacion, por)
+
+        columna_codigo, columna_nombre = NIVELES_GEO[geo]
+        _, codigos, nombres = self._geo[geo]
+        df = pd.DataFrame({columna_codigo: pd.array(codigos[indices[0]], dtype='str')})
+        if causa is not None:
+            etiquetas = self.indice.causas.nombres(causa, indices[1])
+            df['CAUSA'] = [etiqueta for etiqueta, _ in etiquetas]
+            df['CAUSA_NOMBRE'] = [nombre for _, nombre in etiquetas]
+        for i, col in enumerate(por):
+            df[col] = self._valores_desglose[col][ejes_poblacion[1 + i]]
+        df['Total Muertes'] = muertes.astype(np.int64)
+        df['POBLACION'] = poblacion
+        df['TASA_MORTALIDAD'] = (df['Total Muertes'] / df['POBLACION']) * POR_HABITANTES
+
+        if ajustada:
+            # Tasas por grupo de edad ponderadas y sumadas sobre la edad de cada combinación
+            por_edad = tuple(col for col in DESGLOSES if col in por or col == 'GRUPO_EDAD_CAT')
+            indices_edad, muertes_edad = self._sumar(filas, geo, causa, por_edad)
+            ejes = [indices_edad[0]] + list(indices_edad[2 if causa else 1:])
+            poblacion_edad = self._poblacion_de(geo, ejes, por_edad)
+            eje_edad = len(indices_edad) - len(por_edad) + por_edad.index('GRUPO_EDAD_CAT')
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ponderadas = (np.where(poblacion_edad > 0, muertes_edad / poblacion_edad, 0)
+                              * self._pesos[indices_edad[eje_edad]])
+            # Cada combinación con edad suma a la fila de df con los mismos ejes sin la edad
+            ejes_sin_edad = indices_edad[:eje_edad] + indices_edad[eje_edad + 1:]
+            forma = self._forma(geo, causa, por)
+            fila = np.searchsorted(np.ravel_multi_index(indices, forma), np.ravel_multi_index(ejes_sin_edad, forma))
+            df['TASA_AJUSTADA'] = np.bincount(fila, weights=ponderadas, minlength=len(df)) * POR_HABITANTES
+
+        df[columna_nombre] = pd.array(nombres[indices[0]], dtype='str')
+        # Como el merge inner de df_tbm_completo: sin población conocida no hay tasa
+        return df[df['POBLACION'].notna()].reset_index(drop=True)
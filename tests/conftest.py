@@ -0,0 +1,56 @@
+"""Datos sintéticos para las pruebas: un año pequeño con el mismo esquema que las particiones."""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cubo import construir_cubo  # noqa: E402
+from dimensiones import construir_dimensiones  # noqa: E402
+from preprocesamiento import ESQUEMA_DF_FINAL, ORDEN_GRUPOS_EDAD_FINAL  # noqa: E402
+
+MUNICIPIOS = pd.DataFrame({
+    'COD_DANE_COMPLETO': ['05001', '05002', '08001', '08078'],
+    'DEPARTAMENTO': ['ANTIOQUIA', 'ANTIOQUIA', 'ATLÁNTICO', 'ATLÁNTICO'],
+    'MUNICIPIO': ['MEDELLÍN', 'ABEJORRAL', 'BARRANQUILLA', 'BARANOA'],
+})
+CAUSAS = pd.DataFrame({
+    # I10X: categoría sin subcategorías, el sufijo X se ordena distinto como texto que como código
+    'CAUSA_CODIGO': ['A090', 'I10X', 'I219', 'J189', 'X954', 'X990'],
+    'CAUSA_NOMBRE': ['Diarrea', 'Hipertensión', 'Infarto', 'Neumonía', 'Agresión con disparo',
+                     'Agresión con objeto cortante'],
+    'CAUSA_3_NOMBRE': ['Diarrea', 'Hipertensión', 'Infarto', 'Neumonía', 'Agresión con disparo',
+                       'Agresión con objeto cortante'],
+    'CAPITULO': [1, 9, 9, 10, 20, 20],
+    'CAPITULO_NOMBRE': ['Infecciosas', 'Circulatorio', 'Circulatorio', 'Respiratorio', 'Causas externas',
+                        'Causas externas'],
+})
+
+
+@pytest.fixture(scope='session')
+def df_final():
+    """Registros de defunción al azar (semilla fija) con el esquema compacto de df_final."""
+    rng = np.random.default_rng(2019)
+    filas = 3000
+    df = pd.DataFrame({
+        'COD_DANE_COMPLETO': rng.choice(MUNICIPIOS['COD_DANE_COMPLETO'], filas),
+        'CAUSA_CODIGO': rng.choice(CAUSAS['CAUSA_CODIGO'], filas),
+        'SEXO': rng.choice([1, 2], filas),
+        'GRUPO_EDAD_CAT': rng.choice(ORDEN_GRUPOS_EDAD_FINAL, filas),
+        'MES': rng.integers(1, 13, filas),
+    })
+    return df.astype(ESQUEMA_DF_FINAL)
+
+
+@pytest.fixture(scope='session')
+def cubo(df_final):
+    return construir_cubo(df_final)
+
+
+@pytest.fixture(scope='session')
+def tablas_dimensiones():
+    return construir_dimensiones(MUNICIPIOS, CAUSAS)
+
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from cie10 import limites
+from cubo import COL_MUERTES, IndiceCubo
+from dimensiones import Dimensiones
+
+
+@pytest.fixture(scope='module')
+def indice(cubo, tablas_dimensiones):
+    return IndiceCubo(cubo, Dimensiones(tablas_dimensiones))
+
+
+def muertes(indice, rangos, filtros=None):
+    """Muertes de ``rangos`` por el corte del orden por código (sin filtros) o por máscara (con filtros)."""
+    celdas = indice.filtrar(filtros or {})
+    return int(indice.filtrar_causas(celdas, rangos)[COL_MUERTES].sum())
+
+
+def test_rangos_traslapados_no_cuentan_dos_veces(indice, df_final):
+    esperado = int(df_final['CAUSA_CODIGO'].astype(str).str.startswith('X9').sum())
+    rangos = [('X95', 'X95'), ('X90', 'X99')]
+    assert muertes(indice, [('X90', 'X99')]) == esperado
+    assert muertes(indice, rangos) == esperado
+    # Con filtros se usa la máscara en lugar del corte del orden por código: mismo criterio
+    hombres = df_final[df_final['SEXO'] == 1]
+    assert muertes(indice, rangos, {'sexo': [1]}) == int(hombres['CAUSA_CODIGO'].astype(str).str.startswith('X9').sum())
+    filas = indice.causas.filas(rangos)
+    assert np.array_equal(filas, np.unique(filas))
+
+
+def test_limites_de_tres_caracteres_y_subcategoria_x():
+    assert limites('X85', 'Y09') == limites('X850', 'Y099')
+    inicio, fin = limites('I100', 'I109')
+    assert inicio <= limites('I10X', 'I10X')[0] <= fin
+
+
+@pytest.mark.parametrize('rango', [('ZZZ', 'X99'), ('X90', ''), ('X9', 'X99')])
+def test_extremo_no_valido(indice, rango):
+    with pytest.raises(ValueError, match='CIE-10'):
+        limites(*rango)
+    with pytest.raises(ValueError, match='CIE-10'):
+        indice.causas.filas([rango])
@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+import consultas
+from consultas import MotorConsultas
+from cubo import IndiceCubo
+from dimensiones import Dimensiones
+
+COLUMNAS = ['COD_DANE_COMPLETO', 'CAUSA_CODIGO', 'SEXO']
+
+
+@pytest.fixture(scope='module')
+def motor(cubo, tablas_dimensiones):
+    return MotorConsultas({2019: (cubo, tablas_dimensiones)}, 'sqlite')
+
+
+def test_limite_no_pasa_de_max_limite(motor, monkeypatch):
+    monkeypatch.setattr(consultas, 'MAX_LIMITE', 3)
+    consulta, _ = motor.sql(COLUMNAS, limite=10 ** 9)
+    assert consulta.endswith('LIMIT 3')
+    assert len(motor.agregar(COLUMNAS, {'anio': 2019}, orden='desc', limite=10 ** 9)) == 3
+
+
+def test_limite_menor_que_el_maximo(motor):
+    df = motor.agregar(COLUMNAS, {'anio': 2019}, orden='desc', limite=5)
+    todas = motor.agregar(COLUMNAS, {'anio': 2019}, orden='desc')
+    assert len(todas) > 5
+    assert df['Total Muertes'].tolist() == todas['Total Muertes'].head(5).tolist()
+
+
+@pytest.mark.parametrize('limite', [0, -1, '-1'])
+def test_limite_no_positivo(motor, limite):
+    # En SQLite LIMIT -1 es "sin límite": se rechaza en lugar de saltarse MAX_LIMITE
+    with pytest.raises(ValueError, match='limite'):
+        motor.sql(COLUMNAS, limite=limite)
+
+
+@pytest.mark.parametrize('valor', [[{'a': 1}], {'a': 1}, [[1, 2]]])
+def test_filtro_no_escalar(motor, valor):
+    # Antes llegaba al motor y terminaba en sqlite3.ProgrammingError (un 500 en /api/consulta)
+    with pytest.raises(ValueError, match="Filtro 'sexo'"):
+        motor.agregar(['SEXO'], {'anio': 2019, 'sexo': valor})
+
+
+def test_filtro_escalar_o_lista(motor):
+    unico = motor.agregar(['SEXO'], {'anio': 2019, 'sexo': 1})
+    lista = motor.agregar(['SEXO'], {'anio': 2019, 'sexo': [1]})
+    assert unico.equals(lista) and unico['SEXO'].tolist() == [1]
+
+
+@pytest.mark.parametrize('rangos', [
+    [('I100', 'I109')],                   # I10X: dentro por el código numérico, fuera como texto
+    [('I10', 'I21')],
+    [('X85', 'Y09')],
+    [('X95', 'X95'), ('X90', 'X99')],     # Rangos traslapados
+    [('A00', 'A09'), ('J18', 'J189')],
+])
+@pytest.mark.parametrize('filtros', [{}, {'sexo': [1], 'meses': [3, 9]}])
+def test_rangos_de_causas_igual_que_pandas(motor, cubo, tablas_dimensiones, rangos, filtros):
+    indice = IndiceCubo(cubo, Dimensiones(tablas_dimensiones))
+    celdas = indice.filtrar_causas(indice.filtrar(filtros), rangos)
+    esperado = indice.agregar(celdas, ['CAUSA_CODIGO', 'SEXO'])
+    resultado = motor.agregar(['CAUSA_CODIGO', 'SEXO'], dict(filtros, anio=2019), rangos=rangos, como_pandas=True)
+    assert resultado['Total Muertes'].sum() > 0
+    pd.testing.assert_frame_equal(resultado, esperado.reset_index(drop=True), check_categorical=False)
+
+
+def test_rango_con_codigo_no_valido(motor):
+    with pytest.raises(ValueError, match='CIE-10'):
+        motor.agregar(['SEXO'], {'anio': 2019}, rangos=[('ZZZ', 'X99')])
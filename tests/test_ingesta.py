@@ -0,0 +1,27 @@
+import json
+import os
+
+import pytest
+
+import ingesta
+import preprocesamiento as pre
+
+
+def test_particion_de_otra_version_no_se_reemplaza_con_el_lote(tmp_path, monkeypatch, df_final, tablas_dimensiones):
+    # Año sin libro anual cuya partición quedó de un formato anterior (con lotes ya aplicados)
+    monkeypatch.chdir(tmp_path)
+    directorio = pre._dir_anio(2030)
+    os.makedirs(directorio)
+    manifiesto = {
+        'version': pre.VERSION_CACHE - 1, 'fuentes': {}, 'secuencia': 2, 'datos': 'v000002',
+        'lotes': [{'archivo': 'lote_1.xlsx', 'sha256': 'a'}, {'archivo': 'lote_2.xlsx', 'sha256': 'b'}],
+    }
+    path = os.path.join(directorio, 'manifiesto.json')
+    with open(path, 'w') as f:
+        json.dump(manifiesto, f)
+
+    lote = {'archivo': 'lote_3.xlsx', 'sha256': 'c', 'filas': len(df_final)}
+    with pytest.raises(ValueError, match='otra versión del formato'):
+        ingesta.aplicar_lote(2030, df_final, lote, tablas_dimensiones)
+    with open(path) as f:
+        assert json.load(f) == manifiesto
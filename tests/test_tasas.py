@@ -0,0 +1,124 @@
+"""Tasas de MotorTasas contra un cálculo de referencia con groupby sobre los registros."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from cubo import IndiceCubo
+from dimensiones import Dimensiones
+from preprocesamiento import ORDEN_GRUPOS_EDAD_FINAL
+from tasas import POBLACION_ESTANDAR, POR_HABITANTES, MotorTasas
+
+from conftest import MUNICIPIOS
+
+
+@pytest.fixture(scope='module')
+def poblacion_detalle():
+    """Población por municipio, sexo y grupo de edad; 'Edad desconocida' sin población, como en el DANE."""
+    rng = np.random.default_rng(7)
+    df = pd.MultiIndex.from_product(
+        [MUNICIPIOS['COD_DANE_COMPLETO'], [1, 2], ORDEN_GRUPOS_EDAD_FINAL],
+        names=['COD_DANE_COMPLETO', 'SEXO', 'GRUPO_EDAD_CAT'],
+    ).to_frame(index=False)
+    df['POBLACION'] = rng.integers(1000, 50000, len(df)).astype(float)
+    df.loc[df['GRUPO_EDAD_CAT'] == 'Edad desconocida', 'POBLACION'] = 0.0
+    return df
+
+
+@pytest.fixture(scope='module')
+def poblacion(poblacion_detalle):
+    return poblacion_detalle.groupby('COD_DANE_COMPLETO', as_index=False)['POBLACION'].sum()
+
+
+@pytest.fixture(scope='module')
+def indice(cubo, tablas_dimensiones):
+    return IndiceCubo(cubo, Dimensiones(tablas_dimensiones))
+
+
+@pytest.fixture(scope='module')
+def motor(indice, poblacion, poblacion_detalle):
+    return MotorTasas(indice, poblacion, poblacion_detalle)
+
+
+@pytest.fixture(scope='module')
+def registros(df_final, tablas_dimensiones):
+    """Registros con las columnas de la referencia: departamento, capítulo y SEXO/edad como valores."""
+    capitulos = tablas_dimensiones['dim_causa'].set_index('CAUSA_CODIGO')['CAPITULO'].astype(int)
+    return pd.DataFrame({
+        'COD_DANE_COMPLETO': df_final['COD_DANE_COMPLETO'].astype(str),
+        'COD_DANE_DPTO': df_final['COD_DANE_COMPLETO'].astype(str).str[:2],
+        'CAPITULO': df_final['CAUSA_CODIGO'].astype(str).map(capitulos),
+        'SEXO': df_final['SEXO'].astype(int),
+        'GRUPO_EDAD_CAT': df_final['GRUPO_EDAD_CAT'].astype(str),
+    })
+
+
+def referencia(registros, poblacion_detalle, llave, por=()):
+    """Muertes, población y tasa bruta por ``llave`` + ``por`` con groupby y merge."""
+    pob = poblacion_detalle.assign(
+        COD_DANE_COMPLETO=poblacion_detalle['COD_DANE_COMPLETO'].astype(str),
+        COD_DANE_DPTO=poblacion_detalle['COD_DANE_COMPLETO'].str[:2],
+        GRUPO_EDAD_CAT=poblacion_detalle['GRUPO_EDAD_CAT'].astype(str),
+    ).groupby([llave, *por], as_index=False)['POBLACION'].sum()
+    muertes = registros.groupby([llave, *por], as_index=False).size().rename(columns={'size': 'Total Muertes'})
+    df = muertes.merge(pob, on=[llave, *por])
+    df['TASA_MORTALIDAD'] = df['Total Muertes'] / df['POBLACION'] * POR_HABITANTES
+    return df
+
+
+def comparar(resultado, esperado, llaves, columnas=('Total Muertes', 'POBLACION', 'TASA_MORTALIDAD')):
+    resultado = resultado.assign(**{col: resultado[col].astype(str) for col in llaves if col != 'SEXO'})
+    esperado = esperado.assign(**{col: esperado[col].astype(str) for col in llaves if col != 'SEXO'})
+    unidos = resultado.merge(esperado, on=list(llaves), how='outer', suffixes=('', '_ref'), indicator=True)
+    assert len(unidos) and (unidos['_merge'] == 'both').all()
+    for col in columnas:
+        np.testing.assert_allclose(unidos[col].to_numpy(float), unidos[f'{col}_ref'].to_numpy(float))
+
+
+def test_tasa_bruta_municipal(motor, registros, poblacion_detalle):
+    esperado = referencia(registros, poblacion_detalle, 'COD_DANE_COMPLETO')
+    comparar(motor.tasas(), esperado, ['COD_DANE_COMPLETO'])
+
+
+def test_tasa_por_sexo_y_departamento_con_filtros(motor, registros, poblacion_detalle):
+    filas = registros[registros['CAPITULO'] == 20]
+    esperado = referencia(filas, poblacion_detalle, 'COD_DANE_DPTO', por=['SEXO'])
+    resultado = motor.tasas({'capitulo': [20]}, geo='departamento', por=['SEXO'])
+    comparar(resultado, esperado, ['COD_DANE_DPTO', 'SEXO'])
+
+
+def test_tasa_por_grupo_de_edad(motor, registros, poblacion_detalle):
+    # 'Edad desconocida' tiene muertes y población 0: tasa infinita, como en df_tbm_completo
+    esperado = referencia(registros, poblacion_detalle, 'COD_DANE_COMPLETO', por=['GRUPO_EDAD_CAT'])
+    resultado = motor.tasas(geo='municipio', por=['GRUPO_EDAD_CAT'])
+    comparar(resultado, esperado, ['COD_DANE_COMPLETO', 'GRUPO_EDAD_CAT'])
+    assert np.isinf(resultado.loc[resultado['GRUPO_EDAD_CAT'] == 'Edad desconocida', 'TASA_MORTALIDAD']).all()
+
+
+def test_tasa_ajustada_por_edad(motor, registros, poblacion_detalle):
+    # Estandarización directa: tasas por grupo de edad ponderadas con la población estándar
+    especificas = referencia(registros, poblacion_detalle, 'COD_DANE_COMPLETO', por=['SEXO', 'GRUPO_EDAD_CAT'])
+    pesos = pd.Series(POBLACION_ESTANDAR, dtype=float)
+    especificas['PESO'] = especificas['GRUPO_EDAD_CAT'].map(pesos / pesos.sum()).fillna(0)
+    especificas['PONDERADA'] = (np.where(especificas['POBLACION'] > 0, especificas['TASA_MORTALIDAD'], 0)
+                                * especificas['PESO'])
+    esperado = especificas.groupby(['COD_DANE_COMPLETO', 'SEXO'], as_index=False)['PONDERADA'].sum()
+
+    resultado = motor.tasas(geo='municipio', por=['SEXO'], ajustada=True)
+    comparar(resultado.rename(columns={'TASA_AJUSTADA': 'PONDERADA'}), esperado,
+             ['COD_DANE_COMPLETO', 'SEXO'], columnas=['PONDERADA'])
+
+
+def test_sin_poblacion_detallada_solo_tasas_brutas(indice, poblacion, registros, poblacion_detalle):
+    motor = MotorTasas(indice, poblacion)
+    assert not motor.con_desglose
+    comparar(motor.tasas(geo='departamento'), referencia(registros, poblacion_detalle, 'COD_DANE_DPTO'),
+             ['COD_DANE_DPTO'])
+    with pytest.raises(ValueError, match='desglose'):
+        motor.tasas(por=['SEXO'])
+    with pytest.raises(ValueError, match='desglose'):
+        motor.tasas(ajustada=True)
+
+
+def test_ajustada_no_se_desglosa_por_edad(motor):
+    with pytest.raises(ValueError, match='grupo de edad'):
+        motor.tasas(por=['GRUPO_EDAD_CAT'], ajustada=True)